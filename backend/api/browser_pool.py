@@ -0,0 +1,213 @@
+import atexit
+import contextlib
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+
+class BrowserPoolTimeout(Exception):
+    """空いているブラウザを待ちきれなかったときの例外"""
+
+
+class BrowserStartError(Exception):
+    """新しく起動したブラウザが続けて応答しなかったときの例外"""
+
+
+def create_chrome_driver(headless=True, extra_arguments=()):
+    """Chromeを起動する（画像の読み込みは無効）"""
+    # seleniumはHTTP取得だけの場合には不要なため、ここでimportする
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    from .fetchers import USER_AGENT
+
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless")  # ヘッドレスモード
+        options.add_argument(
+            "--window-size=1920,1080"
+        )  # ヘッドレスモードで要素を正しく認識させるため
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"user-agent={USER_AGENT}")
+    options.add_argument("--disable-gpu")  # GPU無効化 (Windows)
+    for argument in extra_arguments:
+        options.add_argument(argument)
+    # 画像を無効化する設定
+    options.add_experimental_option(
+        "prefs", {"profile.managed_default_content_settings.images": 2}
+    )
+    service = Service(ChromeDriverManager().install())
+    return webdriver.Chrome(service=service, options=options)
+
+
+class BrowserPool:
+    """
+    起動済みのブラウザ（WebDriver）を使い回すプール。
+    - 最大 size 台まで必要になったときに起動し、返却されたものを次の利用者に貸す
+    - 貸し出し時に応答を確認し、落ちているブラウザは作り直す
+    - max_uses 回貸し出したブラウザは終了して作り直す（メモリ肥大の対策）
+    WebDriverはスレッドセーフではないため、1台を同時に貸すのは1人だけ
+    """
+
+    def __init__(self, size=2, max_uses=100, driver_factory=None, max_start_attempts=3):
+        self.size = size
+        self.max_uses = max_uses
+        # 起動したブラウザが応答しないときに起動し直す回数の上限
+        # （Chromeやドライバーが壊れていると、何度起動しても応答しないため）
+        self.max_start_attempts = max_start_attempts
+        self.driver_factory = driver_factory or create_chrome_driver
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        """
+        ブラウザを1台借りる。timeout 秒待っても空かなければ BrowserPoolTimeout。
+        新しく起動したブラウザが max_start_attempts 回続けて応答しなければ BrowserStartError
+        """
+        if self._closed:
+            raise RuntimeError("ブラウザプールは終了しています")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise BrowserPoolTimeout(f"{timeout} 秒待っても空いているブラウザがありません")
+        try:
+            starts = 0
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    if starts >= self.max_start_attempts:
+                        raise BrowserStartError(
+                            f"ブラウザを {starts} 回起動しましたが応答しませんでした"
+                        )
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise BrowserPoolTimeout(
+                            f"{timeout} 秒以内に応答するブラウザを起動できませんでした"
+                        )
+                    driver = self._start_driver()
+                    starts += 1
+                if self._is_healthy(driver):
+                    break
+                self._quit(driver)
+            with self._lock:
+                self._uses[driver] += 1
+            return driver
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, driver):
+        """借りたブラウザを返す。使用回数が上限に達したものは終了する"""
+        try:
+            with self._lock:
+                recycle = self._closed or self._uses.get(driver, 0) >= self.max_uses
+            if recycle or not self._reset(driver):
+                self._quit(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextlib.contextmanager
+    def checkout(self, timeout=None):
+        driver = self.acquire(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def warm(self):
+        """size 台すべてを先に起動しておく"""
+        drivers = [self.acquire() for _ in range(self.size)]
+        for driver in drivers:
+            with self._lock:
+                # 起動確認のための貸し出しは使用回数に数えない
+                self._uses[driver] -= 1
+            self.release(driver)
+
+    def close(self):
+        """待機中のブラウザをすべて終了する（貸し出し中のものは返却時に終了する）"""
+        self._closed = True
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self):
+        with self._lock:
+            return {"browsers": len(self._uses), "idle": self._idle.qsize()}
+
+    def _start_driver(self):
+        driver = self.driver_factory()
+        with self._lock:
+            self._uses[driver] = 0
+        return driver
+
+    def _quit(self, driver):
+        with self._lock:
+            self._uses.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _is_healthy(self, driver):
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _reset(self, driver):
+        """次の利用者のために、余分なタブを閉じてCookieを消す"""
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.delete_all_cookies()
+            return True
+        except Exception:
+            return False
+
+
+def _setting(name, default):
+    # _long_format_csv などはDjangoの設定なしで単体実行されることもある
+    if not settings.configured:
+        return default
+    return getattr(settings, name, default)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_browser_pool(headless=True, extra_arguments=()):
+    """
+    プロセス内で共有するブラウザプールを返す（起動オプションごとに1つ）。
+    call_command で何度コマンドを実行しても、同じプロセスなら起動済みのChromeを使い回す。
+    台数・使い回す回数は settings.BROWSER_POOL_SIZE / BROWSER_POOL_MAX_USES
+    """
+    key = (headless, tuple(extra_arguments))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = BrowserPool(
+                size=_setting("BROWSER_POOL_SIZE", 2),
+                max_uses=_setting("BROWSER_POOL_MAX_USES", 100),
+                driver_factory=lambda: create_chrome_driver(headless, extra_arguments),
+            )
+        return _pools[key]
+
+
+@atexit.register
+def close_browser_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
@@ -0,0 +1,67 @@
+from django.db import transaction
+
+
+def bulk_upsert(
+    model,
+    objs,
+    unique_fields,
+    update_fields=(),
+    keep_if_none=(),
+    batch_size=500,
+):
+    """
+    unique_fields をキーにまとめて登録・更新する（Django 3.2 には
+    bulk_create(update_conflicts=...) が無いため、既存行を1クエリで取得し
+    bulk_create / bulk_update に振り分ける）。
+
+    - update_fields: 既存行で更新するフィールド（空なら get_or_create 相当）
+    - keep_if_none: 新しい値が None のときは既存値を残すフィールド
+    - 値が変わっていない既存行は更新しない
+
+    戻り値は (作成したオブジェクトのリスト, 更新したオブジェクトのリスト)
+    """
+    # 同じキーが複数ある場合は後のものを優先する
+    pending = {}
+    for obj in objs:
+        pending[tuple(getattr(obj, field) for field in unique_fields)] = obj
+    if not pending:
+        return [], []
+
+    lookup = {
+        f"{field}__in": {key[i] for key in pending}
+        for i, field in enumerate(unique_fields)
+    }
+    existing = {
+        tuple(getattr(obj, field) for field in unique_fields): obj
+        for obj in model.objects.filter(**lookup)
+    }
+
+    to_create = []
+    to_update = []
+    for key, obj in pending.items():
+        current = existing.get(key)
+        if current is None:
+            to_create.append(obj)
+            continue
+        changed = False
+        for field in update_fields:
+            value = getattr(obj, field)
+            if value is None and field in keep_if_none:
+                continue
+            # DBから読んだ値と型を揃えて比較する（例: "57.0" と 57.0）
+            value = model._meta.get_field(field).to_python(value)
+            if getattr(current, field) != value:
+                setattr(current, field, value)
+                changed = True
+        if changed:
+            to_update.append(current)
+
+    with transaction.atomic(savepoint=False):
+        if to_create:
+            # 取得後に他のプロセスが登録した行とは衝突させない
+            model.objects.bulk_create(
+                to_create, batch_size=batch_size, ignore_conflicts=True
+            )
+        if to_update:
+            model.objects.bulk_update(to_update, update_fields, batch_size=batch_size)
+    return to_create, to_update
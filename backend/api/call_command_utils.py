@@ -1,4 +1,8 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from django.core.management import call_command
+from django.db import connection
 
 def scrape_and_save_race(race_id):
     """
@@ -14,15 +18,47 @@ def scrape_and_save_race(race_id):
 
 def export_race_csv(race_id):
     """
-    export_race_csvの呼び出し
+    export_race_csvの呼び出し。
+    戻り値は出力した（最新のCSVが既にあればその）ファイルのパス
+    """
+    # 呼び出しの間に data_version が上がっても、実際に書いたファイルを返せるよう
+    # コマンドのインスタンスから出力先を受け取る
+    from .management.commands.export_race_csv import Command as ExportRaceCsvCommand
+
+    command = ExportRaceCsvCommand()
+    call_command(command, race_id)
+    return command.output_path
+
+
+# CSVの作り直しはリクエストを待たせないよう、1本のスレッドで順に行う
+_background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="csv-export")
+_pending_lock = threading.Lock()
+_pending_race_ids = set()
+
+
+def export_race_csv_in_background(race_id):
+    """
+    export_race_csv を別スレッドで実行する。
+    同じレースが待機中・実行中なら登録しない。登録したらTrueを返す
     """
+    with _pending_lock:
+        if race_id in _pending_race_ids:
+            return False
+        _pending_race_ids.add(race_id)
+    _background_executor.submit(_export_in_background, race_id)
+    return True
+
+
+def _export_in_background(race_id):
     try:
-        call_command("export_race_csv", race_id)
+        export_race_csv(race_id)
     except Exception as e:
-        # 必要に応じて例外処理
-        raise e
-
-    pass
+        print(f"{race_id} のCSVの出力に失敗しました: {e}")
+    finally:
+        with _pending_lock:
+            _pending_race_ids.discard(race_id)
+        # このスレッドで開いたDB接続を閉じる
+        connection.close()
 
 
 def scrape_and_export_csv(race_id):
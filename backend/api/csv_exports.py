@@ -0,0 +1,219 @@
+import csv
+import glob
+import os
+import zlib
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+
+from .models import Entry, HorsePastRace, Race
+
+
+def csv_export_path(race):
+    """
+    レースのCSVファイルのパス。ファイル名に data_version を含めるため、
+    ファイルが存在すれば最新のデータから作られたものとみなせる
+    """
+    return os.path.join(
+        settings.CSV_EXPORT_DIR, f"{race.race_id}-v{race.data_version}.csv"
+    )
+
+
+def is_csv_export_fresh(race):
+    return os.path.exists(csv_export_path(race))
+
+
+def latest_csv_export_path(race_id):
+    """作成済みのCSVのうち、data_version が最も新しいもののパス。無ければNone"""
+    pattern = os.path.join(settings.CSV_EXPORT_DIR, f"{race_id}-v*.csv")
+    versions = {}
+    for path in glob.glob(pattern):
+        version = os.path.basename(path)[len(f"{race_id}-v") : -len(".csv")]
+        if version.isdigit():
+            versions[int(version)] = path
+    return versions[max(versions)] if versions else None
+
+
+def remove_stale_csv_exports(race):
+    """古い data_version のCSVファイルを削除する"""
+    current_path = csv_export_path(race)
+    pattern = os.path.join(settings.CSV_EXPORT_DIR, f"{race.race_id}-v*.csv")
+    for path in glob.glob(pattern):
+        if path != current_path:
+            os.remove(path)
+
+
+# 縦持ち（long format）のCSVのヘッダー。
+# 1頭につき「出走情報」1行、「過去成績」N行、区切り行（"---"）の順に並べる
+LONG_FORMAT_HEADER = [
+    "レコード種別",
+    "馬番",
+    "枠番",
+    "馬名",
+    # "性齢",
+    "今回の斤量",
+    "今回の騎手",
+    # "調教師",
+    # "馬体重(増減)",
+    "オッズ",
+    "日付",
+    "開催",
+    "天気",
+    "レース名",
+    "頭数",
+    "過去の馬番",
+    "過去の枠番",
+    "過去のオッズ",
+    "着順",
+    "過去の騎手",
+    "過去の斤量",
+    "コース",
+    "馬場状態",
+    "タイム",
+    "着差",
+    "通過",
+    "ペース",
+    "last_3f",
+    "body_weight",
+]
+
+# 複数レースのCSVでは先頭にレースIDを付ける
+MULTI_RACE_HEADER = ["レースID"] + LONG_FORMAT_HEADER
+
+ENTRY_VALUES = [
+    "id",
+    "race_id",
+    "umaban",
+    "waku",
+    "horse__horse_name",
+    "weight_carried",
+    "jockey__jockey_name",
+    "odds",
+]
+
+# 「過去成績」行に出す過去成績のカラム（LONG_FORMAT_HEADER の「日付」以降の順）
+PAST_RACE_VALUES = [
+    "race_date",
+    "venue_name",
+    "weather",
+    "race_name",
+    "head_count",
+    "umaban",
+    "waku",
+    "odds",
+    "rank",
+    "jockey_name",
+    "weight_carried",
+    "distance",
+    "ground_condition",
+    "time",
+    "margin",
+    "passing",
+    "pace",
+    "last_3f",
+    "body_weight",
+]
+
+
+def filter_races(race_ids=None, start=None, end=None, venue=None):
+    """複数レースのCSVの対象（開催日・レースID順）"""
+    races = Race.objects.all()
+    if race_ids:
+        races = races.filter(race_id__in=race_ids)
+    if start:
+        races = races.filter(race_date__gte=start)
+    if end:
+        races = races.filter(race_date__lte=end)
+    if venue:
+        races = races.filter(venue=venue)
+    return races.order_by("race_date", "race_id")
+
+
+def iter_long_format_rows(races, races_per_batch=100, chunk_size=2000):
+    """
+    races の出走馬と過去成績を、縦持ちのCSVの行（リスト）として順に返す。
+    シリアライザを通さず values() の行をそのまま使い、races_per_batch レースずつ
+    「出走馬」「出走馬の過去成績」の2クエリで読む（メモリはレース数によらない）。
+    出走馬は馬番順、過去成績は新しい順
+    """
+    race_ids = list(races.values_list("race_id", flat=True))
+    past_race_blanks = [""] * len(PAST_RACE_VALUES)
+    separator = ["---"] + [""] * (len(LONG_FORMAT_HEADER) - 1)
+    # 同じ並び順の2つのクエリを、出走情報のIDで突き合わせる
+    ordering = ("race__race_date", "race_id", "umaban", "id")
+    for start in range(0, len(race_ids), races_per_batch):
+        batch = race_ids[start : start + races_per_batch]
+        entries = (
+            Entry.objects.filter(race_id__in=batch)
+            .order_by(*ordering)
+            .values_list(*ENTRY_VALUES)
+            .iterator(chunk_size=chunk_size)
+        )
+        past_races = (
+            HorsePastRace.objects.filter(horse__entries__race_id__in=batch)
+            .order_by(*(f"horse__entries__{field}" for field in ordering), "-race_date")
+            .values_list("horse__entries__id", *PAST_RACE_VALUES)
+            .iterator(chunk_size=chunk_size)
+        )
+        past_races_by_entry = groupby(past_races, key=itemgetter(0))
+        current = next(past_races_by_entry, None)
+        for entry_id, race_id, umaban, waku, horse_name, weight, jockey, odds in entries:
+            yield [
+                race_id, "出走情報", umaban, waku, horse_name, weight, jockey, odds
+            ] + past_race_blanks
+            if current and current[0] == entry_id:
+                for past_race in current[1]:
+                    yield [race_id, "過去成績", umaban, "", horse_name, "", "", ""] + list(
+                        past_race[1:]
+                    )
+                current = next(past_races_by_entry, None)
+            yield [race_id] + separator
+
+
+class _RowBuffer:
+    """csv.writer の書き込み先。書かれた文字列をためておき、まとめて取り出す"""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, value):
+        self.parts.append(value)
+        self.size += len(value)
+
+    def take(self):
+        value = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        return value
+
+
+def stream_long_format_csv(
+    rows, header=MULTI_RACE_HEADER, compress=False, flush_size=64 * 1024
+):
+    """
+    CSVの行を、UTF-8（compress=True ならgzip）のバイト列の塊として順に返す。
+    StreamingHttpResponse やファイルへの書き込みにそのまま渡せる
+    """
+    buffer = _RowBuffer()
+    writer = csv.writer(buffer)
+    # wbits=31: gzip形式（ヘッダー付き）
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def encode(text):
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.size >= flush_size:
+            chunk = encode(buffer.take())
+            if chunk:
+                yield chunk
+    chunk = encode(buffer.take())
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
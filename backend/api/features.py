@@ -0,0 +1,353 @@
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+from .models import Entry, HorsePastRace
+from .race_parsers import parse_distance
+from .race_queries import WIN_PLACE_RANKS
+
+RACE_COLUMNS = ["race_id", "race_date", "venue", "course_details"]
+
+ENTRY_COLUMNS = [
+    "id",
+    "race_id",
+    "horse_id",
+    "jockey_id",
+    "waku",
+    "umaban",
+    "weight_carried",
+    "odds",
+    "popularity",
+]
+
+PAST_RACE_COLUMNS = [
+    "horse_id",
+    "past_race_id",
+    "race_date",
+    "venue_name",
+    "rank",
+    "head_count",
+    "race_grade_score",
+    "jockey_id",
+    "surface",
+    "distance_m",
+    "time_seconds",
+    "last_3f_seconds",
+    "last_3f_rank",
+]
+
+# モデルに渡す数値の特徴量（NPZの features の列順）
+FEATURE_COLUMNS = [
+    "waku",
+    "umaban",
+    "weight_carried",
+    "odds",
+    "popularity",
+    # 近走の成績
+    "runs",
+    "win_rate",
+    "top3_rate",
+    "last_rank",
+    "avg_rank_recent3",
+    "avg_finish_ratio_recent5",
+    "top3_rate_recent5",
+    "days_since_last_run",
+    "sum_grade_score",
+    # スピード指数・上がり
+    "best_speed_figure_recent5",
+    "avg_speed_figure_recent3",
+    "avg_last_3f_recent3",
+    "avg_last_3f_rank",
+    # 今回と同じ条件での成績
+    "same_venue_runs",
+    "same_venue_top3_rate",
+    "same_surface_runs",
+    "same_surface_top3_rate",
+    "same_distance_runs",
+    "same_distance_top3_rate",
+    # 今回の騎手の成績
+    "jockey_rides",
+    "jockey_win_rate",
+    "jockey_top3_rate",
+]
+
+# 今回と「同じ距離」とみなす差（m）
+SAME_DISTANCE_MARGIN = 200
+
+
+def _frame(queryset, columns):
+    return pd.DataFrame.from_records(
+        list(queryset.values_list(*columns)), columns=columns
+    )
+
+
+def load_frames(races):
+    """
+    レース・出走情報・出走馬の過去成績を、テーブルごとに1クエリで DataFrame にする。
+    races は Race のクエリセット（IN句に大量のIDを並べず、サブクエリで絞り込む）
+    """
+    races = races.order_by()
+    race_frame = _frame(races, RACE_COLUMNS)
+    entry_frame = _frame(
+        Entry.objects.filter(race__in=races).order_by(), ENTRY_COLUMNS
+    )
+    past_frame = _frame(
+        HorsePastRace.objects.filter(
+            horse_id__in=Entry.objects.filter(race__in=races).values("horse_id")
+        ).order_by(),
+        PAST_RACE_COLUMNS,
+    )
+    return race_frame, entry_frame, past_frame
+
+
+def _to_float(frame, columns):
+    for column in columns:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("float64")
+
+
+def prepare_past_races(past_frame):
+    """
+    過去成績に、集計に使う列を足す。
+    - speed_figure: 速度（距離/タイム）を馬場・距離ごとに偏差値にしたもの。
+      基準はその成績より前の日付の同じ馬場・距離の成績だけにする（後のレースの結果を含めない）
+    - finish_ratio: 着順を頭数で割ったもの（1着=0, 最下位=1）
+    - win / top3: 1着・3着以内なら1（着順が無ければNaN）
+    """
+    past = past_frame.copy()
+    past["race_date"] = pd.to_datetime(past["race_date"])
+    _to_float(
+        past,
+        [
+            "rank",
+            "head_count",
+            "race_grade_score",
+            "distance_m",
+            "time_seconds",
+            "last_3f_seconds",
+            "last_3f_rank",
+        ],
+    )
+    past["speed_figure"] = _speed_figure(past)
+    past["finish_ratio"] = (past["rank"] - 1) / (past["head_count"] - 1).where(
+        past["head_count"] > 1
+    )
+    has_rank = past["rank"].notna()
+    past["win"] = (past["rank"] == 1).astype("float64").where(has_rank)
+    past["top3"] = past["rank"].isin(WIN_PLACE_RANKS).astype("float64").where(has_rank)
+    return past
+
+
+def _speed_figure(past):
+    """
+    速度の偏差値。馬場・距離ごとに日付順の累計（件数・和・二乗和）を持ち、
+    その日より前の累計から平均・標準偏差（不偏）を出す。基準が2件未満ならNaN
+    """
+    speed = (past["distance_m"] / past["time_seconds"]).replace([np.inf, -np.inf], np.nan)
+    course = ["surface", "distance_m"]
+    rows = past[course + ["race_date"]].assign(speed=speed)
+    rows = rows[rows["speed"].notna() & rows["race_date"].notna()]
+    daily = (
+        rows.assign(speed_sq=rows["speed"] ** 2)
+        .groupby(course + ["race_date"])
+        .agg(n=("speed", "size"), total=("speed", "sum"), total_sq=("speed_sq", "sum"))
+        .sort_index()
+    )
+    # 同じ日の成績は基準に含めない（前日までの累計）
+    prior = daily.groupby(level=course).cumsum() - daily
+    mean = prior["total"] / prior["n"]
+    var = (prior["total_sq"] - prior["n"] * mean**2) / (prior["n"] - 1)
+    baseline = pd.DataFrame(
+        {"mean": mean, "std": np.sqrt(var.clip(lower=0))}
+    ).where(prior["n"] >= 2)
+    baseline = past[course + ["race_date"]].merge(
+        baseline.reset_index(), on=course + ["race_date"], how="left"
+    )
+    z = (speed.to_numpy() - baseline["mean"].to_numpy()) / baseline["std"].to_numpy()
+    return pd.Series(50 + 10 * z, index=past.index).replace([np.inf, -np.inf], np.nan)
+
+
+def _history_features(entries, past):
+    """出走馬ごとに、今回のレースより前の成績だけを集計する"""
+    history = entries[
+        ["entry_id", "horse_id", "race_date", "venue", "surface", "distance_m"]
+    ].merge(past, on="horse_id", suffixes=("", "_past"))
+    history = history[history["race_date_past"] < history["race_date"]]
+    history = history.sort_values(
+        ["entry_id", "race_date_past"], ascending=[True, False]
+    )
+    # 0 = 前走, 1 = 2走前, ...
+    recency = history.groupby("entry_id").cumcount()
+    recent3 = recency < 3
+    recent5 = recency < 5
+    top3 = history["top3"]
+    columns = pd.DataFrame(
+        {
+            "entry_id": history["entry_id"],
+            "win": history["win"],
+            "top3": top3,
+            "last_rank": history["rank"].where(recency == 0),
+            "last_race_date": history["race_date_past"].where(recency == 0),
+            "rank_recent3": history["rank"].where(recent3),
+            "finish_ratio_recent5": history["finish_ratio"].where(recent5),
+            "top3_recent5": top3.where(recent5),
+            "grade": history["race_grade_score"],
+            "speed_figure_recent5": history["speed_figure"].where(recent5),
+            "speed_figure_recent3": history["speed_figure"].where(recent3),
+            "last_3f_recent3": history["last_3f_seconds"].where(recent3),
+            "last_3f_rank": history["last_3f_rank"],
+            "same_venue": top3.where(history["venue_name"] == history["venue"]),
+            "same_surface": top3.where(history["surface_past"] == history["surface"]),
+            "same_distance": top3.where(
+                (history["distance_m_past"] - history["distance_m"]).abs()
+                <= SAME_DISTANCE_MARGIN
+            ),
+        }
+    )
+    return columns.groupby("entry_id").agg(
+        runs=("win", "size"),
+        win_rate=("win", "mean"),
+        top3_rate=("top3", "mean"),
+        last_rank=("last_rank", "max"),
+        last_race_date=("last_race_date", "max"),
+        avg_rank_recent3=("rank_recent3", "mean"),
+        avg_finish_ratio_recent5=("finish_ratio_recent5", "mean"),
+        top3_rate_recent5=("top3_recent5", "mean"),
+        sum_grade_score=("grade", "sum"),
+        best_speed_figure_recent5=("speed_figure_recent5", "max"),
+        avg_speed_figure_recent3=("speed_figure_recent3", "mean"),
+        avg_last_3f_recent3=("last_3f_recent3", "mean"),
+        avg_last_3f_rank=("last_3f_rank", "mean"),
+        same_venue_runs=("same_venue", "count"),
+        same_venue_top3_rate=("same_venue", "mean"),
+        same_surface_runs=("same_surface", "count"),
+        same_surface_top3_rate=("same_surface", "mean"),
+        same_distance_runs=("same_distance", "count"),
+        same_distance_top3_rate=("same_distance", "mean"),
+    )
+
+
+def _jockey_features(entries, past):
+    """
+    今回の騎手の、レース日より前の騎乗成績（読み込んだ過去成績の中で数える）。
+    騎手ごとの累計を日付順に持ち、merge_asof でレース日の直前の値を引く
+    """
+    rides = past.loc[
+        past["jockey_id"].notna() & past["win"].notna() & past["race_date"].notna(),
+        ["jockey_id", "race_date", "win", "top3"],
+    ].sort_values("race_date")
+    by_jockey = rides.groupby("jockey_id")
+    rides = rides.assign(
+        jockey_rides=by_jockey.cumcount() + 1,
+        jockey_wins=by_jockey["win"].cumsum(),
+        jockey_top3=by_jockey["top3"].cumsum(),
+    )[["jockey_id", "race_date", "jockey_rides", "jockey_wins", "jockey_top3"]]
+    # 開催日の無いレースは merge_asof に渡せないため、騎乗成績なしとして扱う
+    dated = entries[entries["race_date"].notna()]
+    left = dated[["entry_id", "jockey_id", "race_date"]].assign(
+        jockey_id=dated["jockey_id"].fillna("")
+    )
+    merged = (
+        pd.merge_asof(
+            left.sort_values("race_date"),
+            rides,
+            on="race_date",
+            by="jockey_id",
+            allow_exact_matches=False,
+        )
+        .set_index("entry_id")
+        .reindex(entries["entry_id"])
+    )
+    rides_count = merged["jockey_rides"].fillna(0)
+    return pd.DataFrame(
+        {
+            "jockey_rides": rides_count,
+            "jockey_win_rate": merged["jockey_wins"] / rides_count.where(rides_count > 0),
+            "jockey_top3_rate": merged["jockey_top3"]
+            / rides_count.where(rides_count > 0),
+        }
+    )
+
+
+def build_features(races):
+    """
+    races（Race のクエリセット）の出走馬ごとの特徴量を DataFrame で返す。
+    1行が1頭（Entry）。列は race_id / horse_id などの識別子、FEATURE_COLUMNS、
+    正解ラベルの finish_rank（過去成績にそのレースの着順があれば。無ければNaN）
+    """
+    race_frame, entry_frame, past_frame = load_frames(races)
+    courses = [parse_distance(value) for value in race_frame["course_details"]]
+    race_frame["surface"] = [surface for surface, _ in courses]
+    race_frame["distance_m"] = pd.Series(
+        [distance for _, distance in courses], dtype="float64"
+    )
+    entries = entry_frame.rename(columns={"id": "entry_id"}).merge(
+        race_frame.drop(columns="course_details"), on="race_id", how="left"
+    )
+    entries["race_date"] = pd.to_datetime(entries["race_date"])
+    _to_float(entries, ["waku", "umaban", "weight_carried", "odds", "popularity"])
+    past = prepare_past_races(past_frame)
+
+    history = _history_features(entries, past)
+    jockey = _jockey_features(entries, past)
+    # 正解ラベル: 出走馬の過去成績のうち、このレースの行の着順
+    labels = (
+        entries[["entry_id", "horse_id", "race_id"]]
+        .merge(
+            past[["horse_id", "past_race_id", "rank"]],
+            left_on=["horse_id", "race_id"],
+            right_on=["horse_id", "past_race_id"],
+        )
+        .drop_duplicates("entry_id")
+        .set_index("entry_id")["rank"]
+        .rename("finish_rank")
+    )
+
+    features = entries.set_index("entry_id").join([history, jockey, labels])
+    features["runs"] = features["runs"].fillna(0)
+    for column in ("same_venue_runs", "same_surface_runs", "same_distance_runs"):
+        features[column] = features[column].fillna(0)
+    features["sum_grade_score"] = features["sum_grade_score"].fillna(0)
+    features["days_since_last_run"] = (
+        features["race_date"] - features["last_race_date"]
+    ).dt.days
+    features = features.sort_values(["race_date", "race_id", "umaban"])
+    return features.reset_index()[
+        ["entry_id", "race_id", "race_date", "horse_id", "jockey_id"]
+        + FEATURE_COLUMNS
+        + ["finish_rank"]
+    ]
+
+
+DATASET_FORMATS = ("parquet", "npz")
+
+
+def default_dataset_format():
+    """pyarrow があればParquet、無ければNumPyのNPZ"""
+    return "parquet" if importlib.util.find_spec("pyarrow") else "npz"
+
+
+def write_dataset(features, path, dataset_format=None):
+    """
+    特徴量を列指向のファイルに書き出す。
+    - parquet: DataFrameをそのまま（pyarrowが必要）
+    - npz: features（float32の行列）, feature_names, 識別子, finish_rank の配列
+      （allow_pickle なしで読めるよう、文字列は固定長の配列にする）
+    """
+    dataset_format = dataset_format or default_dataset_format()
+    if dataset_format == "parquet":
+        features.to_parquet(path, index=False)
+    elif dataset_format == "npz":
+        np.savez_compressed(
+            path,
+            features=features[FEATURE_COLUMNS].to_numpy(dtype=np.float32),
+            feature_names=np.array(FEATURE_COLUMNS),
+            entry_ids=features["entry_id"].to_numpy(),
+            race_ids=features["race_id"].to_numpy(dtype=str),
+            horse_ids=features["horse_id"].to_numpy(dtype=str),
+            race_dates=features["race_date"].dt.strftime("%Y-%m-%d").to_numpy(dtype=str),
+            finish_rank=features["finish_rank"].to_numpy(dtype=np.float32),
+        )
+    else:
+        raise ValueError(f"不明な形式です: {dataset_format}")
+    return path
@@ -0,0 +1,205 @@
+import re
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .browser_pool import get_browser_pool
+from .rate_limit import HostRateLimiter
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+)
+
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+
+class FetchError(Exception):
+    """ページ取得に失敗したときの例外"""
+
+
+class BaseFetcher:
+    """
+    ページのHTMLを取得するバックエンドの基底クラス。
+    wait_css: ブラウザで描画完了を待つCSSセレクタ
+    marker: HTMLに含まれていれば取得成功とみなす文字列（HTTP取得の判定用）
+    """
+
+    def fetch(self, url, wait_css=None, marker=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def decode_html(content, content_type=""):
+    """
+    レスポンスのバイト列をデコードする。
+    netkeibaはEUC-JPとUTF-8のページが混在しているため、
+    Content-Type → metaタグ → UTF-8 → EUC-JP の順で文字コードを判定する
+    """
+    encoding = None
+    match = re.search(r"charset=([\w-]+)", content_type or "", re.IGNORECASE)
+    if match:
+        encoding = match.group(1)
+    else:
+        meta_match = _META_CHARSET_RE.search(content[:4096])
+        if meta_match:
+            encoding = meta_match.group(1).decode("ascii")
+
+    if encoding:
+        try:
+            return content.decode(encoding, errors="replace")
+        except LookupError:
+            pass
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content.decode("euc_jp", errors="replace")
+
+
+class HttpFetcher(BaseFetcher):
+    """
+    requests.Sessionでページを取得する（ブラウザ不要）。
+    コネクションはプールされ、keep-alive・gzipで再利用される
+    """
+
+    def __init__(self, pool_size=10, timeout=10, retries=2):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "User-Agent": USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml,application/json;q=0.9,*/*;q=0.8",
+                "Accept-Encoding": "gzip, deflate",
+                "Accept-Language": "ja,en;q=0.8",
+                "Connection": "keep-alive",
+            }
+        )
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch(self, url, wait_css=None, marker=None):
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise FetchError(f"{url} の取得に失敗しました: {e}") from e
+        html = decode_html(response.content, response.headers.get("Content-Type", ""))
+        if marker and marker not in html:
+            raise FetchError(f"{url} に '{marker}' が含まれていません")
+        return html
+
+    def close(self):
+        self.session.close()
+
+
+class SeleniumFetcher(BaseFetcher):
+    """
+    ヘッドレスChromeでページを取得する（JSで描画されるページ用）。
+    Chromeはプロセス内で共有するブラウザプールから1ページごとに借りるため、
+    コマンドを何度実行しても起動済みのChromeを使い回し、プールの台数まで並列に取得できる
+    """
+
+    def __init__(self, wait_timeout=10, pool=None):
+        self.wait_timeout = wait_timeout
+        self.pool = pool or get_browser_pool()
+
+    def fetch(self, url, wait_css=None, marker=None):
+        from selenium.common.exceptions import WebDriverException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        try:
+            with self.pool.checkout() as driver:
+                driver.get(url)
+                if wait_css:
+                    WebDriverWait(driver, self.wait_timeout).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, wait_css))
+                    )
+                return driver.page_source
+        except WebDriverException as e:
+            raise FetchError(f"{url} の取得に失敗しました: {e}") from e
+
+    def close(self):
+        # 共有のプールは他のコマンドも使うため、ここでは終了しない（プロセス終了時に終了する）
+        pass
+
+
+class HybridFetcher(BaseFetcher):
+    """
+    まずHTTPで取得し、markerが見つからない（JSで描画される）ページだけ
+    Seleniumで取得し直す
+    """
+
+    def __init__(self, http=None, browser=None):
+        self.http = http or HttpFetcher()
+        self.browser = browser or SeleniumFetcher()
+
+    def fetch(self, url, wait_css=None, marker=None):
+        try:
+            return self.http.fetch(url, wait_css=wait_css, marker=marker)
+        except FetchError as e:
+            print(f"  -> HTTP取得できなかったためブラウザで再取得します: {e}")
+        return self.browser.fetch(url, wait_css=wait_css, marker=marker)
+
+    def close(self):
+        self.http.close()
+        self.browser.close()
+
+
+class RateLimitedFetcher(BaseFetcher):
+    """
+    他のFetcherを包み、ホストごとのリクエスト数・同時接続数を制限する
+    """
+
+    def __init__(self, fetcher, rate, max_concurrency):
+        self.fetcher = fetcher
+        self.limiter = HostRateLimiter(rate, max_concurrency)
+
+    def fetch(self, url, wait_css=None, marker=None):
+        with self.limiter.limit(url):
+            return self.fetcher.fetch(url, wait_css=wait_css, marker=marker)
+
+    def close(self):
+        self.fetcher.close()
+
+
+FETCHER_BACKENDS = {
+    "http": HttpFetcher,
+    "selenium": SeleniumFetcher,
+    "auto": HybridFetcher,
+}
+
+
+def build_fetcher(backend=None, rate=None, max_concurrency=None):
+    """
+    settings.SCRAPE_FETCHER（http / selenium / auto）に応じたFetcherを、
+    settings.SCRAPE_RATE_LIMIT / SCRAPE_MAX_CONCURRENCY のレート制限付きで返す
+    """
+    backend = backend or getattr(settings, "SCRAPE_FETCHER", "auto")
+    rate = rate or getattr(settings, "SCRAPE_RATE_LIMIT", 1.0)
+    max_concurrency = max_concurrency or getattr(settings, "SCRAPE_MAX_CONCURRENCY", 1)
+    try:
+        fetcher = FETCHER_BACKENDS[backend]()
+    except KeyError:
+        raise ValueError(f"不明なFetcherです: {backend}") from None
+    return RateLimitedFetcher(fetcher, rate, max_concurrency)
@@ -0,0 +1,140 @@
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 記録済みのページ（出馬表・馬の成績ページ）の置き場所
+FIXTURE_CORPUS_DIR = os.path.join(os.path.dirname(__file__), "scraper_fixtures")
+
+_HORSE_PATH_RE = re.compile(r"^/horse/(\d+)/?$")
+
+
+def race_page_path(corpus_dir, race_id):
+    return os.path.join(corpus_dir, "race", f"{race_id}.html")
+
+
+def horse_page_path(corpus_dir, horse_id):
+    return os.path.join(corpus_dir, "horse", f"{horse_id}.html")
+
+
+def expected_counts_path(corpus_dir):
+    return os.path.join(corpus_dir, "expected_counts.json")
+
+
+def load_expected_counts(corpus_dir):
+    """
+    フィクスチャの出馬表ごとの、読み取れるはずの件数
+    {race_id: {"entries": 出走馬の数, "past_races": 過去成績の数}}（無ければ空）
+    """
+    path = expected_counts_path(corpus_dir)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_expected_counts(corpus_dir, race_id, entries, past_races):
+    counts = load_expected_counts(corpus_dir)
+    counts[race_id] = {"entries": entries, "past_races": past_races}
+    os.makedirs(corpus_dir, exist_ok=True)
+    with open(expected_counts_path(corpus_dir), "w", encoding="utf-8") as f:
+        json.dump(counts, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def corpus_race_ids(corpus_dir):
+    """フィクスチャにある出馬表の race_id の一覧"""
+    race_dir = os.path.join(corpus_dir, "race")
+    if not os.path.isdir(race_dir):
+        return []
+    return sorted(
+        name[: -len(".html")] for name in os.listdir(race_dir) if name.endswith(".html")
+    )
+
+
+def fixture_path(corpus_dir, url_path, query):
+    """netkeibaのURLのパスを、フィクスチャのファイルのパスにする（無ければNone）"""
+    if url_path == "/race/shutuba.html":
+        race_id = (query.get("race_id") or [""])[0]
+        if race_id.isdigit():
+            return race_page_path(corpus_dir, race_id)
+    match = _HORSE_PATH_RE.match(url_path)
+    if match:
+        return horse_page_path(corpus_dir, match.group(1))
+    return None
+
+
+class FixtureServer:
+    """
+    フィクスチャのページを返すローカルのHTTPサーバー（netkeibaの代わり）。
+    出馬表（/race/shutuba.html?race_id=）と馬の成績ページ（/horse/<id>/）だけに答える。
+    latency 秒だけ待ってから返し、実際の通信の遅さを再現できる
+
+        with FixtureServer() as server:
+            analyzer = NetkeibaRaceAnalyzer(
+                race_base_url=server.url, db_base_url=server.url
+            )
+    """
+
+    def __init__(self, corpus_dir=FIXTURE_CORPUS_DIR, latency=0.0):
+        self.corpus_dir = corpus_dir
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                path = fixture_path(
+                    server.corpus_dir, parsed.path, parse_qs(parsed.query)
+                )
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if not path or not os.path.exists(path):
+                    self.send_error(404)
+                    return
+                with open(path, "rb") as f:
+                    body = f.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,102 @@
+from django.db import transaction
+
+from .bulk_upsert import bulk_upsert
+from .models import Horse, HorsePastRace, HorseStats
+from .race_queries import WIN_PLACE_RANKS
+
+# 集計に使う過去成績のカラム
+SOURCE_FIELDS = [
+    "horse_id",
+    "race_date",
+    "rank",
+    "race_grade_score",
+    "last_3f_rank",
+    "surface",
+    "distance_m",
+    "venue_name",
+]
+
+STATS_FIELDS = [
+    "race_count",
+    "win_count",
+    "win_place_count",
+    "sum_grade_score",
+    "avg_last_3f_rank",
+    "last_race_date",
+    "splits",
+]
+
+# 条件別の成績の分け方（splitsのキー → 過去成績のカラム）
+SPLIT_FIELDS = {"surface": "surface", "distance": "distance_m", "venue": "venue_name"}
+
+
+def compute_horse_stats(past_races):
+    """
+    1頭分の過去成績（SOURCE_FIELDS を持つdictのリスト）から HorseStats の値を計算する。
+    過去成績が無ければ件数0の値を返す
+    """
+    last_3f_ranks = [row["last_3f_rank"] for row in past_races if row["last_3f_rank"]]
+    race_dates = [row["race_date"] for row in past_races if row["race_date"]]
+    splits = {name: {} for name in SPLIT_FIELDS}
+    for row in past_races:
+        for name, field in SPLIT_FIELDS.items():
+            if row[field] in (None, ""):
+                continue
+            split = splits[name].setdefault(
+                str(row[field]), {"runs": 0, "wins": 0, "top3": 0}
+            )
+            split["runs"] += 1
+            split["wins"] += row["rank"] == 1
+            split["top3"] += row["rank"] in WIN_PLACE_RANKS
+    return {
+        "race_count": len(past_races),
+        "win_count": sum(1 for row in past_races if row["rank"] == 1),
+        "win_place_count": sum(
+            1 for row in past_races if row["rank"] in WIN_PLACE_RANKS
+        ),
+        "sum_grade_score": sum(row["race_grade_score"] or 0 for row in past_races),
+        "avg_last_3f_rank": (
+            round(sum(last_3f_ranks) / len(last_3f_ranks), 2) if last_3f_ranks else None
+        ),
+        "last_race_date": max(race_dates) if race_dates else None,
+        "splits": splits,
+    }
+
+
+def refresh_horse_stats(horse_ids):
+    """
+    指定した馬の HorseStats を過去成績から計算し直す（過去成績を書き込んだ馬だけ）。
+    過去成績は1クエリでまとめて読み、値が変わった馬だけ書き込む。
+    戻り値は (作成した HorseStats, 更新した HorseStats)
+    """
+    horse_ids = set(horse_ids)
+    if not horse_ids:
+        return [], []
+    past_races_by_horse = {horse_id: [] for horse_id in horse_ids}
+    for row in (
+        HorsePastRace.objects.filter(horse_id__in=horse_ids)
+        .order_by()
+        .values(*SOURCE_FIELDS)
+    ):
+        past_races_by_horse[row["horse_id"]].append(row)
+    with transaction.atomic(savepoint=False):
+        return bulk_upsert(
+            HorseStats,
+            [
+                HorseStats(horse_id=horse_id, **compute_horse_stats(past_races))
+                for horse_id, past_races in past_races_by_horse.items()
+            ],
+            ["horse_id"],
+            STATS_FIELDS,
+        )
+
+
+def rebuild_horse_stats(batch_size=500, horse_ids=None):
+    """全馬（または horse_ids の馬）の HorseStats を batch_size 頭ずつ作り直す。戻り値は頭数"""
+    queryset = Horse.objects.order_by("horse_id")
+    if horse_ids:
+        queryset = queryset.filter(horse_id__in=horse_ids)
+    all_ids = list(queryset.values_list("horse_id", flat=True))
+    for start in range(0, len(all_ids), batch_size):
+        refresh_horse_stats(all_ids[start : start + batch_size])
+    return len(all_ids)
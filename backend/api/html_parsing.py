@@ -0,0 +1,117 @@
+import importlib.util
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# lxmlが入っていればそちらを使う（html.parserより数倍速い）。無ければ標準のhtml.parser
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+
+def class_strainer(*class_names):
+    """
+    いずれかのclassを持つ要素（とその中身）だけを木にするSoupStrainer。
+    class="Active Item" のような複数指定にも一致させるため、関数で判定する
+    """
+    wanted = set(class_names)
+
+    def match(value):
+        if not value:
+            return False
+        values = value.split() if isinstance(value, str) else value
+        return not wanted.isdisjoint(values)
+
+    return SoupStrainer(class_=match)
+
+
+def parse_html(html, parse_only=None):
+    return BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
+
+
+def slice_table(html, class_name):
+    """
+    HTML文字列から class_name を持つ<table>～</table>の部分だけを切り出す。
+    ページ全体をパーサーに通さずに済む。見つからなければNone
+    """
+    position = html.find(class_name)
+    while position >= 0:
+        start = html.rfind("<table", 0, position)
+        tag_end = html.find(">", start) if start >= 0 else -1
+        # scriptやCSSに書かれたclass名ではなく、tableタグの属性であること
+        if start >= 0 and position < tag_end:
+            end = html.find("</table>", position)
+            if end < 0:
+                return None
+            return html[start : end + len("</table>")]
+        position = html.find(class_name, position + len(class_name))
+    return None
+
+
+def parse_table(html, class_name):
+    """class_name の<table>だけを読み取って返す。無ければNone"""
+    fragment = slice_table(html, class_name)
+    soup = parse_html(
+        fragment if fragment is not None else html,
+        parse_only=class_strainer(class_name),
+    )
+    return soup.find("table")
+
+
+def header_labels(table):
+    """表の見出し（最初の<th>の行）を列の順に返す。colspanの列は同じ見出しを繰り返す"""
+    for row in table.find_all("tr"):
+        headers = row.find_all("th", recursive=False)
+        if not headers:
+            continue
+        labels = []
+        for header in headers:
+            try:
+                span = int(header.get("colspan", 1))
+            except ValueError:
+                span = 1
+            labels.extend([header.get_text().strip()] * span)
+        return labels
+    return []
+
+
+def column_indexes(table, columns):
+    """
+    columns: {名前: (見出しの候補のタプル, 見出しで見つからないときの列番号)}
+    見出しが候補のどれかで始まる列の番号を {名前: 列番号} で返す。
+    見出しが無い・変わっているときは、これまでの固定の列番号を使う
+    """
+    labels = header_labels(table)
+    indexes = {}
+    for name, (candidates, default) in columns.items():
+        indexes[name] = next(
+            (i for i, label in enumerate(labels) if label.startswith(candidates)),
+            default,
+        )
+    return indexes
+
+
+class TableRow:
+    """表の1行。列は名前（column_indexes の名前）で参照する"""
+
+    def __init__(self, row, indexes):
+        self.cells = row.find_all("td", recursive=False)
+        self.indexes = indexes
+
+    def __len__(self):
+        return len(self.cells)
+
+    def cell(self, name):
+        index = self.indexes[name]
+        return self.cells[index] if index < len(self.cells) else None
+
+    def text(self, name):
+        cell = self.cell(name)
+        return cell.get_text().strip() if cell is not None else ""
+
+    def link(self, name):
+        cell = self.cell(name)
+        return cell.find("a") if cell is not None else None
+
+
+def table_rows(table, columns):
+    """<tbody>の各行を TableRow にして返す"""
+    indexes = column_indexes(table, columns)
+    return [TableRow(row, indexes) for row in table.select("tbody tr")]
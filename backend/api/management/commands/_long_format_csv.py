@@ -3,35 +3,25 @@ import re
 import time
 import pandas as pd
 from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 import argparse
 
+from api.browser_pool import get_browser_pool
+
 
 class NetkeibaRaceAnalyzer:
-    def __init__(self):
-        options = webdriver.ChromeOptions()
-        options.add_argument("--headless")  # ヘッドレスモード
-        options.add_argument(
-            "--window-size=1920,1080"
-        )  # ヘッドレスモードで要素を正しく認識させるため
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument(
-            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        )
-
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=options)
+    def __init__(self, pool=None):
+        # Chromeは共有のブラウザプールから借り、close() で返却する（終了はしない）
+        self.pool = pool or get_browser_pool()
+        self.driver = self.pool.acquire()
         self.db_base_url = "https://db.netkeiba.com"
 
     def close(self):
         if self.driver:
-            self.driver.quit()
+            self.pool.release(self.driver)
+            self.driver = None
 
     def get_race_entries(self, race_id):
         url = f"https://race.netkeiba.com/race/shutuba.html?race_id={race_id}"
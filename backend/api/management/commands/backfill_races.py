@@ -0,0 +1,294 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.fetchers import FETCHER_BACKENDS, FetchError, build_fetcher
+from api.models import Race, ScrapeJob
+from api.page_cache import get_page_cache
+from api.scrape_jobs import (
+    claim_next_job,
+    enqueue_scrape_job,
+    requeue_stale_jobs,
+    run_job,
+)
+
+RACE_LIST_URL = "https://race.netkeiba.com/top/race_list_sub.html?kaisai_date={date}"
+
+# race_id の5〜6桁目（JRAの競馬場コード）
+VENUE_CODES = {
+    "札幌": "01",
+    "函館": "02",
+    "福島": "03",
+    "新潟": "04",
+    "東京": "05",
+    "中山": "06",
+    "中京": "07",
+    "京都": "08",
+    "阪神": "09",
+    "小倉": "10",
+}
+
+_RACE_ID_RE = re.compile(r"race_id=(\d{12})")
+
+
+def parse_venue_codes(values):
+    """--venue の値（"東京" または "05"）を競馬場コードのリストにする"""
+    codes = set()
+    for value in values:
+        for item in value.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            code = VENUE_CODES.get(item, item.zfill(2))
+            if code not in VENUE_CODES.values():
+                raise CommandError(f"不明な競馬場です: {item}")
+            codes.add(code)
+    return sorted(codes)
+
+
+def race_ids_from_list_page(html, venue_codes=()):
+    """レース一覧ページ（race_list_sub.html）から race_id を読み取る"""
+    race_ids = sorted(set(_RACE_ID_RE.findall(html)))
+    if venue_codes:
+        race_ids = [race_id for race_id in race_ids if race_id[4:6] in venue_codes]
+    return race_ids
+
+
+def date_range(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+class Checkpoint:
+    """
+    レース一覧を取得済みの日付をファイルに記録する（中断後の再実行で取得し直さないため）。
+    レースごとの進捗はDBのジョブ（ScrapeJob）に残る
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dates = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.dates = set(json.load(f).get("enumerated_dates", []))
+
+    def __contains__(self, day):
+        return day.isoformat() in self.dates
+
+    def add(self, day):
+        self.dates.add(day.isoformat())
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"enumerated_dates": sorted(self.dates)}, f)
+        os.replace(temp_path, self.path)
+
+
+class Command(BaseCommand):
+    help = (
+        "期間（と競馬場）を指定して、開催されたレースをまとめてスクレイピングします。"
+        "ジョブはDBに保存されるため、中断しても同じ引数で再実行すれば続きから処理します。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", required=True, help="開始日（YYYY-MM-DD）")
+        parser.add_argument("--end", required=True, help="終了日（YYYY-MM-DD）")
+        parser.add_argument(
+            "--venue",
+            action="append",
+            default=[],
+            help="対象の競馬場（名前またはコード。複数指定可。省略時はすべて）",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=2,
+            help="同時に処理するレース数",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="DBに既にあるレースも取得し直します。",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="このバッチで失敗したジョブを待機中に戻して再実行します。",
+        )
+        parser.add_argument(
+            "--export-csv",
+            action="store_true",
+            help="レースごとにCSVも出力します。",
+        )
+        parser.add_argument(
+            "--fetcher",
+            choices=sorted(FETCHER_BACKENDS),
+            default=None,
+            help="ページ取得方法（既定: settings.SCRAPE_FETCHER）",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=None,
+            help="1ホストあたりの最大リクエスト数（回/秒, 既定: settings.SCRAPE_RATE_LIMIT）",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="1ホストあたりの最大同時接続数（既定: settings.SCRAPE_MAX_CONCURRENCY）",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options["start"], "%Y-%m-%d").date()
+            end = datetime.strptime(options["end"], "%Y-%m-%d").date()
+        except ValueError:
+            raise CommandError("日付は YYYY-MM-DD で指定してください。") from None
+        if start > end:
+            raise CommandError("--start は --end 以前の日付にしてください。")
+        venue_codes = parse_venue_codes(options["venue"])
+        workers = max(1, options["workers"])
+
+        # 同じ引数なら同じバッチ名になり、再実行時は続きから処理する
+        batch = f"backfill:{start:%Y%m%d}-{end:%Y%m%d}:{','.join(venue_codes) or 'all'}"
+        checkpoint = Checkpoint(
+            os.path.join(
+                settings.BACKFILL_CHECKPOINT_DIR, f"{batch.replace(':', '_')}.json"
+            )
+        )
+
+        # 前回の実行が途中で落ちた場合、実行中のまま残ったジョブを待機中に戻す。
+        # 同じ引数で実行中の別のプロセスのジョブは取り上げないよう、古いものだけにする
+        requeued = requeue_stale_jobs(
+            batch, older_than=settings.SCRAPE_JOB_STALE_TIMEOUT
+        )
+        if requeued:
+            self.stdout.write(f"中断されていた {requeued} 件のジョブを再開します。")
+        if options["retry_failed"]:
+            retried = ScrapeJob.objects.filter(
+                batch=batch, status=ScrapeJob.STATUS_FAILED
+            ).update(status=ScrapeJob.STATUS_QUEUED, started_at=None, error_message="")
+            self.stdout.write(f"失敗した {retried} 件のジョブを再実行します。")
+
+        with build_fetcher(
+            options["fetcher"],
+            rate=options["rate"],
+            max_concurrency=options["concurrency"],
+        ) as fetcher:
+            self.enqueue_races(
+                fetcher, start, end, venue_codes, batch, checkpoint, options["force"]
+            )
+            self.run_jobs(fetcher, batch, workers, options["export_csv"])
+
+    def enqueue_races(self, fetcher, start, end, venue_codes, batch, checkpoint, force):
+        """期間内の開催日ごとにレース一覧を取得し、ジョブを登録する"""
+        for day in date_range(start, end):
+            if day in checkpoint:
+                continue
+            url = RACE_LIST_URL.format(date=f"{day:%Y%m%d}")
+            try:
+                html = fetcher.fetch(url)
+            except FetchError as e:
+                # チェックポイントに記録しないため、再実行時にもう一度取得する
+                self.stderr.write(f"{day} のレース一覧を取得できませんでした: {e}")
+                continue
+
+            race_ids = race_ids_from_list_page(html, venue_codes)
+            existing = set()
+            if not force:
+                existing = set(
+                    Race.objects.filter(race_id__in=race_ids).values_list(
+                        "race_id", flat=True
+                    )
+                )
+            done = set(
+                ScrapeJob.objects.filter(
+                    batch=batch,
+                    race_id__in=race_ids,
+                    status=ScrapeJob.STATUS_COMPLETED,
+                ).values_list("race_id", flat=True)
+            )
+            created_count = 0
+            for race_id in race_ids:
+                if race_id in existing or race_id in done:
+                    continue
+                _, created = enqueue_scrape_job(race_id, batch=batch)
+                created_count += created
+            checkpoint.add(day)
+            if race_ids:
+                self.stdout.write(
+                    f"{day}: {len(race_ids)} レース（新規ジョブ {created_count} 件）"
+                )
+
+    def run_jobs(self, fetcher, batch, workers, export_csv):
+        """バッチの待機中ジョブを workers 並列で処理し、進捗と処理速度を表示する"""
+        total = ScrapeJob.objects.filter(
+            batch=batch, status=ScrapeJob.STATUS_QUEUED
+        ).count()
+        if not total:
+            self.stdout.write(self.style.SUCCESS("処理するレースはありません。"))
+            return
+        self.stdout.write(f"{total} レースを {workers} 並列で処理します。")
+
+        lock = threading.Lock()
+        counts = {"completed": 0, "failed": 0}
+        started = time.monotonic()
+
+        def report(job):
+            with lock:
+                key = "completed" if job.status == ScrapeJob.STATUS_COMPLETED else "failed"
+                counts[key] += 1
+                finished = counts["completed"] + counts["failed"]
+                elapsed_min = max(time.monotonic() - started, 1e-6) / 60
+                message = (
+                    f"[{finished}/{total}] {job.race_id} {job.status} "
+                    f"({finished / elapsed_min:.1f} races/min)"
+                )
+            if job.status == ScrapeJob.STATUS_COMPLETED:
+                self.stdout.write(message)
+            else:
+                self.stderr.write(f"{message}: {job.error_message}")
+
+        def work():
+            try:
+                while True:
+                    job = claim_next_job(batch)
+                    if not job:
+                        return
+                    report(run_job(job, fetcher=fetcher, export_csv=export_csv))
+            finally:
+                # スレッドごとのDB接続を閉じる
+                if workers > 1:
+                    connection.close()
+
+        if workers == 1:
+            work()
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in [executor.submit(work) for _ in range(workers)]:
+                    future.result()
+
+        elapsed_min = (time.monotonic() - started) / 60
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"完了 {counts['completed']} 件 / 失敗 {counts['failed']} 件 "
+                f"（{elapsed_min:.1f} 分）"
+            )
+        )
+        page_cache = get_page_cache()
+        if page_cache:
+            stats = page_cache.stats()
+            self.stdout.write(
+                f"成績ページのキャッシュ: ヒット {stats['hits']} / ミス {stats['misses']}"
+            )
@@ -1,39 +1,27 @@
 import argparse
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
+from api.browser_pool import get_browser_pool
+
 
 class BatonScrape:
     """
     指定されたサイトにログインし、情報をスクレイピングするためのクラス。
     """
 
-    def __init__(self, base_url: str):
-        """WebDriverとオプションを初期化します。"""
+    def __init__(self, base_url: str, pool=None):
+        """WebDriverを共有のブラウザプールから借ります。"""
         print("WebDriverを初期化しています...")
-        options = webdriver.ChromeOptions()
-        # options.add_argument("--headless")
-        # options.add_argument("--window-size=1920,1080")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument(
-            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        )
-        options.add_argument("--disable-gpu")
-        options.add_experimental_option(
-            "prefs", {"profile.managed_default_content_settings.images": 2}
+        # ログイン操作を目視するため画面ありで起動し、タブを開くためポップアップを許可する
+        self.pool = pool or get_browser_pool(
+            headless=False, extra_arguments=("--disable-popup-blocking",)
         )
-        options.add_argument("--disable-popup-blocking")
-
         try:
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=options)
+            self.driver = self.pool.acquire()
         except Exception as e:
             print(f"WebDriverの初期化中にエラーが発生しました: {e}")
             raise
@@ -42,10 +30,11 @@ class BatonScrape:
         print("WebDriverの初期化が完了しました。")
 
     def close(self):
-        """WebDriverを終了します。"""
+        """WebDriverをプールに返却します（余分なタブとCookieは消去されます）。"""
         if self.driver:
-            self.driver.quit()
-            print("ブラウザを終了しました。")
+            self.pool.release(self.driver)
+            self.driver = None
+            print("ブラウザを返却しました。")
 
     def login(self, email, password):
         """
@@ -0,0 +1,105 @@
+import glob
+import gzip
+import os
+import time
+
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.html_parsing import HTML_PARSER, parse_html, parse_table, table_rows
+from api.management.commands.scrape_race import (
+    ENTRY_COLUMNS,
+    PAST_RACE_COLUMNS,
+    RACE_PAGE_STRAINER,
+)
+
+
+def read_page(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return f.read()
+
+
+def parse_full(html, table_class):
+    """これまでの読み方: ページ全体をhtml.parserで木にしてから表を探す"""
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table", class_=table_class)
+    if not table:
+        return 0
+    return sum(
+        len([cell.text.strip() for cell in row.find_all("td")])
+        for row in table.select("tbody tr")
+    )
+
+
+def parse_targeted(html, table_class):
+    """必要な部分だけを木にし、列は見出しで引く"""
+    if table_class == "db_h_race_results":
+        table = parse_table(html, table_class)
+        columns = PAST_RACE_COLUMNS
+    else:
+        table = parse_html(html, parse_only=RACE_PAGE_STRAINER).find(
+            "table", class_=table_class
+        )
+        columns = ENTRY_COLUMNS
+    if not table:
+        return 0
+    return sum(
+        len([row.text(name) for name in columns]) for row in table_rows(table, columns)
+    )
+
+
+PAGE_TABLES = ("db_h_race_results", "Shutuba_Table")
+
+
+class Command(BaseCommand):
+    help = (
+        "保存済みのページ（出馬表・馬の成績ページ）で、HTMLの読み取り1ページあたりの時間を"
+        "これまでの方法（ページ全体をhtml.parser）と比べます。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="HTMLファイル（.html / .html.gz）。省略時は settings.PAGE_CACHE_DIR のページ",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=50, help="使うページ数の上限"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="1ページを読む回数（最速の回を使う）"
+        )
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or sorted(
+            glob.glob(os.path.join(settings.PAGE_CACHE_DIR, "*", "*.html.gz"))
+        )
+        pages = []
+        for path in paths[: options["limit"]]:
+            html = read_page(path)
+            table_class = next((name for name in PAGE_TABLES if name in html), None)
+            if table_class:
+                pages.append((html, table_class))
+        if not pages:
+            raise CommandError("読み取れるページがありません。")
+
+        self.stdout.write(f"{len(pages)} ページ（パーサー: {HTML_PARSER}）")
+        results = {}
+        for label, parse in (("全体 html.parser", parse_full), ("対象部分のみ", parse_targeted)):
+            elapsed = 0.0
+            for html, table_class in pages:
+                best = None
+                for _ in range(max(1, options["repeat"])):
+                    started = time.perf_counter()
+                    parse(html, table_class)
+                    took = time.perf_counter() - started
+                    best = took if best is None else min(best, took)
+                elapsed += best
+            results[label] = elapsed / len(pages) * 1000
+            self.stdout.write(f"{label}: {results[label]:.2f} ms/ページ")
+
+        baseline, targeted = results.values()
+        if targeted:
+            self.stdout.write(self.style.SUCCESS(f"{baseline / targeted:.1f} 倍速くなりました。"))
@@ -0,0 +1,211 @@
+import contextlib
+import io
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.fetchers import FetchError, HttpFetcher, RateLimitedFetcher
+from api.fixture_server import (
+    FIXTURE_CORPUS_DIR,
+    FixtureServer,
+    corpus_race_ids,
+    load_expected_counts,
+)
+from api.management.commands.scrape_race import NetkeibaRaceAnalyzer, ScrapeError
+from api.models import Entry, HorsePastRace
+
+
+class BenchmarkStats:
+    """取得・読み取り・書き込みの時間と回数をスレッドをまたいで集計する"""
+
+    def __init__(self):
+        self.pages = 0
+        self.fetch_seconds = 0.0
+        self.parse_pages = 0
+        self.parse_seconds = 0.0
+        self.write_seconds = 0.0
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def add(self, **values):
+        with self._lock:
+            for name, value in values.items():
+                setattr(self, name, getattr(self, name) + value)
+
+
+class TimedFetcher(RateLimitedFetcher):
+    def __init__(self, fetcher, rate, max_concurrency, stats):
+        super().__init__(fetcher, rate, max_concurrency)
+        self.stats = stats
+
+    def fetch(self, url, wait_css=None, marker=None):
+        started = time.perf_counter()
+        try:
+            return super().fetch(url, wait_css=wait_css, marker=marker)
+        finally:
+            self.stats.add(pages=1, fetch_seconds=time.perf_counter() - started)
+
+
+class BenchmarkAnalyzer(NetkeibaRaceAnalyzer):
+    """ページの読み取りとDBへの書き込みにかかった時間を数える NetkeibaRaceAnalyzer"""
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def parse_race_page(self, race_id, html):
+        started = time.perf_counter()
+        try:
+            return super().parse_race_page(race_id, html)
+        finally:
+            self.stats.add(parse_pages=1, parse_seconds=time.perf_counter() - started)
+
+    def parse_past_races(self, horse, html, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().parse_past_races(horse, html, *args, **kwargs)
+        finally:
+            self.stats.add(parse_pages=1, parse_seconds=time.perf_counter() - started)
+
+    def save_race(self, race_id, race_defaults, entries, past_race_rows):
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            result = super().save_race(race_id, race_defaults, entries, past_race_rows)
+        self.stats.add(
+            write_seconds=time.perf_counter() - started, queries=len(queries)
+        )
+        return result
+
+
+class Command(BaseCommand):
+    help = (
+        "記録済みのページ（api/scraper_fixtures）をローカルのHTTPサーバーから返し、"
+        "netkeibaに接続せずに NetkeibaRaceAnalyzer の処理速度を測ります。"
+        "DBへの書き込みは既定でロールバックします。"
+        "読み取れた出走馬・過去成績の数がフィクスチャの期待件数と違えばエラーにします。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "race_ids", nargs="*", help="対象のrace_id（省略時はフィクスチャのすべて）"
+        )
+        parser.add_argument(
+            "--corpus", default=FIXTURE_CORPUS_DIR, help="フィクスチャのディレクトリ"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="各レースを処理する回数"
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="サーバーが1ページを返すまでに待つ秒数（通信の遅さの再現）",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="馬の成績ページを同時に取得する数（既定: settings.SCRAPE_MAX_CONCURRENCY）",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=1000.0,
+            help="最大リクエスト数（回/秒）。既定ではほぼ制限しない",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="差分取得（DBにある過去成績は読まない）で測ります。",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="書き込んだデータをロールバックせずに残します。",
+        )
+
+    def handle(self, *args, **options):
+        corpus_dir = options["corpus"]
+        race_ids = options["race_ids"] or corpus_race_ids(corpus_dir)
+        if not race_ids:
+            raise CommandError(f"{corpus_dir} に出馬表のページがありません。")
+        expected_counts = load_expected_counts(corpus_dir)
+        missing = [race_id for race_id in race_ids if race_id not in expected_counts]
+        if missing:
+            raise CommandError(
+                f"{', '.join(missing)} の期待件数が expected_counts.json にありません"
+                "（record_scraper_fixtures で記録し直してください）。"
+            )
+
+        stats = BenchmarkStats()
+        concurrency = options["concurrency"] or settings.SCRAPE_MAX_CONCURRENCY
+        with FixtureServer(corpus_dir, latency=options["latency"]) as server:
+            fetcher = TimedFetcher(HttpFetcher(), options["rate"], concurrency, stats)
+            analyzer = BenchmarkAnalyzer(
+                stats,
+                fetcher=fetcher,
+                max_concurrency=concurrency,
+                incremental=options["incremental"],
+                race_base_url=server.url,
+                db_base_url=server.url,
+            )
+            started = time.perf_counter()
+            races = 0
+            try:
+                for _ in range(max(1, options["repeat"])):
+                    for race_id in race_ids:
+                        self.run_race(
+                            analyzer,
+                            race_id,
+                            expected_counts[race_id],
+                            options["keep"],
+                        )
+                        races += 1
+            finally:
+                fetcher.close()
+            elapsed = time.perf_counter() - started
+
+        if not stats.pages:
+            raise CommandError("ページを1件も取得できませんでした。")
+        self.stdout.write(f"{races} レース / {stats.pages} ページ / {elapsed:.2f} 秒")
+        self.stdout.write(f"  取得: {stats.pages / elapsed:.1f} pages/sec")
+        self.stdout.write(
+            f"  取得: {stats.fetch_seconds / stats.pages * 1000:.2f} ms/ページ"
+        )
+        if stats.parse_pages:
+            self.stdout.write(
+                f"  読み取り: {stats.parse_seconds / stats.parse_pages * 1000:.2f} ms/ページ"
+            )
+        self.stdout.write(f"  書き込み: {stats.write_seconds / races * 1000:.2f} ms/レース")
+        self.stdout.write(f"  書き込みのDBクエリ: {stats.queries / races:.1f} 件/レース")
+
+    def run_race(self, analyzer, race_id, expected, keep):
+        """
+        1レースを取得して保存し、読み取れた出走馬・過去成績の数が
+        フィクスチャの期待件数と一致するかを確かめる（一致しなければ CommandError）
+        """
+        # 解析中の進捗表示は測定の邪魔になるため捨てる
+        with transaction.atomic(), contextlib.redirect_stdout(io.StringIO()):
+            try:
+                analyzer.get_race_entry(race_id, entry_only=False)
+            except (FetchError, ScrapeError) as e:
+                raise CommandError(f"{race_id} を読み取れませんでした: {e}")
+            horse_ids = Entry.objects.filter(race_id=race_id).values("horse_id")
+            counts = {
+                "entries": horse_ids.count(),
+                "past_races": HorsePastRace.objects.filter(
+                    horse_id__in=horse_ids
+                ).count(),
+            }
+            if counts != expected:
+                raise CommandError(
+                    f"{race_id} の読み取り結果が期待と違います: "
+                    f"出走馬 {counts['entries']}/{expected['entries']} 頭、"
+                    f"過去成績 {counts['past_races']}/{expected['past_races']} 件"
+                )
+            if not keep:
+                transaction.set_rollback(True)
@@ -0,0 +1,105 @@
+import contextlib
+import io
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.fetchers import HttpFetcher
+from api.fixture_server import FIXTURE_CORPUS_DIR, FixtureServer, corpus_race_ids
+from api.management.commands.scrape_race import NetkeibaRaceAnalyzer
+from api.models import Race
+from api.race_payloads import race_detail_payload
+from api.race_queries import DEFAULT_ENTRY_ORDERING, prefetch_race_entries
+from api.renderers import ORJSONRenderer
+from api.serializers import RaceSerializer
+
+# APIと同じ並び
+ORDERING = DEFAULT_ENTRY_ORDERING
+
+
+def build_with_serializers(race):
+    race = Race.objects.get(pk=race.pk)
+    prefetch_race_entries(race, ordering=ORDERING)
+    return RaceSerializer(race).data
+
+
+def build_with_values(race):
+    return race_detail_payload(race, ordering=ORDERING)
+
+
+class Command(BaseCommand):
+    help = (
+        "レース詳細レスポンスの作成時間を、DRFのシリアライザ + JSONRenderer と "
+        "values() からの作成 + orjson で比べます。"
+        "race_id を省略するとフィクスチャの出馬表を読み込んで測ります（DBには残しません）。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("race_id", nargs="?", help="測定するレースのrace_id")
+        parser.add_argument(
+            "--corpus", default=FIXTURE_CORPUS_DIR, help="フィクスチャのディレクトリ"
+        )
+        parser.add_argument("--repeat", type=int, default=50, help="測定の回数")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            race_id = options["race_id"] or self.load_fixture_race(options["corpus"])
+            race = Race.objects.filter(race_id=race_id).first()
+            if not race:
+                raise CommandError(f"{race_id} がDBにありません。")
+            try:
+                self.run(race, max(1, options["repeat"]))
+            finally:
+                # フィクスチャから読み込んだデータは残さない
+                transaction.set_rollback(True)
+
+    def load_fixture_race(self, corpus_dir):
+        race_ids = corpus_race_ids(corpus_dir)
+        if not race_ids:
+            raise CommandError(f"{corpus_dir} に出馬表のページがありません。")
+        with FixtureServer(corpus_dir) as server, contextlib.redirect_stdout(
+            io.StringIO()
+        ):
+            analyzer = NetkeibaRaceAnalyzer(
+                fetcher=HttpFetcher(), race_base_url=server.url, db_base_url=server.url
+            )
+            try:
+                analyzer.get_race_entry(race_ids[0], entry_only=False)
+            finally:
+                analyzer.close()
+        return race_ids[0]
+
+    def run(self, race, repeat):
+        results = {}
+        for name, build, renderer in (
+            ("DRFシリアライザ + JSONRenderer", build_with_serializers, JSONRenderer()),
+            ("values() + orjson", build_with_values, ORJSONRenderer()),
+        ):
+            build_seconds = render_seconds = 0.0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                data = build(race)
+                built = time.perf_counter()
+                body = renderer.render(data)
+                render_seconds += time.perf_counter() - built
+                build_seconds += built - started
+            results[name] = (build_seconds / repeat, render_seconds / repeat, body)
+
+        entries = json.loads(body)["entries"]
+        past_races = sum(len(entry["horse"]["past_races"]) for entry in entries)
+        self.stdout.write(
+            f"{race.race_id}: {len(entries)} 頭 / 過去成績 {past_races} 件 / {repeat} 回の平均"
+        )
+        for name, (build_seconds, render_seconds, body) in results.items():
+            self.stdout.write(
+                f"  {name}: 作成 {build_seconds * 1000:.2f} ms + "
+                f"JSON化 {render_seconds * 1000:.2f} ms = "
+                f"{(build_seconds + render_seconds) * 1000:.2f} ms（{len(body)} bytes）"
+            )
+        bodies = [json.loads(body) for _, _, body in results.values()]
+        if bodies[0] != bodies[1]:
+            raise CommandError("2つの方法の出力が一致しません。")
+        self.stdout.write(self.style.SUCCESS("出力は一致しました。"))
@@ -0,0 +1,61 @@
+import time
+
+from django.utils.text import compress_string
+
+from api.management.commands import benchmark_serialization
+from api.middleware import brotli, compress_brotli
+from api.race_snapshots import build_race_detail_data
+from api.renderers import ColumnarJSONRenderer, ORJSONRenderer
+
+FORMATS = (
+    ("入れ子（application/json）", ORJSONRenderer()),
+    ("列形式（columnar）", ColumnarJSONRenderer()),
+)
+
+ENCODINGS = [("なし", None), ("gzip", compress_string)]
+if brotli is not None:
+    ENCODINGS.append(("br", compress_brotli))
+
+
+class Command(benchmark_serialization.Command):
+    help = (
+        "レース詳細レスポンスのサイズと、JSON化 + 圧縮の時間を、入れ子の形式と列形式、"
+        "圧縮なし・gzip・brotli で比べます。--bandwidth の回線での転送時間の目安も出します。"
+        "race_id を省略するとフィクスチャの出馬表を読み込んで測ります（DBには残しません）。"
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--bandwidth",
+            type=float,
+            default=10.0,
+            help="転送時間の目安に使う回線速度（Mbps）",
+        )
+
+    def handle(self, *args, **options):
+        self.bandwidth = options["bandwidth"]
+        super().handle(*args, **options)
+
+    def run(self, race, repeat):
+        data = build_race_detail_data(race)
+        past_races = sum(len(entry["horse"]["past_races"]) for entry in data["entries"])
+        self.stdout.write(
+            f"{race.race_id}: {len(data['entries'])} 頭 / 過去成績 {past_races} 件 / "
+            f"{repeat} 回の平均 / 転送 {self.bandwidth:g} Mbps"
+        )
+        for format_name, renderer in FORMATS:
+            for encoding_name, compress in ENCODINGS:
+                seconds = 0.0
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    body = renderer.render(data)
+                    if compress:
+                        body = compress(body)
+                    seconds += time.perf_counter() - started
+                transfer_seconds = len(body) * 8 / (self.bandwidth * 1_000_000)
+                self.stdout.write(
+                    f"  {format_name} / 圧縮 {encoding_name}: {len(body)} bytes、"
+                    f"JSON化 + 圧縮 {seconds / repeat * 1000:.2f} ms + "
+                    f"転送 {transfer_seconds * 1000:.2f} ms"
+                )
@@ -0,0 +1,83 @@
+import datetime
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.features import (
+    DATASET_FORMATS,
+    FEATURE_COLUMNS,
+    build_features,
+    default_dataset_format,
+    write_dataset,
+)
+from api.models import Race
+
+
+class Command(BaseCommand):
+    help = (
+        "レースの出走馬ごとの特徴量（近走成績・スピード指数・騎手/コースの集計）を"
+        "まとめて計算し、Parquet または NPZ に書き出します。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("race_ids", nargs="*", help="対象のrace_id")
+        parser.add_argument(
+            "--start", type=datetime.date.fromisoformat, help="開催日の範囲の開始（YYYY-MM-DD）"
+        )
+        parser.add_argument(
+            "--end", type=datetime.date.fromisoformat, help="開催日の範囲の終了（YYYY-MM-DD）"
+        )
+        parser.add_argument(
+            "--format",
+            choices=DATASET_FORMATS,
+            default=None,
+            help="出力形式（既定: pyarrowがあればparquet、無ければnpz）",
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="出力ファイル（既定: settings.FEATURE_EXPORT_DIR/features.<形式>）",
+        )
+
+    def handle(self, *args, **options):
+        races = Race.objects.all()
+        if options["race_ids"]:
+            races = races.filter(race_id__in=options["race_ids"])
+        if options["start"]:
+            races = races.filter(race_date__gte=options["start"])
+        if options["end"]:
+            races = races.filter(race_date__lte=options["end"])
+        if not (options["race_ids"] or options["start"] or options["end"]):
+            raise CommandError("race_id か --start / --end を指定してください。")
+
+        dataset_format = options["format"] or default_dataset_format()
+        output = options["output"] or os.path.join(
+            settings.FEATURE_EXPORT_DIR, f"features.{dataset_format}"
+        )
+
+        started = time.monotonic()
+        features = build_features(races)
+        built = time.monotonic()
+        if features.empty:
+            raise CommandError("対象のレースに出走馬がありません。")
+
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        try:
+            write_dataset(features, output, dataset_format)
+        except ImportError as e:
+            raise CommandError(
+                f"{dataset_format} で書き出せません（{e}）。--format npz を指定してください。"
+            )
+        finished = time.monotonic()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{features['race_id'].nunique()} レース / {len(features)} 頭 / "
+                f"特徴量 {len(FEATURE_COLUMNS)} 個を '{output}' に書き出しました。"
+            )
+        )
+        self.stdout.write(
+            f"  計算: {built - started:.2f} 秒 / 書き出し: {finished - built:.2f} 秒"
+        )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.models import Race
+from api.race_snapshots import fresh_snapshot, save_race_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "レース詳細のJSON（RaceSnapshot）を描画して保存します。"
+        "通常はスクレイピング完了時に作られるため、それ以前に取得したレースに使います。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "race_ids", nargs="*", help="対象のrace_id（省略時はすべてのレース）"
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="最新のスナップショットがあっても描画し直します。",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        races = (
+            Race.objects.select_related("snapshot")
+            .defer("snapshot__body")
+            .order_by("race_id")
+        )
+        if options["race_ids"]:
+            races = races.filter(race_id__in=options["race_ids"])
+        built = 0
+        for race in races.iterator():
+            if options["force"] or not fresh_snapshot(race):
+                save_race_snapshot(race.race_id)
+                built += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{built} レースのスナップショットを作りました（{time.monotonic() - started:.1f} 秒）。"
+            )
+        )
@@ -0,0 +1,127 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.models import HorsePastRace, Race
+from api.race_queries import filter_past_races, race_entries_queryset
+
+# 絞り込みありのクエリも確認する（フロントエンドの既定の条件に近いもの）
+SAMPLE_FILTERS = {
+    "venue": "東京",
+    "weather": ["晴"],
+    "ground_condition": ["良"],
+    "recent": 5,
+    "max_rank": 5,
+    "same_jockey": True,
+}
+
+
+def find_full_scans(plan_rows, vendor):
+    """
+    EXPLAINの結果から全件走査しているテーブル名のリストを返す。
+    - sqlite: EXPLAIN QUERY PLAN の "SCAN <table>"（USING INDEX でも全件をたどるため対象）
+    - mysql: EXPLAIN の type が "ALL" の行
+    - postgresql: "Seq Scan on <table>"
+    """
+    tables = []
+    for row in plan_rows:
+        if vendor == "sqlite":
+            match = re.match(r"SCAN (?:TABLE )?(\w+)", row[-1])
+            if match and match.group(1) not in ("CONSTANT", "SUBQUERY"):
+                tables.append(match.group(1))
+        elif vendor == "mysql":
+            # id, select_type, table, partitions, type, ...
+            if row[4] == "ALL":
+                tables.append(row[2])
+        elif vendor == "postgresql":
+            match = re.search(r"Seq Scan on (\w+)", row[0])
+            if match:
+                tables.append(match.group(1))
+    return tables
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return cursor.fetchall()
+
+
+class Command(BaseCommand):
+    help = (
+        "レース詳細APIが発行するクエリをEXPLAINし、全件走査があれば失敗します。"
+        "（インデックスが効いているかの確認用）"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "race_id",
+            nargs="?",
+            type=str,
+            help="確認に使うrace_id（省略時は最新のレース）",
+        )
+        parser.add_argument(
+            "--allow-table",
+            action="append",
+            default=[],
+            help="全件走査を許可するテーブル名（複数指定可）",
+        )
+        parser.add_argument(
+            "--show-plan",
+            action="store_true",
+            help="EXPLAINの結果をすべて表示します。",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("sqlite", "mysql", "postgresql"):
+            raise CommandError(f"{connection.vendor} には対応していません。")
+
+        if options["race_id"]:
+            race = Race.objects.filter(race_id=options["race_id"]).first()
+        else:
+            race = Race.objects.first()
+        if not race:
+            raise CommandError("確認に使うレースがありません。")
+
+        horse_ids = list(race.entries.values_list("horse_id", flat=True)) or ["0"]
+        queries = [("レース", Race.objects.filter(race_id=race.race_id))]
+        for label, filters in (("絞り込みなし", None), ("絞り込みあり", SAMPLE_FILTERS)):
+            queries.append(
+                (f"出走馬（{label}）", race_entries_queryset(race, filters=filters))
+            )
+            queries.append(
+                (
+                    f"過去成績のprefetch（{label}）",
+                    filter_past_races(HorsePastRace.objects.all(), race, filters).filter(
+                        horse_id__in=horse_ids
+                    ),
+                )
+            )
+
+        allowed = set(options["allow_table"])
+        failures = []
+        for label, queryset in queries:
+            plan_rows = explain(queryset)
+            if options["show_plan"]:
+                self.stdout.write(f"--- {label}")
+                for row in plan_rows:
+                    self.stdout.write(f"  {row}")
+            full_scans = [
+                table
+                for table in find_full_scans(plan_rows, connection.vendor)
+                if table not in allowed
+            ]
+            if full_scans:
+                failures.append(f"{label}: {', '.join(sorted(set(full_scans)))}")
+
+        if failures:
+            raise CommandError(
+                "全件走査しているクエリがあります:\n" + "\n".join(failures)
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(queries)} 件のクエリはすべてインデックスを使っています。"
+            )
+        )
@@ -0,0 +1,63 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.parquet_exports import DATASETS, clear_export, export_parquet
+
+
+class Command(BaseCommand):
+    help = (
+        "レース・出走情報・過去成績を、年・開催地で分割した Parquet のデータセットに出力します。"
+        "前回までに出力したレース・過去成績は出力せず、新しいものだけ追記します。"
+        "出力後にデータが変わったレース（data_version が上がったもの）と、"
+        "その出走馬の過去成績は書き直します。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="出力先のディレクトリ（既定: settings.PARQUET_EXPORT_DIR）",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="出力済みのデータセットを消して、すべて出力し直します。",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="1度に出力するレース数"
+        )
+        parser.add_argument(
+            "--past-race-batch-size",
+            type=int,
+            default=100000,
+            help="1度に出力する過去成績の行数",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise CommandError("Parquet の出力には pyarrow が必要です（pip install pyarrow）。")
+
+        output_dir = options["output"] or settings.PARQUET_EXPORT_DIR
+        if options["full"]:
+            clear_export(output_dir)
+
+        started = time.monotonic()
+        counts = export_parquet(
+            output_dir,
+            race_batch_size=max(1, options["batch_size"]),
+            past_race_batch_size=max(1, options["past_race_batch_size"]),
+        )
+        for name in DATASETS:
+            self.stdout.write(
+                f"  {name}: {counts[name]} 行を追記 → {os.path.join(output_dir, name)}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Parquet の出力が完了しました（{time.monotonic() - started:.1f} 秒）。"
+            )
+        )
@@ -2,19 +2,31 @@
 
 import csv  # csvライブラリをインポート
 from django.core.management.base import BaseCommand, CommandError
-from django.db.models import Q, Count, Sum
-from api.models import Race, Entry 
-from api.serializers import (
-    RaceSerializer,
-    EntrySerializer,
-)  
+from api.models import Race
+from api.race_queries import prefetch_race_entries
+from api.serializers import RaceSerializer
+from api.csv_exports import (
+    LONG_FORMAT_HEADER,
+    csv_export_path,
+    is_csv_export_fresh,
+    remove_stale_csv_exports,
+)
 import os
+import tempfile
 
 class Command(BaseCommand):
     help = "指定されたrace_idのレース詳細データをCSVファイルとして出力します。"
 
+    # 出力した（最新のCSVが既にあればその）ファイルのパス。call_command_utils.export_race_csv が返す
+    output_path = None
+
     def add_arguments(self, parser):
         parser.add_argument("race_id", type=str, help="出力したいレースのrace_id")
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="最新のCSVが既にあっても出力し直します。",
+        )
 
     def handle(self, *args, **options):
         race_id = options["race_id"]
@@ -25,68 +37,43 @@ class Command(BaseCommand):
         if not race:
             raise CommandError("データ取得後もレース情報が存在しません。")
 
-        win_place_condition = Q(horse__past_races__rank__in=[1, 2, 3])
-
-        sorted_entries = (
-            Entry.objects.filter(race=race)
-            .select_related("jockey", "horse")
-            .prefetch_related("horse__past_races")
-            .annotate(
-                win_place_count=Count("horse__past_races", filter=win_place_condition),
-                sum_grade_score=Sum("horse__past_races__race_grade_score"),
-            )
-            .order_by("-win_place_count", "-sum_grade_score")
-        )
+        # データが変わっていなければ（同じdata_versionのCSVがあれば）出力し直さない
+        if is_csv_export_fresh(race) and not options["force"]:
+            self.output_path = csv_export_path(race)
+            self.stdout.write(f"最新のCSV '{self.output_path}' が既にあります。")
+            return
 
+        # 過去成績の集計値を付けて並べ替えた出走馬をprefetchする（APIと共通のクエリ）
+        prefetch_race_entries(race)
         race_serializer = RaceSerializer(race)
-        entry_serializer = EntrySerializer(sorted_entries, many=True)
 
         response_data = race_serializer.data
-        response_data["entries"] = entry_serializer.data
 
         # --- ファイルに出力 ---
-        output_dir = os.path.join("output\CSVfiles")
+        # 1. ファイル名にdata_versionを含めたパス（settings.CSV_EXPORT_DIR 配下）
+        output_filename = csv_export_path(race)
 
         # 2. ディレクトリが存在しない場合は、安全に作成します
-        os.makedirs(output_dir, exist_ok=True)
-
-        # 3. ディレクトリのパスとCSVファイル名を結合して、書き込み先の「完全なパス」を生成します
-        output_filename = os.path.join(output_dir, f"{race_id}.csv")
-
-        header = [
-            "レコード種別",
-            "馬番",
-            "枠番",
-            "馬名",
-            # "性齢",
-            "今回の斤量",
-            "今回の騎手",
-            # "調教師",
-            # "馬体重(増減)",
-            "オッズ",
-            "日付",
-            "開催",
-            "天気",
-            "レース名",
-            "頭数",
-            "過去の馬番",
-            "過去の枠番",
-            "過去のオッズ",
-            "着順",
-            "過去の騎手",
-            "過去の斤量",
-            "コース",
-            "馬場状態",
-            "タイム",
-            "着差",
-            "通過",
-            "ペース",
-            "last_3f",
-            "body_weight",
-        ]
+        os.makedirs(os.path.dirname(output_filename), exist_ok=True)
+
+        # 3. 書き込み途中のファイルを読まれないよう、一時ファイルに書いてから置き換えます
+        #    （同時に出力しても互いのファイルを上書きしないよう、名前は毎回変えます）
+        temp_file = tempfile.NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            newline="",
+            dir=os.path.dirname(output_filename),
+            prefix=f"{race_id}-",
+            suffix=".tmp",
+            delete=False,
+        )
+        temp_filename = temp_file.name
+
+        # 縦持ち（long format）のヘッダー（複数レースの出力と共通）
+        header = LONG_FORMAT_HEADER
 
         try:
-            with open(output_filename, "w", encoding="utf-8", newline="") as f:
+            with temp_file as f:
                 writer = csv.writer(f)
 
                 # 1. ヘッダーを書き込む
@@ -189,10 +176,15 @@ class Command(BaseCommand):
                     # ヘッダーの数に合わせて空の要素を追加
                     writer.writerow(["---"] + [""] * (len(header) - 1))
 
-           
+            os.replace(temp_filename, output_filename)
+            remove_stale_csv_exports(race)
+            self.output_path = output_filename
+
             self.stdout.write(
                 self.style.SUCCESS(f"正常に '{output_filename}' を出力しました。")
             )
 
         except Exception as e:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
             raise CommandError(f"ファイル出力中にエラーが発生しました: {str(e)}")
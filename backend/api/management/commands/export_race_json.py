@@ -1,10 +1,9 @@
 # racing_app/management/commands/export_race_json.py
 
-import json
 from django.core.management.base import BaseCommand, CommandError
-from django.db.models import Q, Count, Sum
-from api.models import Race, Entry
-from api.serializers import RaceSerializer, EntrySerializer
+from api.models import Race
+from api.race_payloads import race_detail_payload
+from api.renderers import ORJSONRenderer
 import os
 
 # from racing_app.utils import scrape_and_save_race # 必要であればインポート
@@ -39,26 +38,8 @@ class Command(BaseCommand):
                 "データ取得後もレース情報が存在しません。処理を中断します。"
             )
 
-        # --- Viewと同じクエリを実行 ---
-        win_place_condition = Q(horse__past_races__rank__in=[1, 2, 3])
-
-        sorted_entries = (
-            Entry.objects.filter(race=race)
-            .select_related("jockey", "horse")
-            .prefetch_related("horse__past_races")
-            .annotate(
-                win_place_count=Count("horse__past_races", filter=win_place_condition),
-                sum_grade_score=Sum("horse__past_races__race_grade_score"),
-            )
-            .order_by("-win_place_count", "-sum_grade_score")
-        )
-
-        # --- Viewと同じシリアライズ処理 ---
-        race_serializer = RaceSerializer(race)
-        entry_serializer = EntrySerializer(sorted_entries, many=True)
-
-        response_data = race_serializer.data
-        response_data["entries"] = entry_serializer.data
+        # --- APIと共通のクエリ（api/race_queries.py）から、RaceSerializer と同じ内容を作る ---
+        response_data = race_detail_payload(race)
 
         # --- ファイルに出力 ---
         output_dir = os.path.join( "JSONfiles")
@@ -68,9 +49,11 @@ class Command(BaseCommand):
         output_filename = os.path.join(output_dir, f"{race_id}.json")
         
         try:
-            with open(output_filename, "w", encoding="utf-8") as f:
-                # json.dump で整形して書き込み
-                json.dump(response_data, f, ensure_ascii=False, indent=2)
+            with open(output_filename, "wb") as f:
+                # orjson で整形して書き込み（インデント2）
+                f.write(
+                    ORJSONRenderer().render(response_data, renderer_context={"indent": 2})
+                )
 
             self.stdout.write(
                 self.style.SUCCESS(f"正常に '{output_filename}' を出力しました。")
@@ -0,0 +1,73 @@
+import datetime
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.csv_exports import filter_races, iter_long_format_rows, stream_long_format_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "複数レース（race_idの指定・開催日の範囲・開催地）の縦持ちCSVを出力します。"
+        "シリアライザを通さずに行を順に書き出すため、1シーズン分でもメモリを使いません。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("race_ids", nargs="*", help="対象のrace_id")
+        parser.add_argument(
+            "--start", type=datetime.date.fromisoformat, help="開催日の範囲の開始（YYYY-MM-DD）"
+        )
+        parser.add_argument(
+            "--end", type=datetime.date.fromisoformat, help="開催日の範囲の終了（YYYY-MM-DD）"
+        )
+        parser.add_argument("--venue", default=None, help="開催地（例: 東京）")
+        parser.add_argument(
+            "--gzip", action="store_true", help="gzipで圧縮して出力します（.csv.gz）。"
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="出力ファイル（既定: settings.CSV_EXPORT_DIR/races-<開始>-<終了>.csv）",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="1度に読み込むレース数"
+        )
+
+    def handle(self, *args, **options):
+        if not (
+            options["race_ids"] or options["start"] or options["end"] or options["venue"]
+        ):
+            raise CommandError("race_id か --start / --end / --venue を指定してください。")
+        races = filter_races(
+            race_ids=options["race_ids"],
+            start=options["start"],
+            end=options["end"],
+            venue=options["venue"],
+        )
+        output = options["output"] or os.path.join(
+            settings.CSV_EXPORT_DIR,
+            f"races-{options['start'] or 'all'}-{options['end'] or 'all'}.csv",
+        )
+        if options["gzip"] and not output.endswith(".gz"):
+            output = f"{output}.gz"
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+        started = time.monotonic()
+        rows = iter_long_format_rows(races, races_per_batch=max(1, options["batch_size"]))
+        # 書き込み途中のファイルを読まれないよう、一時ファイルに書いてから置き換える
+        temp_output = f"{output}.tmp"
+        size = 0
+        with open(temp_output, "wb") as f:
+            for chunk in stream_long_format_csv(rows, compress=options["gzip"]):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(temp_output, output)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{races.count()} レースを '{output}' に出力しました"
+                f"（{size / 1024:.0f} KB, {time.monotonic() - started:.1f} 秒）。"
+            )
+        )
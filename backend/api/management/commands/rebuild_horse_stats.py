@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.horse_stats import rebuild_horse_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "馬ごとの成績集計（HorseStats）を過去成績から作り直します。"
+        "通常は過去成績の書き込み時（ORM経由の保存・更新・削除）に更新されるため、"
+        "SQLで直接編集したときなどに使います。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "horse_ids", nargs="*", help="対象の馬ID（省略時はすべての馬）"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="1度に集計する頭数"
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_horse_stats(
+            batch_size=max(1, options["batch_size"]), horse_ids=options["horse_ids"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{count} 頭の成績集計を作り直しました（{time.monotonic() - started:.1f} 秒）。"
+            )
+        )
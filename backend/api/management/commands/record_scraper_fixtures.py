@@ -0,0 +1,75 @@
+import contextlib
+import io
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.fetchers import FETCHER_BACKENDS, FetchError, build_fetcher
+from api.fixture_server import (
+    FIXTURE_CORPUS_DIR,
+    horse_page_path,
+    race_page_path,
+    save_expected_counts,
+)
+from api.management.commands.scrape_race import NetkeibaRaceAnalyzer
+
+
+def write_page(path, html):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+class Command(BaseCommand):
+    help = (
+        "netkeibaから出馬表と出走馬の成績ページを取得し、"
+        "benchmark_scraper 用のフィクスチャとして保存します（DBには書き込みません）。"
+        "読み取れた出走馬・過去成績の数も expected_counts.json に記録します。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("race_ids", nargs="+", help="記録するレースのrace_id")
+        parser.add_argument(
+            "--corpus", default=FIXTURE_CORPUS_DIR, help="保存先のディレクトリ"
+        )
+        parser.add_argument(
+            "--fetcher",
+            choices=sorted(FETCHER_BACKENDS),
+            default=None,
+            help="ページ取得方法（既定: settings.SCRAPE_FETCHER）",
+        )
+
+    def handle(self, *args, **options):
+        corpus_dir = options["corpus"]
+        with build_fetcher(options["fetcher"]) as fetcher:
+            analyzer = NetkeibaRaceAnalyzer(fetcher=fetcher)
+            for race_id in options["race_ids"]:
+                url = f"{analyzer.race_base_url}/race/shutuba.html?race_id={race_id}"
+                try:
+                    html = fetcher.fetch(
+                        url, wait_css="table[class*='RaceTable']", marker="HorseList"
+                    )
+                except FetchError as e:
+                    raise CommandError(f"{race_id} の出馬表を取得できませんでした: {e}")
+                with contextlib.redirect_stdout(io.StringIO()):
+                    parsed = analyzer.parse_race_page(race_id, html)
+                if parsed is None:
+                    raise CommandError(f"{race_id} は出馬表のページではありません。")
+                write_page(race_page_path(corpus_dir, race_id), html)
+
+                _, entries = parsed
+                horses = [horse for horse, _, _ in entries]
+                saved = 0
+                past_races = 0
+                for horse, horse_html in analyzer.fetch_horse_pages(horses):
+                    if horse_html is None:
+                        continue
+                    write_page(horse_page_path(corpus_dir, horse.horse_id), horse_html)
+                    saved += 1
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        rows = analyzer.parse_past_races(horse, horse_html)
+                    past_races += len(rows or ())
+                save_expected_counts(corpus_dir, race_id, len(entries), past_races)
+                self.stdout.write(
+                    f"{race_id}: 出馬表と成績ページ {saved}/{len(horses)} 頭を保存しました。"
+                )
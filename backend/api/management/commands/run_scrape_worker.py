@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.browser_pool import get_browser_pool
+from api.scrape_jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "スクレイピングジョブを順次取り出して実行するワーカーを起動します。"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="待機中ジョブが無いときのポーリング間隔（秒）",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="待機中のジョブを処理し終えたら終了します。",
+        )
+        parser.add_argument(
+            "--requeue-stale",
+            action="store_true",
+            help="起動時に実行中のまま残っているジョブを待機中に戻します。",
+        )
+        parser.add_argument(
+            "--warm-browsers",
+            action="store_true",
+            help="起動時にブラウザプールのChromeを settings.BROWSER_POOL_SIZE 台起動しておきます。",
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options["poll_interval"]
+
+        if options["requeue_stale"]:
+            count = requeue_stale_jobs()
+            self.stdout.write(f"{count} 件の実行中ジョブを待機中に戻しました。")
+        if options["warm_browsers"]:
+            pool = get_browser_pool()
+            pool.warm()
+            self.stdout.write(f"Chromeを {pool.stats()['browsers']} 台起動しました。")
+
+        self.stdout.write(self.style.SUCCESS("スクレイピングワーカーを起動しました。"))
+        try:
+            while True:
+                job = claim_next_job()
+                if not job:
+                    if options["once"]:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                self.stdout.write(f"ジョブ #{job.pk} (race_id: {job.race_id}) を実行中...")
+                job = run_job(job)
+                if job.status == job.STATUS_COMPLETED:
+                    self.stdout.write(self.style.SUCCESS(f"ジョブ #{job.pk} が完了しました。"))
+                else:
+                    self.stderr.write(
+                        self.style.ERROR(
+                            f"ジョブ #{job.pk} が失敗しました: {job.error_message}"
+                        )
+                    )
+        except KeyboardInterrupt:
+            self.stdout.write("ワーカーを停止しました。")
@@ -1,22 +1,28 @@
-import os
-import re
-import time
-import pandas as pd
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 import argparse
-import datetime
-from django.core.management.base import BaseCommand
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.chrome.service import Service
 
-from api.models import Race, Horse, Jockey, Trainer, Entry, HorsePastRace
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.bulk_upsert import bulk_upsert
+from api.fetchers import FETCHER_BACKENDS, build_fetcher
+from api.html_parsing import class_strainer, parse_html, parse_table, table_rows
+from api.models import Race, Horse, Jockey, Entry, HorsePastRace
+from api.page_cache import get_page_cache, is_horse_page_fresh
+from api.race_parsers import fill_past_race_numbers
+from api.race_snapshots import snapshot_scraped_race
+from api.race_versions import bump_data_version
+
+
+RACE_BASE_URL = "https://race.netkeiba.com"
+DB_BASE_URL = "https://db.netkeiba.com"
+
+
+class ScrapeError(Exception):
+    """出馬表のページが取得・読み取りできなかった（ジョブは失敗にする）"""
 
 
 class Command(BaseCommand):
@@ -31,279 +37,488 @@ class Command(BaseCommand):
             action="store_true",
             help="エントリー情報のみをスクレイピングします。",
         )
+        parser.add_argument(
+            "--fetcher",
+            choices=sorted(FETCHER_BACKENDS),
+            default=None,
+            help="ページ取得方法（既定: settings.SCRAPE_FETCHER）",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=None,
+            help="1ホストあたりの最大リクエスト数（回/秒, 既定: settings.SCRAPE_RATE_LIMIT）",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="1ホストあたりの最大同時接続数（既定: settings.SCRAPE_MAX_CONCURRENCY）",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="過去成績はDBに無い新しいレースだけを書き込みます。",
+        )
+        parser.add_argument(
+            "--since",
+            type=parse_since,
+            default=None,
+            help="この日付（YYYY-MM-DD）以降の過去成績だけを書き込みます（--incremental を含む）。",
+        )
 
     def handle(self, *args, **options):
         race_id = options["race_id"]
         entry_only = options["entry_only"]
-        main(race_id, entry_only)
+        with build_fetcher(
+            options["fetcher"],
+            rate=options["rate"],
+            max_concurrency=options["concurrency"],
+        ) as fetcher:
+            try:
+                main(
+                    race_id,
+                    entry_only,
+                    fetcher=fetcher,
+                    max_concurrency=options["concurrency"],
+                    incremental=options["incremental"],
+                    since=options["since"],
+                )
+            except Exception as e:
+                raise CommandError(f"{race_id} の取得に失敗しました: {e}")
 
 
-def main(race_id: str, entry_only=False):
+def parse_since(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError("日付は YYYY-MM-DD で指定してください。")
+
+
+def main(
+    race_id: str,
+    entry_only=False,
+    progress=None,
+    fetcher=None,
+    max_concurrency=None,
+    incremental=False,
+    since=None,
+    snapshot=True,
+):
+    """
+    snapshot: Falseなら完了時にレース詳細のJSONを描画しない（一括取得用）。
+    出馬表の取得・読み取り・保存に失敗したときは例外をそのまま送出する
+    （ジョブ実行時は run_job が失敗として記録する）
+    """
     analyzer = None
     try:
-        analyzer = NetkeibaRaceAnalyzer()
-        analyzer.get_race_entry(race_id, entry_only)
+        analyzer = NetkeibaRaceAnalyzer(
+            progress=progress,
+            fetcher=fetcher,
+            max_concurrency=max_concurrency,
+            page_cache=get_page_cache(),
+            incremental=incremental,
+            since=since,
+        )
+        changed_race_ids = analyzer.get_race_entry(race_id, entry_only) or ()
+        if snapshot:
+            # 最初の閲覧でレース詳細を組み立てなくて済むよう、描画して保存しておく
+            snapshot_scraped_race(race_id, changed_race_ids)
 
         print("\n=== 処理完了 ===")
-    except Exception as e:
-        print(f"予期せぬエラーが発生しました: {e}")
     finally:
         if analyzer:
             analyzer.close()
 
 
 class NetkeibaRaceAnalyzer:
-    def __init__(self):
-        options = webdriver.ChromeOptions()
-
-        options.add_argument("--headless")  # ヘッドレスモード
-        options.add_argument(
-            "--window-size=1920,1080"
-        )  # ヘッドレスモードで要素を正しく認識させるため
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument(
-            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        )
-        options.add_argument("--disable-gpu")  # GPU無効化 (Windows)
-        options.add_argument("--disable-dev-shm-usage")  # Linux環境なら
-        # 画像を無効化する設定
-        options.add_experimental_option(
-            "prefs", {"profile.managed_default_content_settings.images": 2}
-        )
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(
-            service=service,
-            options=options,
-        )
-        self.db_base_url = "https://db.netkeiba.com"
+    def __init__(
+        self,
+        progress=None,
+        fetcher=None,
+        max_concurrency=None,
+        page_cache=None,
+        incremental=False,
+        since=None,
+        race_base_url=None,
+        db_base_url=None,
+    ):
+        # ページ取得はFetcherに任せる（既定はHTTP取得、JSが必要なページのみブラウザ）。
+        # 渡されたFetcherは呼び出し側が閉じる（複数レースで共有できるように）
+        self.owns_fetcher = fetcher is None
+        self.fetcher = fetcher or build_fetcher()
+        self.max_concurrency = max_concurrency or settings.SCRAPE_MAX_CONCURRENCY
+        # 取得先（ベンチマークではローカルのフィクスチャサーバーに向ける）
+        self.race_base_url = race_base_url or RACE_BASE_URL
+        self.db_base_url = db_base_url or DB_BASE_URL
+        # 馬ごとの進捗通知先（api.scrape_jobs.JobProgress）
+        self.progress = progress
+        # 馬の成績ページのキャッシュ（api.page_cache.PageCache, Noneならキャッシュしない）
+        self.page_cache = page_cache
+        # 差分取得: DBに無い（since以降の）過去成績だけを読み取って書き込む
+        self.incremental = incremental or since is not None
+        self.since = since
 
     def close(self):
-        if self.driver:
-            self.driver.quit()
+        if self.fetcher and self.owns_fetcher:
+            self.fetcher.close()
 
     def get_race_entry(self, race_id, entry_only):
-        url = f"https://race.netkeiba.com/race/shutuba.html?race_id={race_id}"
+        """
+        出馬表と各馬の成績を取得して保存する（戻り値は save_race と同じ）。
+        出馬表の取得・読み取りに失敗したときは例外を送出する。
+        成績ページを取得できなかった馬は進捗に failed と記録して続ける
+        """
+        url = f"{self.race_base_url}/race/shutuba.html?race_id={race_id}"
         print(f"出馬表URLにアクセス: {url}")
-        try:
-            self.driver.get(url)
-            try:
-                WebDriverWait(self.driver, 5).until(
-                    EC.presence_of_element_located((By.CLASS_NAME, "HorseList"))
+        html = self.fetcher.fetch(
+            url, wait_css="table[class*='RaceTable']", marker="HorseList"
+        )
+        parsed = self.parse_race_page(race_id, html)
+        if parsed is None:
+            raise ScrapeError(f"{race_id} の出馬表のページではありません")
+        race_defaults, entries = parsed
+
+        past_race_rows = []
+        if not entry_only:
+            horses = [horse for horse, _, _ in entries]
+            if self.progress:
+                self.progress.set_horses(
+                    [(horse.horse_id, horse.horse_name) for horse in horses]
                 )
-                self.driver.find_element(By.CLASS_NAME, "HorseList")
-
-                print("HorseListが見つかりました。処理を続行します。")
-
-            except NoSuchElementException:
+            known_race_ids = (
+                self.known_past_race_ids([horse.horse_id for horse in horses])
+                if self.incremental
+                else {}
+            )
+            # 各馬の成績ページは並列に取得し、出走順に読み取る
+            for horse, html in self.fetch_horse_pages(horses):
+                parsed = (
+                    self.parse_past_races(
+                        horse,
+                        html,
+                        known_race_ids=known_race_ids.get(horse.horse_id, ()),
+                        since=self.since,
+                    )
+                    if html is not None
+                    else None
+                )
+                if parsed is not None:
+                    past_race_rows.extend(parsed)
+                if self.progress:
+                    self.progress.horse_done(horse.horse_id, parsed is not None)
+            if self.page_cache:
+                stats = self.page_cache.stats()
                 print(
-                    "HorseListが見つかりませんでした。無効なページのため処理を終了します。"
+                    f"成績ページのキャッシュ: ヒット {stats['hits']} / ミス {stats['misses']}"
                 )
-                return
 
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located(
-                    (By.CSS_SELECTOR, "table[class*='RaceTable']")
-                )
+        return self.save_race(race_id, race_defaults, entries, past_race_rows)
+
+    def parse_race_page(self, race_id, html):
+        """
+        出馬表ページから (レースの値, [(Horse, Jockey, Entry), ...]) を読み取る。
+        DBへの書き込みは行わない。出馬表のページでなければNoneを返す
+        """
+        # ページ全体ではなく、使う部分（レース名・レース情報・開催日・出馬表）だけを木にする
+        soup = parse_html(html, parse_only=RACE_PAGE_STRAINER)
+        if not soup.find(class_="HorseList"):
+            print(
+                "HorseListが見つかりませんでした。無効なページのため処理を終了します。"
+            )
+            return
+        print("HorseListが見つかりました。処理を続行します。")
+
+        race_name_tag = soup.select_one("h1.RaceName")
+        race_data01 = soup.select_one("div.RaceData01")
+
+        venue_spans = soup.find("div", class_="RaceData02").find_all("span")
+        venue = venue_spans[1].get_text(strip=True)
+        if not (race_name_tag and race_data01):
+            raise RuntimeError("RaceName または RaceData01 が取得できません")
+
+        course_details = race_data01.find("span").get_text(strip=True)
+
+        ground_condition = ""
+        all_spans_in_div = race_data01.find_all("span")
+        for span in all_spans_in_div:
+            # テキストに「馬場:」という文字列が含まれているかチェック
+            if "馬場:" in span.text:
+                raw_text = span.text
+                ground_condition = raw_text.split("馬場:")[1].strip()
+                break
+
+            head_count = None  
+            race_data_div = soup.find('div', class_='RaceData02')
+
+            if race_data_div:
+                all_spans = race_data_div.find_all('span')
+                for span in all_spans:
+                    span_text = span.get_text(strip=True)
+                    # 4. テキストが「頭」で終わるか判定
+                    if span_text.endswith('頭'):
+                        # 5. 「頭」という文字を削除して、数字の部分だけを取り出す
+                        number_text = span_text.replace('頭', '')
+                        try:
+                            head_count = int(number_text)
+                            # 目的のデータが見つかったので、ループを終了する
+                            break
+                        except ValueError:
+                            # 数字に変換できなかった場合（例: '頭'だけだった場合）
+                            print(f"エラー: '{number_text}'を数値に変換できませんでした。")
+                            break
+
+        race_name = race_name_tag.text.strip()
+        race_num_span = soup.select_one("div.RaceList_Item01 > span.RaceNum")
+        if race_num_span:
+            text_nodes = [t for t in race_num_span.contents if isinstance(t, str)]
+            race_text = "".join(text_nodes).strip()  # '11R'
+            number_match = re.search(r"\d+", race_text)
+            if number_match:
+                race_number = number_match.group()
+        dd = soup.find("dd", class_="Active")
+        a_tag = dd.find("a")
+        if not a_tag:
+            raise RuntimeError("開催日付のタグが見つかりません")
+
+        date_text = a_tag.contents[0].strip()
+        year = race_id[:4]
+        full_date = f"{year}年{date_text}"
+        race_date = datetime.strptime(full_date, "%Y年%m月%d日").date()
+
+        print(f"ground_condition: '{ground_condition}'")
+        race_defaults = {
+            "race_name": race_name,
+            "race_date": race_date,
+            "venue": venue,
+            "course_details": course_details,
+            "ground_condition": ground_condition,
+            "head_count": head_count,
+            "race_number": race_number,
+        }
+
+        table = soup.find("table", class_=["Shutuba_Table", "RegHorse_Table"])
+        if not table:
+            print("-> 出馬表または登録馬テーブルが見つかりませんでした。")
+            return race_defaults, []
+
+        # (Horse, Jockey, Entry) のリスト。DBへはsave_raceでまとめて書き込む
+        entries = []
+        for row in table_rows(table, ENTRY_COLUMNS):
+            # 取得しようとするデータが存在しない可能性を考慮する
+            horse_link = row.link("horse")
+            horse_name = horse_link.text.strip() if horse_link else row.text("horse")
+            horse_id = (
+                re.search(r"/horse/(\d+)", horse_link["href"]).group(1)
+                if horse_link and "href" in horse_link.attrs
+                else ""
+            )
+            # jockeyの処理
+            jockey_link = row.link("jockey")
+            jockey_id = (
+                re.search(
+                    r"/jockey/(?:result/\w+/)?(\d+)", jockey_link["href"]
+                ).group(1)
+                if jockey_link and "href" in jockey_link.attrs
+                else ""
+            )
+
+            waku = row.text("waku")
+            umaban = row.text("umaban")
+            weight_carried = row.text("weight_carried")
+            jockey_name = row.text("jockey")
+            raw_odds = row.text("odds")
+            try:
+                odds = float(raw_odds)
+            except (ValueError, TypeError):
+                odds = None 
+            popularity = row.text("popularity")
+
+            weight_to_save = None
+            try:
+                weight_to_save = float(weight_carried)
+            except (ValueError, TypeError):
+                print(f"斤量が数値でないためスキップします: '{weight_carried}'")
+
+            if not horse_id:
+                print(f"馬IDが取得できないためスキップします: '{horse_name}'")
+                continue
+
+            horse = Horse(horse_id=horse_id, horse_name=horse_name)
+            jockey = (
+                Jockey(jockey_id=jockey_id, jockey_name=jockey_name)
+                if jockey_id
+                else None
             )
-            html = self.driver.page_source
-            soup = BeautifulSoup(html, "html.parser")
-
-            race_name_tag = soup.select_one("h1.RaceName")
-            race_data01 = soup.select_one("div.RaceData01")
-
-            venue_spans = soup.find("div", class_="RaceData02").find_all("span")
-            venue = venue_spans[1].get_text(strip=True)
-            if not (race_name_tag and race_data01):
-                raise RuntimeError("RaceName または RaceData01 が取得できません")
-
-            course_details = race_data01.find("span").get_text(strip=True)
-
-            ground_condition = ""
-            all_spans_in_div = race_data01.find_all("span")
-            for span in all_spans_in_div:
-                # テキストに「馬場:」という文字列が含まれているかチェック
-                if "馬場:" in span.text:
-                    raw_text = span.text
-                    ground_condition = raw_text.split("馬場:")[1].strip()
-                    break
-
-                head_count = None  
-                race_data_div = soup.find('div', class_='RaceData02')
-
-                if race_data_div:
-                    all_spans = race_data_div.find_all('span')
-                    for span in all_spans:
-                        span_text = span.get_text(strip=True)
-                        # 4. テキストが「頭」で終わるか判定
-                        if span_text.endswith('頭'):
-                            # 5. 「頭」という文字を削除して、数字の部分だけを取り出す
-                            number_text = span_text.replace('頭', '')
-                            try:
-                                head_count = int(number_text)
-                                # 目的のデータが見つかったので、ループを終了する
-                                break
-                            except ValueError:
-                                # 数字に変換できなかった場合（例: '頭'だけだった場合）
-                                print(f"エラー: '{number_text}'を数値に変換できませんでした。")
-                                break
-
-            race_name = race_name_tag.text.strip()
-            race_num_span = soup.select_one("div.RaceList_Item01 > span.RaceNum")
-            if race_num_span:
-                text_nodes = [t for t in race_num_span.contents if isinstance(t, str)]
-                race_text = "".join(text_nodes).strip()  # '11R'
-                number_match = re.search(r"\d+", race_text)
-                if number_match:
-                    race_number = number_match.group()
-            dd = soup.find("dd", class_="Active")
-            a_tag = dd.find("a")
-            if not a_tag:
-                raise RuntimeError("開催日付のタグが見つかりません")
-
-            date_text = a_tag.contents[0].strip()
-            year = race_id[:4]
-            full_date = f"{year}年{date_text}"
-            race_date = datetime.strptime(full_date, "%Y年%m月%d日").date()
-
-            print(f"ground_condition: '{ground_condition}'")
-            race, created = Race.objects.update_or_create(
+            entry = Entry(
                 race_id=race_id,
-                defaults={
-                    "race_name": race_name,
-                    "race_date": race_date,
-                    "venue": venue,
-                    "course_details": course_details,
-                    "ground_condition": ground_condition,
-                    "head_count": head_count,
-                    "race_number": race_number,
-                },
+                horse_id=horse_id,
+                jockey_id=jockey_id or None,
+                waku=to_int_or_none(waku),
+                umaban=to_int_or_none(umaban),
+                weight_carried=weight_to_save,
+                odds=odds,
+                popularity=to_int_or_none(popularity),
+            )
+            entries.append((horse, jockey, entry))
+        return race_defaults, entries
+
+    def save_race(self, race_id, race_defaults, entries, past_race_rows):
+        """
+        レース・出走馬・騎手・出走情報・過去成績を1トランザクションでまとめて書き込む。
+        行ごとのupdate_or_createではなく、テーブルごとに数クエリで済ませる。
+        戻り値は data_version を上げたrace_idの集合
+        """
+        with transaction.atomic():
+            created_races, updated_races = bulk_upsert(
+                Race,
+                [Race(race_id=race_id, **race_defaults)],
+                ["race_id"],
+                list(race_defaults),
             )
-            if created:
+            if created_races:
                 print(f"{race_id} をDBに新規作成しました。")
             else:
-                print(f"既存レース [{race_name}] ({race_id}) の情報を更新しました。")
-
-            table = soup.find("table", class_=["Shutuba_Table", "RegHorse_Table"])
-            if not table:
-                print("-> 出馬表または登録馬テーブルが見つかりませんでした。")
-                return []
-
-            rows = table.select("tbody tr")
-
-            for row in rows:
-                cells = row.find_all("td")
-
-                # 取得しようとするデータが存在しない可能性を考慮する
-                horse_link = cells[3].find("a") if len(cells) > 3 else None
-                horse_name = (
-                    horse_link.text.strip() if horse_link else cells[3].text.strip()
-                )
-                horse_id = (
-                    re.search(r"/horse/(\d+)", horse_link["href"]).group(1)
-                    if horse_link and "href" in horse_link.attrs
-                    else ""
-                )
-                # jockeyの処理
-                jockey_link = cells[6].find("a") if len(cells) > 6 else None
-                jockey_id = (
-                    re.search(
-                        r"/jockey/(?:result/\w+/)?(\d+)", jockey_link["href"]
-                    ).group(1)
-                    if jockey_link and "href" in jockey_link.attrs
-                    else ""
+                print(
+                    f"既存レース [{race_defaults['race_name']}] ({race_id}) の情報を更新しました。"
                 )
 
-                waku = cells[0].text.strip() if len(cells) > 0 else ""
-                umaban = cells[1].text.strip() if len(cells) > 1 else ""
-                sex_age = cells[4].text.strip() if len(cells) > 4 else ""
-                weight_carried = cells[5].text.strip() if len(cells) > 5 else ""
-                jockey_name = cells[6].text.strip() if len(cells) > 6 else ""
-                trainer_name = cells[7].text.strip() if len(cells) > 7 else ""
-                horse_weight = cells[8].text.strip() if len(cells) > 8 else ""
-                raw_odds = cells[9].text.strip() if len(cells) > 9 else ""
-                try:
-                    odds = float(raw_odds)
-                except (ValueError, TypeError):
-                    odds = None 
-                popularity = cells[10].text.strip() if len(cells) > 10 else ""
-
-                weight_to_save = None
-                try:
-                    weight_to_save = float(weight_carried)
-                except (ValueError, TypeError):
-                    print(f"斤量が数値でないためスキップします: '{weight_carried}'")
-
-                data = {
-                    "race_id": race_id,
-                    "waku": waku,
-                    "umaban": umaban,
-                    "horse_name": horse_name,
-                    "horse_id": horse_id,
-                    "jockey_id": jockey_id,
-                    "sex_age": sex_age,
-                    "weight_carried": weight_to_save,
-                    "jockey_name": jockey_name,
-                    "trainer_name": trainer_name,
-                    "horse_weight": horse_weight,
-                    "odds": odds,
-                    "popularity": popularity,
-                }
-
-                horse, created = Horse.objects.get_or_create(
-                    horse_id=data["horse_id"],
-                    defaults={"horse_name": data["horse_name"]},
-                )
-                Jockey.objects.get_or_create(
-                    jockey_id=jockey_id,
-                    defaults={"jockey_name": jockey_name},
-                )
+            bulk_upsert(Horse, [horse for horse, _, _ in entries], ["horse_id"])
+            bulk_upsert(
+                Jockey, [jockey for _, jockey, _ in entries if jockey], ["jockey_id"]
+            )
+            # オッズ・人気はJSで描画されるため、HTTP取得では空になることがある。
+            # 取得できなかった値で既存のオッズを上書きしない
+            created_entries, updated_entries = bulk_upsert(
+                Entry,
+                [entry for _, _, entry in entries],
+                ["race_id", "horse_id"],
+                ENTRY_UPDATE_FIELDS,
+                keep_if_none=("odds", "popularity"),
+            )
+            created_past_races, updated_past_races = write_past_races(past_race_rows)
 
-                entry, created = Entry.objects.update_or_create(
-                    race_id=data["race_id"],
-                    horse_id=data["horse_id"],
-                    defaults={
-                        "jockey_id": data["jockey_id"],
-                        "waku": to_int_or_none(data["waku"]),
-                        "umaban": to_int_or_none(data["umaban"]),
-                        "weight_carried": data["weight_carried"],
-                        "odds": data["odds"],
-                        "popularity": to_int_or_none(data["popularity"]),
-                    },
-                )
-                if not entry_only:
-                    self.get_past_races(horse)
+            # 実際に値が変わったときだけ data_version を上げる
+            race_changed = (
+                created_races or updated_races or created_entries or updated_entries
+            )
+            return bump_data_version(
+                race_ids=[race_id] if race_changed else (),
+                horse_ids={
+                    past_race.horse_id
+                    for past_race in created_past_races + updated_past_races
+                },
+            )
 
+    def fetch_horse_page(self, horse):
+        """
+        馬の成績ページのHTMLを取得する。取得できなければNoneを返す。
+        ページキャッシュがあり、まだ使える（馬が出走していない）ならネットワークに出ない
+        """
+        if not horse.horse_id:
+            return None
+        url = f"{self.db_base_url}/horse/{horse.horse_id}/"
+        if self.page_cache:
+            cached = self.page_cache.get(url)
+            if cached and is_horse_page_fresh(*cached):
+                self.page_cache.record(hit=True)
+                return cached[0]
+            self.page_cache.record(hit=False)
+        try:
+            html = self.fetcher.fetch(
+                url, wait_css=".db_h_race_results", marker="db_h_race_results"
+            )
         except Exception as e:
-            print(f"出馬表取得中にエラー: {e}")
-            return []
+            print(f"  -> 馬の成績ページ取得エラー (ID: {horse.horse_id}): {e}")
+            return None
+        if self.page_cache:
+            self.page_cache.put(url, html)
+        return html
+
+    def fetch_horse_pages(self, horses):
+        """
+        各馬の成績ページを最大 max_concurrency 並列で取得し、
+        horses の順番で (horse, html) を返す。
+        リクエスト間隔はFetcherのレート制限に従う
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            yield from zip(horses, executor.map(self.fetch_horse_page, horses))
+
+    def known_past_race_ids(self, horse_ids):
+        """馬ごとにDBにある過去成績の past_race_id の集合（差分取得用）"""
+        known_race_ids = {}
+        for horse_id, past_race_id in HorsePastRace.objects.filter(
+            horse_id__in=horse_ids
+        ).values_list("horse_id", "past_race_id"):
+            known_race_ids.setdefault(horse_id, set()).add(past_race_id)
+        return known_race_ids
 
     def get_past_races(self, horse, limit=10):
+        html = self.fetch_horse_page(horse)
+        if html is None:
+            return False
+        return self.save_past_races(horse, html, limit)
+
+    def save_past_races(self, horse, html, limit=10):
+        known_race_ids = (
+            self.known_past_race_ids([horse.horse_id]).get(horse.horse_id, ())
+            if self.incremental
+            else ()
+        )
+        past_race_rows = self.parse_past_races(
+            horse, html, limit, known_race_ids=known_race_ids, since=self.since
+        )
+        if past_race_rows is None:
+            return False
+        with transaction.atomic():
+            bulk_upsert(
+                Horse,
+                [Horse(horse_id=horse.horse_id, horse_name=horse.horse_name)],
+                ["horse_id"],
+            )
+            created_past_races, updated_past_races = write_past_races(past_race_rows)
+            if created_past_races or updated_past_races:
+                bump_data_version(horse_ids=[horse.horse_id])
+        return True
+
+    def parse_past_races(self, horse, html, limit=10, known_race_ids=(), since=None):
+        """
+        馬の成績ページから過去レースを読み取り、(Jockey, HorsePastRace) のリストを返す。
+        DBへの書き込みは行わない。読み取れなければNoneを返す。
+        成績は新しい順に並んでいるため、known_race_ids（DBにある past_race_id）に
+        含まれる行か、since より前の行に来たらそこで打ち切る（差分取得）
+        """
         horse_id = horse.horse_id
         horse_name = horse.horse_name
         print("\n=== 馬情報取得開始 ===")
         print(f"{horse_name}")
         if not horse_id:
-            return []
-        url = f"{self.db_base_url}/horse/{horse_id}/"
-        time.sleep(1)
+            return None
 
-        horse, _ = Horse.objects.get_or_create(
-            horse_id=horse_id, defaults={"horse_name": horse_name}
-        )
+        past_race_rows = []
         try:
-            self.driver.get(url)
-            html = self.driver.page_source
-            soup = BeautifulSoup(html, "html.parser")
-
-            rows = soup.select(".db_h_race_results tbody tr")[:limit]
+            # 成績の表の部分だけを切り出して読む
+            table = parse_table(html, "db_h_race_results")
+            rows = table_rows(table, PAST_RACE_COLUMNS)[:limit] if table else []
             for row in rows:
-                cells = row.find_all("td")
-                if len(cells) < 24:
+                if len(row) < 24:
                     continue
 
-                past_jockey_cell = cells[12]
-                past_jockey_link = past_jockey_cell.find("a")
+                if known_race_ids or since:
+                    row_race_link = row.link("race_name")
+                    row_race_id_match = (
+                        re.search(r"/race/(\d+)", row_race_link["href"])
+                        if row_race_link
+                        else None
+                    )
+                    row_date = parse_date(row.text("date"))
+                    if (
+                        row_race_id_match
+                        and row_race_id_match.group(1) in known_race_ids
+                    ) or (since and row_date and row_date < since):
+                        break
+
+                past_jockey_link = row.link("jockey")
 
                 if past_jockey_link and past_jockey_link.has_attr("href"):
                     # 過去レースの騎手名とIDをリンクから取得
@@ -316,7 +531,7 @@ class NetkeibaRaceAnalyzer:
                     )
                 else:
                     # リンクがない場合（地方騎手など）は、名前のみ取得しIDはNoneとする
-                    past_jockey_name = past_jockey_cell.text.strip()
+                    past_jockey_name = row.text("jockey")
                     past_jockey_id = None
 
                 if not past_jockey_id:
@@ -325,11 +540,11 @@ class NetkeibaRaceAnalyzer:
                     )
                     continue
 
-                race_link = cells[4].find("a")
+                race_link = row.link("race_name")
                 past_race_id_match = (
                     re.search(r"/race/(\d+)", race_link["href"]) if race_link else None
                 )
-                venue_raw = cells[1].text.strip()
+                venue_raw = row.text("venue")
                 match = re.match(r"(\d+)([^\d]+)(\d+)", venue_raw)
                 if match:
                     venue_round = int(match.group(1))  # 開催回（例: 3）
@@ -341,94 +556,200 @@ class NetkeibaRaceAnalyzer:
                     venue_day = None
 
                 last_3f_rank = None
-                class_list = cells[22].get("class", [])
+                # 上りの順位は rank_1 などのclassで付いている
+                class_list = row.cell("last_3f").get("class", []) + row.cell("pace").get(
+                    "class", []
+                )
                 for cls in class_list:
                     if cls.startswith("rank_"):
                         # 'rank_' の部分を取り除いて数字だけにする
                         last_3f_rank = int(cls.replace("rank_", ""))
                         break
 
-                # print(f"  >>> 取得した14: '{cells[14].text.strip()}'")
-                # print(f"  >>> 取得した15: '{cells[15].text.strip()}'")
-                # print(f"  >>> 取得した16: '{cells[16].text.strip()}'")
-                # print(f"  >>> 取得した17: '{cells[17].text.strip()}'")
-                # print(f"  >>> 取得した18: '{cells[18].text.strip()}'")
-                # print(f"  >>> 取得した19: '{cells[19].text.strip()}'")
-                # print(f"  >>> 取得した20: '{cells[20].text.strip()}'")
-                # print(f"  >>> 取得した21: '{cells[21].text.strip()}'")
-                # print(f"  >>> 取得した22: '{cells[22].text.strip()}'")
-                # print(f"  >>> 取得した23: '{cells[23].text.strip()}'")
-                # print(f"  >>> 取得した24: '{cells[24].text.strip()}'")
                 result_data = {
-                    "date": cells[0].text.strip(),
+                    "date": row.text("date"),
                     "venue_round": venue_round,
                     "venue_name": venue_name,
                     "venue_day": venue_day,
-                    "weather": cells[2].text.strip(),
+                    "weather": row.text("weather"),
                     "race_name": race_link.text.strip() if race_link else "",
                     "past_race_id": (
                         past_race_id_match.group(1) if past_race_id_match else ""
                     ),
-                    "head_count": cells[6].text.strip(),
-                    "umaban": cells[7].text.strip(),
-                    "waku": cells[8].text.strip(),
-                    "odds": cells[9].text.strip(),
-                    "popularity": cells[10].text.strip(),
-                    "rank": cells[11].text.strip(),
-                    "jockey_name": cells[12].text.strip(),
-                    "weight_carried": cells[13].text.strip(),
-                    "distance": cells[14].text.strip(),
-                    "ground_condition": cells[16].text.strip(),
-                    "time": cells[18].text.strip(),
-                    "margin": cells[19].text.strip(),
-                    "passing": cells[21].text.strip(),
-                    "pace": cells[22].text.strip(),
-                    "last_3f": cells[23].text.strip(),
-                    "body_weight": cells[24].text.strip(),
+                    "head_count": row.text("head_count"),
+                    "umaban": row.text("umaban"),
+                    "waku": row.text("waku"),
+                    "odds": row.text("odds"),
+                    "popularity": row.text("popularity"),
+                    "rank": row.text("rank"),
+                    "jockey_name": row.text("jockey"),
+                    "weight_carried": row.text("weight_carried"),
+                    "distance": row.text("distance"),
+                    "ground_condition": row.text("ground_condition"),
+                    "time": row.text("time"),
+                    "margin": row.text("margin"),
+                    "passing": row.text("passing"),
+                    "pace": row.text("pace"),
+                    "last_3f": row.text("last_3f"),
+                    "body_weight": row.text("body_weight"),
                 }
                 # print(result_data)
-                Jockey.objects.update_or_create(
-                    jockey_id=past_jockey_id,
-                    defaults={"jockey_name": result_data["jockey_name"]},
-                )
+                race_date = parse_date(result_data["date"])
+                if not race_date:
+                    print(f"  -> 日付が読み取れないためスキップします: '{result_data['date']}'")
+                    continue
 
-                HorsePastRace.objects.update_or_create(
-                    horse=horse,
+                jockey = Jockey(
+                    jockey_id=past_jockey_id, jockey_name=result_data["jockey_name"]
+                )
+                past_race = HorsePastRace(
+                    horse_id=horse_id,
                     past_race_id=result_data["past_race_id"],
-                    defaults={
-                        "race_date": parse_date(result_data["date"]),
-                        "venue_round": result_data["venue_round"],
-                        "venue_name": result_data["venue_name"],
-                        "venue_day": result_data["venue_day"],
-                        "race_name": result_data["race_name"],
-                        "race_grade_score": get_race_grade_score(
-                            result_data["race_name"]
-                        ),
-                        "weather": result_data["weather"],
-                        "head_count": to_int_or_none(result_data["head_count"]),
-                        "waku": to_int_or_none(result_data["waku"]),
-                        "umaban": to_int_or_none(result_data["umaban"]),
-                        "odds": to_float_or_none(result_data["odds"]),
-                        "popularity": to_int_or_none(result_data["popularity"]),
-                        "rank": to_int_or_none(result_data["rank"]),
-                        "jockey_id": past_jockey_id,
-                        "jockey_name": past_jockey_name,
-                        "weight_carried": result_data["weight_carried"],
-                        "distance": result_data["distance"],
-                        "ground_condition": result_data["ground_condition"],
-                        "time": result_data["time"],
-                        "margin": result_data["margin"],
-                        "passing": result_data["passing"],
-                        "pace": result_data["pace"],
-                        "last_3f": result_data["last_3f"],
-                        "last_3f_rank": last_3f_rank,
-                        "body_weight": result_data["body_weight"],
-                    },
+                    race_date=race_date,
+                    venue_round=to_str_or_none(result_data["venue_round"]),
+                    venue_name=result_data["venue_name"],
+                    venue_day=to_str_or_none(result_data["venue_day"]),
+                    race_name=result_data["race_name"],
+                    race_grade_score=get_race_grade_score(result_data["race_name"]),
+                    weather=result_data["weather"],
+                    head_count=to_int_or_none(result_data["head_count"]),
+                    waku=to_int_or_none(result_data["waku"]),
+                    umaban=to_int_or_none(result_data["umaban"]),
+                    odds=to_float_or_none(result_data["odds"]),
+                    popularity=to_int_or_none(result_data["popularity"]),
+                    rank=to_int_or_none(result_data["rank"]),
+                    jockey_id=past_jockey_id,
+                    jockey_name=past_jockey_name,
+                    weight_carried=to_float_or_none(result_data["weight_carried"]),
+                    distance=result_data["distance"],
+                    ground_condition=result_data["ground_condition"],
+                    time=result_data["time"],
+                    margin=result_data["margin"],
+                    passing=result_data["passing"],
+                    pace=result_data["pace"],
+                    last_3f=result_data["last_3f"],
+                    last_3f_rank=last_3f_rank,
+                    body_weight=result_data["body_weight"],
                 )
+                # タイム・距離・馬体重などを数値のカラムにも入れる
+                fill_past_race_numbers(past_race)
+                past_race_rows.append((jockey, past_race))
             print(f"  -> {horse_name} の過去レース情報取得完了")
+            return past_race_rows
         except Exception as e:
             print(f"  -> 馬の成績取得エラー (ID: {horse_id}): {e}")
-            return []
+            return None
+
+
+
+# 出馬表ページで読む部分（これ以外はパーサーで木にしない）
+RACE_PAGE_STRAINER = class_strainer(
+    "RaceName",
+    "RaceData01",
+    "RaceData02",
+    "RaceList_Item01",
+    "Active",
+    "Shutuba_Table",
+    "RegHorse_Table",
+)
+
+# 列名: (見出しの候補, 見出しで見つからないときの列番号)
+ENTRY_COLUMNS = {
+    "waku": (("枠",), 0),
+    "umaban": (("馬番",), 1),
+    "horse": (("馬名",), 3),
+    "weight_carried": (("斤量",), 5),
+    "jockey": (("騎手",), 6),
+    "odds": (("オッズ", "予想オッズ"), 9),
+    "popularity": (("人気",), 10),
+}
+
+PAST_RACE_COLUMNS = {
+    "date": (("日付",), 0),
+    "venue": (("開催",), 1),
+    "weather": (("天気",), 2),
+    "race_name": (("レース名",), 4),
+    "head_count": (("頭数",), 6),
+    "umaban": (("馬番",), 7),
+    "waku": (("枠番",), 8),
+    "odds": (("オッズ",), 9),
+    "popularity": (("人気",), 10),
+    "rank": (("着順",), 11),
+    "jockey": (("騎手",), 12),
+    "weight_carried": (("斤量",), 13),
+    "distance": (("距離",), 14),
+    "ground_condition": (("馬場",), 16),
+    "time": (("タイム",), 18),
+    "margin": (("着差",), 19),
+    "passing": (("通過",), 21),
+    "pace": (("ペース",), 22),
+    "last_3f": (("上り",), 23),
+    "body_weight": (("馬体重",), 24),
+}
+
+ENTRY_UPDATE_FIELDS = [
+    "jockey_id",
+    "waku",
+    "umaban",
+    "weight_carried",
+    "odds",
+    "popularity",
+]
+
+PAST_RACE_UPDATE_FIELDS = [
+    "race_date",
+    "venue_round",
+    "venue_name",
+    "venue_day",
+    "race_name",
+    "race_grade_score",
+    "weather",
+    "head_count",
+    "waku",
+    "umaban",
+    "odds",
+    "popularity",
+    "rank",
+    "jockey_id",
+    "jockey_name",
+    "weight_carried",
+    "distance",
+    "ground_condition",
+    "time",
+    "margin",
+    "passing",
+    "pace",
+    "last_3f",
+    "last_3f_rank",
+    "body_weight",
+    "time_seconds",
+    "surface",
+    "distance_m",
+    "last_3f_seconds",
+    "body_weight_kg",
+    "body_weight_diff",
+    "passing_positions",
+]
+
+
+def write_past_races(past_race_rows):
+    """
+    parse_past_racesで読み取った (Jockey, HorsePastRace) をまとめて登録・更新する。
+    戻り値は HorsePastRace の (作成分, 更新分)
+    """
+    bulk_upsert(
+        Jockey, [jockey for jockey, _ in past_race_rows], ["jockey_id"], ["jockey_name"]
+    )
+    created, updated = bulk_upsert(
+        HorsePastRace,
+        [past_race for _, past_race in past_race_rows],
+        ["horse_id", "past_race_id"],
+        PAST_RACE_UPDATE_FIELDS,
+    )
+    # 成績が増えた・変わった馬の集計（HorseStats）は、bulk_create / bulk_update の後に
+    # HorsePastRaceQuerySet が計算し直す
+    return created, updated
+
 
 def get_race_grade_score(race_name: str) -> int:
     """
@@ -468,6 +789,10 @@ def to_int_or_none(value):
         return None
 
 
+def to_str_or_none(value):
+    return str(value) if value is not None else None
+
+
 def to_float_or_none(value):
     try:
         return float(value) if value else None
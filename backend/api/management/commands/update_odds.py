@@ -0,0 +1,149 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.fetchers import FetchError, build_fetcher
+from api.models import Race
+from api.odds import ODDS_API_URL, parse_win_odds, update_race_odds
+
+
+class Command(BaseCommand):
+    help = (
+        "単勝オッズ・人気だけを更新します（出馬表の再取得・ブラウザ起動なし）。"
+        "--interval を指定すると、オッズが確定するまで繰り返し更新します"
+        "（取得に続けて失敗したレースと、--max-duration を過ぎた後は更新をやめます）。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "race_ids", nargs="*", help="対象のrace_id（省略時は --date のレース）"
+        )
+        parser.add_argument(
+            "--date",
+            default=None,
+            help="この開催日（YYYY-MM-DD）のDBにあるレースを対象にします（既定: 今日）",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="更新間隔（秒）。指定すると繰り返し更新します。",
+        )
+        parser.add_argument(
+            "--max-failures",
+            type=int,
+            default=5,
+            help="この回数続けて取得に失敗したレースは更新をやめます（既定: 5）",
+        )
+        parser.add_argument(
+            "--max-duration",
+            type=float,
+            default=60 * 60 * 12,
+            help="繰り返し更新する最長の時間（秒, 既定: 12時間）",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="同時に取得するレース数（既定: settings.SCRAPE_MAX_CONCURRENCY）",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=None,
+            help="1ホストあたりの最大リクエスト数（回/秒, 既定: settings.SCRAPE_RATE_LIMIT）",
+        )
+
+    def handle(self, *args, **options):
+        race_ids = options["race_ids"]
+        if not race_ids:
+            if options["date"]:
+                try:
+                    race_date = datetime.strptime(options["date"], "%Y-%m-%d").date()
+                except ValueError:
+                    raise CommandError("日付は YYYY-MM-DD で指定してください。") from None
+            else:
+                race_date = timezone.localdate()
+            race_ids = list(
+                Race.objects.filter(race_date=race_date).values_list("race_id", flat=True)
+            )
+        if not race_ids:
+            raise CommandError("オッズを更新するレースがありません。")
+
+        # オッズはJSONのAPIから取るため、ブラウザは使わない
+        with build_fetcher(
+            "http", rate=options["rate"], max_concurrency=options["workers"]
+        ) as fetcher:
+            workers = options["workers"] or fetcher.limiter.max_concurrency
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = sorted(set(race_ids))
+                # race_id → 続けて取得に失敗した回数
+                failures = dict.fromkeys(pending, 0)
+                deadline = time.monotonic() + options["max_duration"]
+                while pending:
+                    started = time.monotonic()
+                    pending, failed_ids = self.update_once(fetcher, executor, pending)
+                    if options["interval"] is None:
+                        break
+                    for race_id in pending:
+                        failures[race_id] = (
+                            failures[race_id] + 1 if race_id in failed_ids else 0
+                        )
+                    dropped = [
+                        race_id
+                        for race_id in pending
+                        if failures[race_id] >= options["max_failures"]
+                    ]
+                    if dropped:
+                        self.stderr.write(
+                            f"{options['max_failures']} 回続けて取得できなかったため"
+                            f"更新をやめます: {', '.join(dropped)}"
+                        )
+                        pending = [race_id for race_id in pending if race_id not in dropped]
+                    if pending and time.monotonic() >= deadline:
+                        self.stderr.write(
+                            f"{options['max_duration']:g} 秒を過ぎたため更新をやめます"
+                            f"（未確定: {', '.join(pending)}）"
+                        )
+                        break
+                    if pending:
+                        time.sleep(
+                            max(0.0, options["interval"] - (time.monotonic() - started))
+                        )
+        self.stdout.write(self.style.SUCCESS("オッズの更新を終了しました。"))
+
+    def update_once(self, fetcher, executor, race_ids):
+        """
+        レースのオッズを並列に取得して更新し、
+        (まだ確定していないrace_idのリスト, そのうち取得できなかったrace_idの集合) を返す。
+        取得は並列、DBへの書き込みはこのスレッドでまとめて行う
+        """
+
+        def fetch(race_id):
+            try:
+                return fetcher.fetch(ODDS_API_URL.format(race_id=race_id))
+            except FetchError as e:
+                self.stderr.write(f"{race_id} のオッズを取得できませんでした: {e}")
+                return None
+
+        fetched_at = timezone.now()
+        pending = []
+        failed_ids = set()
+        changed_count = 0
+        for race_id, text in zip(race_ids, executor.map(fetch, race_ids)):
+            if text is None:
+                pending.append(race_id)
+                failed_ids.add(race_id)
+                continue
+            odds_by_umaban, is_final = parse_win_odds(text)
+            changed_count += len(update_race_odds(race_id, odds_by_umaban, fetched_at))
+            if not is_final:
+                pending.append(race_id)
+        self.stdout.write(
+            f"{timezone.localtime(fetched_at):%H:%M:%S} {len(race_ids)} レース / "
+            f"オッズ変更 {changed_count} 頭（未確定 {len(pending)} レース）"
+        )
+        return pending, failed_ids
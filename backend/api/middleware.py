@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # brotli が無ければ gzip だけで圧縮する
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+# 圧縮済みのため、圧縮し直さない Content-Type
+COMPRESSED_CONTENT_TYPES = ("application/gzip", "application/zip")
+
+# これより短いレスポンスは圧縮しない（GZipMiddleware と同じ）
+MIN_COMPRESS_LENGTH = 200
+
+
+def compress_brotli(content):
+    return brotli.compress(
+        content,
+        mode=brotli.MODE_TEXT,
+        quality=getattr(settings, "RESPONSE_BROTLI_QUALITY", 5),
+    )
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Accept-Encoding に br があれば brotli、gzip があれば gzip でレスポンスを圧縮する。
+    brotli はストリーミングしないレスポンス（レース詳細のJSONなど）だけに使い、
+    ストリーミングのレスポンスは GZipMiddleware と同じく gzip にする。
+    圧縮済みのファイル（CSVのgzipなど）はそのまま返す
+    """
+
+    def process_response(self, request, response):
+        if response.get("Content-Type", "").startswith(COMPRESSED_CONTENT_TYPES):
+            return response
+        if (
+            brotli is None
+            or response.streaming
+            or len(response.content) < MIN_COMPRESS_LENGTH
+            or response.has_header("Content-Encoding")
+            or not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        # 小さくならなければ圧縮しない
+        compressed_content = compress_brotli(response.content)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+
+        # 本文が変わるため、GZipMiddleware と同じく ETag を弱いものにする
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
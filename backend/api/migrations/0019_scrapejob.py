@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_race_head_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('race_id', models.CharField(db_index=True, max_length=20, verbose_name='レースID')),
+                ('status', models.CharField(choices=[('queued', '待機中'), ('running', '実行中'), ('completed', '完了'), ('failed', '失敗')], db_index=True, default='queued', max_length=20, verbose_name='状態')),
+                ('entry_only', models.BooleanField(default=False, verbose_name='エントリーのみ')),
+                ('total_horses', models.IntegerField(blank=True, null=True, verbose_name='対象頭数')),
+                ('completed_horses', models.IntegerField(default=0, verbose_name='取得済み頭数')),
+                ('progress', models.JSONField(blank=True, default=list, verbose_name='馬ごとの進捗')),
+                ('error_message', models.TextField(blank=True, verbose_name='エラー内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='登録日時')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+            ],
+            options={
+                'verbose_name': 'スクレイピングジョブ',
+                'verbose_name_plural': 'スクレイピングジョブ',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
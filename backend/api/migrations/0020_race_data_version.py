@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_scrapejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='race',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='データバージョン'),
+        ),
+        migrations.AddField(
+            model_name='race',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='データ更新日時'),
+        ),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:52
+
+import re
+
+from django.db import migrations, models
+
+TYPED_FIELDS = [
+    "time_seconds",
+    "surface",
+    "distance_m",
+    "last_3f_seconds",
+    "body_weight_kg",
+    "body_weight_diff",
+    "passing_positions",
+]
+
+
+# 作成時点の api.race_parsers の読み取り（後で読み取りを変えても、このマイグレーションの結果は変えない）
+_DISTANCE_RE = re.compile(r"^\s*([芝ダ障])\D*(\d+)")
+_TIME_RE = re.compile(r"^\s*(?:(\d+):)?(\d+(?:\.\d+)?)\s*$")
+_BODY_WEIGHT_RE = re.compile(r"^\s*(\d+)\s*(?:\(\s*([+-]?\d+)\s*\))?")
+
+
+def parse_race_time(value):
+    match = _TIME_RE.match(value or "")
+    if not match:
+        return None
+    minutes, seconds = match.groups()
+    return round(int(minutes or 0) * 60 + float(seconds), 1)
+
+
+def parse_distance(value):
+    match = _DISTANCE_RE.match(value or "")
+    if not match:
+        return None, None
+    return match.group(1), int(match.group(2))
+
+
+def parse_last_3f(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def parse_body_weight(value):
+    match = _BODY_WEIGHT_RE.match(value or "")
+    if not match:
+        return None, None
+    weight, diff = match.groups()
+    return int(weight), int(diff) if diff is not None else None
+
+
+def parse_passing(value):
+    positions = [int(p) for p in re.findall(r"\d+", value or "")]
+    return positions or None
+
+
+def fill_past_race_numbers(past_race):
+    past_race.time_seconds = parse_race_time(past_race.time)
+    past_race.surface, past_race.distance_m = parse_distance(past_race.distance)
+    past_race.last_3f_seconds = parse_last_3f(past_race.last_3f)
+    past_race.body_weight_kg, past_race.body_weight_diff = parse_body_weight(
+        past_race.body_weight
+    )
+    past_race.passing_positions = parse_passing(past_race.passing)
+    return past_race
+
+
+def backfill_typed_columns(apps, schema_editor):
+    """既存の過去成績の文字列から数値のカラムを埋める"""
+    HorsePastRace = apps.get_model("api", "HorsePastRace")
+    batch = []
+    for past_race in HorsePastRace.objects.order_by("pk").iterator(chunk_size=2000):
+        batch.append(fill_past_race_numbers(past_race))
+        if len(batch) >= 2000:
+            HorsePastRace.objects.bulk_update(batch, TYPED_FIELDS)
+            batch = []
+    if batch:
+        HorsePastRace.objects.bulk_update(batch, TYPED_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_race_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='horsepastrace',
+            name='body_weight_diff',
+            field=models.IntegerField(blank=True, null=True, verbose_name='馬体重の増減'),
+        ),
+        migrations.AddField(
+            model_name='horsepastrace',
+            name='body_weight_kg',
+            field=models.IntegerField(blank=True, null=True, verbose_name='馬体重(kg)'),
+        ),
+        migrations.AddField(
+            model_name='horsepastrace',
+            name='distance_m',
+            field=models.IntegerField(blank=True, null=True, verbose_name='距離(m)の数値'),
+        ),
+        migrations.AddField(
+            model_name='horsepastrace',
+            name='last_3f_seconds',
+            field=models.FloatField(blank=True, null=True, verbose_name='上がり3F(秒)'),
+        ),
+        migrations.AddField(
+            model_name='horsepastrace',
+            name='passing_positions',
+            field=models.JSONField(blank=True, null=True, verbose_name='通過順の位置'),
+        ),
+        migrations.AddField(
+            model_name='horsepastrace',
+            name='surface',
+            field=models.CharField(blank=True, max_length=2, null=True, verbose_name='馬場種別'),
+        ),
+        migrations.AddField(
+            model_name='horsepastrace',
+            name='time_seconds',
+            field=models.FloatField(blank=True, null=True, verbose_name='タイム(秒)'),
+        ),
+        migrations.AddIndex(
+            model_name='horsepastrace',
+            index=models.Index(fields=['surface', 'distance_m'], name='hpr_surface_distance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='horsepastrace',
+            index=models.Index(fields=['time_seconds'], name='hpr_time_seconds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='horsepastrace',
+            index=models.Index(fields=['last_3f_seconds'], name='hpr_last_3f_seconds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='horsepastrace',
+            index=models.Index(fields=['body_weight_kg'], name='hpr_body_weight_kg_idx'),
+        ),
+        migrations.RunPython(backfill_typed_columns, migrations.RunPython.noop),
+    ]
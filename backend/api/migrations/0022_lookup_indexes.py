@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_horsepastrace_typed_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['race', 'umaban'], name='entry_race_umaban_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='horsepastrace',
+            index=models.Index(fields=['horse', 'race_date'], name='hpr_horse_race_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='horsepastrace',
+            index=models.Index(fields=['horse', 'rank'], name='hpr_horse_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='horsepastrace',
+            index=models.Index(fields=['horse', 'venue_name', 'ground_condition'], name='hpr_horse_venue_ground_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='horsepastrace',
+            index=models.Index(fields=['past_race_id'], name='hpr_past_race_id_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='batch',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='バッチ'),
+        ),
+        migrations.AddIndex(
+            model_name='scrapejob',
+            index=models.Index(fields=['batch', 'status', 'created_at'], name='scrapejob_claim_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_scrapejob_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OddsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('odds', models.FloatField(blank=True, null=True, verbose_name='オッズ')),
+                ('popularity', models.IntegerField(blank=True, null=True, verbose_name='人気')),
+                ('fetched_at', models.DateTimeField(verbose_name='取得日時')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='odds_snapshots', to='api.entry', verbose_name='出走情報')),
+            ],
+            options={
+                'verbose_name': 'オッズ履歴',
+                'verbose_name_plural': 'オッズ履歴',
+                'ordering': ['entry', 'fetched_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='oddssnapshot',
+            index=models.Index(fields=['entry', 'fetched_at'], name='odds_entry_fetched_idx'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:09
+
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# 作成時点の api.horse_stats の集計（後で集計を変えても、このマイグレーションの結果は変えない）
+SOURCE_FIELDS = [
+    "horse_id",
+    "race_date",
+    "rank",
+    "race_grade_score",
+    "last_3f_rank",
+    "surface",
+    "distance_m",
+    "venue_name",
+]
+WIN_PLACE_RANKS = [1, 2, 3]
+SPLIT_FIELDS = {"surface": "surface", "distance": "distance_m", "venue": "venue_name"}
+
+
+def compute_horse_stats(past_races):
+    last_3f_ranks = [row["last_3f_rank"] for row in past_races if row["last_3f_rank"]]
+    race_dates = [row["race_date"] for row in past_races if row["race_date"]]
+    splits = {name: {} for name in SPLIT_FIELDS}
+    for row in past_races:
+        for name, field in SPLIT_FIELDS.items():
+            if row[field] in (None, ""):
+                continue
+            split = splits[name].setdefault(
+                str(row[field]), {"runs": 0, "wins": 0, "top3": 0}
+            )
+            split["runs"] += 1
+            split["wins"] += row["rank"] == 1
+            split["top3"] += row["rank"] in WIN_PLACE_RANKS
+    return {
+        "race_count": len(past_races),
+        "win_count": sum(1 for row in past_races if row["rank"] == 1),
+        "win_place_count": sum(
+            1 for row in past_races if row["rank"] in WIN_PLACE_RANKS
+        ),
+        "sum_grade_score": sum(row["race_grade_score"] or 0 for row in past_races),
+        "avg_last_3f_rank": (
+            round(sum(last_3f_ranks) / len(last_3f_ranks), 2) if last_3f_ranks else None
+        ),
+        "last_race_date": max(race_dates) if race_dates else None,
+        "splits": splits,
+    }
+
+
+def build_horse_stats(apps, schema_editor):
+    """既存の過去成績から馬ごとの集計を作る"""
+    HorsePastRace = apps.get_model("api", "HorsePastRace")
+    HorseStats = apps.get_model("api", "HorseStats")
+    rows = (
+        HorsePastRace.objects.order_by("horse_id")
+        .values(*SOURCE_FIELDS)
+        .iterator(chunk_size=2000)
+    )
+    batch = []
+    for horse_id, past_races in groupby(rows, key=itemgetter("horse_id")):
+        batch.append(
+            HorseStats(horse_id=horse_id, **compute_horse_stats(list(past_races)))
+        )
+        if len(batch) >= 500:
+            HorseStats.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        HorseStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_oddssnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HorseStats',
+            fields=[
+                ('horse', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='api.horse', verbose_name='馬')),
+                ('race_count', models.IntegerField(default=0, verbose_name='出走数')),
+                ('win_count', models.IntegerField(default=0, verbose_name='1着の回数')),
+                ('win_place_count', models.IntegerField(default=0, verbose_name='3着以内の回数')),
+                ('sum_grade_score', models.IntegerField(default=0, verbose_name='グレードスコアの合計')),
+                ('avg_last_3f_rank', models.FloatField(blank=True, null=True, verbose_name='上がり3Fの順番の平均')),
+                ('last_race_date', models.DateField(blank=True, null=True, verbose_name='最終出走日')),
+                ('splits', models.JSONField(blank=True, default=dict, verbose_name='条件別の成績')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': '馬の成績集計',
+                'verbose_name_plural': '馬の成績集計',
+            },
+        ),
+        migrations.RunPython(build_horse_stats, migrations.RunPython.noop),
+    ]
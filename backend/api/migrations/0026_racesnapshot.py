@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_horsestats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RaceSnapshot',
+            fields=[
+                ('race', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='api.race', verbose_name='レース')),
+                ('data_version', models.PositiveIntegerField(verbose_name='データバージョン')),
+                ('schema_version', models.PositiveIntegerField(verbose_name='レスポンス形式のバージョン')),
+                ('etag', models.CharField(max_length=64, verbose_name='ETag')),
+                ('body', models.BinaryField(verbose_name='レスポンス本文（JSON）')),
+                ('created_at', models.DateTimeField(auto_now=True, verbose_name='作成日時')),
+            ],
+            options={
+                'verbose_name': 'レース詳細のスナップショット',
+                'verbose_name_plural': 'レース詳細のスナップショット',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_racesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeJobLock',
+            fields=[
+                ('race_id', models.CharField(max_length=20, primary_key=True, serialize=False, verbose_name='レースID')),
+            ],
+            options={
+                'verbose_name': 'スクレイピングジョブのロック',
+                'verbose_name_plural': 'スクレイピングジョブのロック',
+            },
+        ),
+    ]
@@ -14,6 +14,9 @@ class Race(models.Model):
         "馬場状態", max_length=20, null=True, blank=True
     )
     head_count = models.IntegerField("頭数", null=True, blank=True)
+    # 出走情報・出走馬の過去成績が変わるたびに上がる（CSVなどの再生成判定に使う）
+    data_version = models.PositiveIntegerField("データバージョン", default=0)
+    updated_at = models.DateTimeField("データ更新日時", null=True, blank=True)
     created_at = models.DateTimeField("登録日時", auto_now_add=True)
 
     class Meta:
@@ -104,13 +107,81 @@ class Entry(models.Model):
             models.UniqueConstraint(fields=["race", "horse"], name="unique_entry")
         ]
         ordering = ["race__race_date", "umaban"]
+        indexes = [
+            # レースの出走馬を馬番順に取得する
+            models.Index(fields=["race", "umaban"], name="entry_race_umaban_idx"),
+        ]
 
     def __str__(self):
         return f"{self.race.race_name} - {self.horse.horse_name}"
 
 
+class OddsSnapshot(models.Model):
+    """単勝オッズ・人気の履歴（update_odds で変化があったときに記録する）"""
+
+    entry = models.ForeignKey(
+        Entry,
+        on_delete=models.CASCADE,
+        related_name="odds_snapshots",
+        verbose_name="出走情報",
+    )
+    odds = models.FloatField("オッズ", null=True, blank=True)
+    popularity = models.IntegerField("人気", null=True, blank=True)
+    fetched_at = models.DateTimeField("取得日時")
+
+    class Meta:
+        verbose_name = "オッズ履歴"
+        verbose_name_plural = "オッズ履歴"
+        ordering = ["entry", "fetched_at"]
+        indexes = [
+            models.Index(fields=["entry", "fetched_at"], name="odds_entry_fetched_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.entry} {self.fetched_at:%H:%M} {self.odds}"
+
+
+def _refresh_horse_stats(horse_ids):
+    # api.horse_stats は models を読み込むため、ここで読み込む
+    from .horse_stats import refresh_horse_stats
+
+    refresh_horse_stats(horse_ids)
+
+
+class HorsePastRaceQuerySet(models.QuerySet):
+    """
+    過去成績の書き込み（update・delete・bulk_create、bulk_update も update を通る）の後に、
+    対象の馬の HorseStats を計算し直す（api.horse_stats.refresh_horse_stats）
+    """
+
+    def update(self, **kwargs):
+        horse_ids = set(self.values_list("horse_id", flat=True))
+        count = super().update(**kwargs)
+        if "horse" in kwargs or "horse_id" in kwargs:
+            horse = kwargs.get("horse", kwargs.get("horse_id"))
+            horse_ids.add(getattr(horse, "pk", horse))
+        _refresh_horse_stats(horse_ids)
+        return count
+
+    update.alters_data = True
+
+    def delete(self):
+        horse_ids = set(self.values_list("horse_id", flat=True))
+        deleted = super().delete()
+        _refresh_horse_stats(horse_ids)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        _refresh_horse_stats({obj.horse_id for obj in objs})
+        return objs
+
+
 class HorsePastRace(models.Model):
-    """馬の過去レース成績"""
+    """馬の過去レース成績（保存・削除すると、その馬の HorseStats も計算し直す）"""
 
     horse = models.ForeignKey(
         Horse, on_delete=models.CASCADE, related_name="past_races", verbose_name="馬"
@@ -146,15 +217,115 @@ class HorsePastRace(models.Model):
     )
     body_weight = models.CharField("馬体重", max_length=20, null=True, blank=True)
 
+    # 上の文字列のカラムを数値にしたもの（api/race_parsers.py で埋める）
+    time_seconds = models.FloatField("タイム(秒)", null=True, blank=True)
+    surface = models.CharField("馬場種別", max_length=2, null=True, blank=True)
+    distance_m = models.IntegerField("距離(m)の数値", null=True, blank=True)
+    last_3f_seconds = models.FloatField("上がり3F(秒)", null=True, blank=True)
+    body_weight_kg = models.IntegerField("馬体重(kg)", null=True, blank=True)
+    body_weight_diff = models.IntegerField("馬体重の増減", null=True, blank=True)
+    passing_positions = models.JSONField("通過順の位置", null=True, blank=True)
+
+    objects = HorsePastRaceQuerySet.as_manager()
+
     class Meta:
         verbose_name = "過去走成績"
         verbose_name_plural = "過去走成績"
         ordering = ["-race_date"]
         unique_together = ("horse", "past_race_id")
+        indexes = [
+            # 馬ごとの成績を日付順に取得する（prefetch・直近N走の絞り込み）
+            models.Index(fields=["horse", "race_date"], name="hpr_horse_race_date_idx"),
+            # 馬ごとの着順での集計（win_place_count・着順の絞り込み）
+            models.Index(fields=["horse", "rank"], name="hpr_horse_rank_idx"),
+            # 馬ごとの開催地・馬場での絞り込み
+            models.Index(
+                fields=["horse", "venue_name", "ground_condition"],
+                name="hpr_horse_venue_ground_idx",
+            ),
+            # 同じレースの成績を馬をまたいで探す
+            models.Index(fields=["past_race_id"], name="hpr_past_race_id_idx"),
+            models.Index(
+                fields=["surface", "distance_m"], name="hpr_surface_distance_idx"
+            ),
+            models.Index(fields=["time_seconds"], name="hpr_time_seconds_idx"),
+            models.Index(fields=["last_3f_seconds"], name="hpr_last_3f_seconds_idx"),
+            models.Index(fields=["body_weight_kg"], name="hpr_body_weight_kg_idx"),
+        ]
 
     def __str__(self):
         return f"{self.horse.horse_name} - {self.race_date} {self.race_name}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _refresh_horse_stats([self.horse_id])
+
+    def delete(self, *args, **kwargs):
+        horse_id = self.horse_id
+        deleted = super().delete(*args, **kwargs)
+        _refresh_horse_stats([horse_id])
+        return deleted
+
+
+class HorseStats(models.Model):
+    """
+    馬ごとの過去成績の集計（過去成績を書き込むたびに api/horse_stats.py で更新する。
+    HorsePastRaceQuerySet・HorsePastRace.save/delete から呼ばれる）。
+    レース詳細の並べ替えで、毎回過去成績を集計しないために使う
+    """
+
+    horse = models.OneToOneField(
+        Horse,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="馬",
+    )
+    race_count = models.IntegerField("出走数", default=0)
+    win_count = models.IntegerField("1着の回数", default=0)
+    win_place_count = models.IntegerField("3着以内の回数", default=0)
+    sum_grade_score = models.IntegerField("グレードスコアの合計", default=0)
+    avg_last_3f_rank = models.FloatField("上がり3Fの順番の平均", null=True, blank=True)
+    last_race_date = models.DateField("最終出走日", null=True, blank=True)
+    # {"surface": {"芝": {"runs": 3, "wins": 1, "top3": 2}}, "distance": {"1600": ...}, "venue": {...}}
+    splits = models.JSONField("条件別の成績", default=dict, blank=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
+
+    class Meta:
+        verbose_name = "馬の成績集計"
+        verbose_name_plural = "馬の成績集計"
+
+    def __str__(self):
+        return f"{self.horse_id} ({self.win_place_count}/{self.race_count})"
+
+
+class RaceSnapshot(models.Model):
+    """
+    レース詳細レスポンス（絞り込みなし）を描画済みのJSON。
+    スクレイピング完了時に api/race_snapshots.py で作り、ビューはそのまま返す。
+    data_version・schema_version が今のものと違えば使わない
+    """
+
+    race = models.OneToOneField(
+        Race,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="snapshot",
+        verbose_name="レース",
+    )
+    data_version = models.PositiveIntegerField("データバージョン")
+    schema_version = models.PositiveIntegerField("レスポンス形式のバージョン")
+    etag = models.CharField("ETag", max_length=64)
+    body = models.BinaryField("レスポンス本文（JSON）")
+    created_at = models.DateTimeField("作成日時", auto_now=True)
+
+    class Meta:
+        verbose_name = "レース詳細のスナップショット"
+        verbose_name_plural = "レース詳細のスナップショット"
+
+    def __str__(self):
+        return f"{self.race_id} v{self.data_version}"
+
 
 class AIPrediction(models.Model):
     """AI予想"""
@@ -201,3 +372,70 @@ class AIPrediction(models.Model):
 
     def __str__(self):
         return f"AI予想: {self.race} ({self.prediction_model_name})"
+
+
+class ScrapeJob(models.Model):
+    """スクレイピングジョブ"""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "待機中"),
+        (STATUS_RUNNING, "実行中"),
+        (STATUS_COMPLETED, "完了"),
+        (STATUS_FAILED, "失敗"),
+    ]
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    race_id = models.CharField("レースID", max_length=20, db_index=True)
+    status = models.CharField(
+        "状態",
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_QUEUED,
+        db_index=True,
+    )
+    entry_only = models.BooleanField("エントリーのみ", default=False)
+    # 一括取得（backfill_races）のジョブは範囲ごとの名前を付け、通常のワーカーとは別に処理する
+    batch = models.CharField("バッチ", max_length=100, blank=True, default="")
+    total_horses = models.IntegerField("対象頭数", null=True, blank=True)
+    completed_horses = models.IntegerField("取得済み頭数", default=0)
+    # [{"horse_id": ..., "horse_name": ..., "status": "pending" | "done" | "failed"}]
+    progress = models.JSONField("馬ごとの進捗", default=list, blank=True)
+    error_message = models.TextField("エラー内容", blank=True)
+    created_at = models.DateTimeField("登録日時", auto_now_add=True)
+    started_at = models.DateTimeField("開始日時", null=True, blank=True)
+    finished_at = models.DateTimeField("終了日時", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "スクレイピングジョブ"
+        verbose_name_plural = "スクレイピングジョブ"
+        ordering = ["-created_at"]
+        indexes = [
+            # バッチごとに待機中のジョブを古い順に取り出す
+            models.Index(
+                fields=["batch", "status", "created_at"], name="scrapejob_claim_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.race_id} ({self.status})"
+
+
+class ScrapeJobLock(models.Model):
+    """
+    race_idごとのジョブ登録用のロック行。
+    enqueue_scrape_job はこの行を select_for_update してから既存ジョブを探すため、
+    同時に届いた要求でもジョブが二重に作られない
+    """
+
+    race_id = models.CharField("レースID", max_length=20, primary_key=True)
+
+    class Meta:
+        verbose_name = "スクレイピングジョブのロック"
+        verbose_name_plural = "スクレイピングジョブのロック"
+
+    def __str__(self):
+        return self.race_id
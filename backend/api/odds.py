@@ -0,0 +1,95 @@
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Entry, OddsSnapshot
+from .race_snapshots import refresh_race_snapshots
+from .race_versions import bump_data_version
+
+# 単勝オッズのJSON API（出馬表のオッズはJSで描画されるため、同じAPIを直接読む）
+ODDS_API_URL = (
+    "https://race.netkeiba.com/api/api_get_jra_odds.html"
+    "?race_id={race_id}&type=1&action=update"
+)
+
+# APIの status がこれならオッズは確定しており、以降は取得しなくてよい
+ODDS_STATUS_FINAL = "result"
+
+
+def parse_win_odds(text):
+    """
+    単勝オッズAPIのレスポンスを読み取り、({馬番: (オッズ, 人気)}, 確定したか) を返す。
+    data.odds["1"] が {"01": ["3.5", "", "2"], ...}（オッズ, 未使用, 人気）の形
+    """
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return {}, False
+    data = payload.get("data") or {}
+    win_odds = (data.get("odds") or {}).get("1") or {}
+    odds_by_umaban = {}
+    for umaban, values in win_odds.items():
+        try:
+            umaban = int(umaban)
+        except ValueError:
+            continue
+        odds = _to_float(values[0]) if len(values) > 0 else None
+        popularity = _to_int(values[2]) if len(values) > 2 else None
+        odds_by_umaban[umaban] = (odds, popularity)
+    return odds_by_umaban, payload.get("status") == ODDS_STATUS_FINAL
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def update_race_odds(race_id, odds_by_umaban, fetched_at=None):
+    """
+    レースの出走情報のオッズ・人気を更新し、変わった馬だけ履歴に記録する。
+    出走情報は1クエリで読み、変わった行だけ bulk_update する。
+    戻り値は更新した Entry のリスト
+    """
+    if not odds_by_umaban:
+        return []
+    fetched_at = fetched_at or timezone.now()
+    changed = []
+    for entry in Entry.objects.filter(race_id=race_id, umaban__in=odds_by_umaban):
+        odds, popularity = odds_by_umaban[entry.umaban]
+        # 発売前などでオッズが無いときは既存の値を残す
+        if odds is None:
+            continue
+        if (entry.odds, entry.popularity) != (odds, popularity):
+            entry.odds = odds
+            entry.popularity = popularity
+            changed.append(entry)
+    if not changed:
+        return []
+
+    with transaction.atomic():
+        Entry.objects.bulk_update(changed, ["odds", "popularity"])
+        OddsSnapshot.objects.bulk_create(
+            [
+                OddsSnapshot(
+                    entry=entry,
+                    odds=entry.odds,
+                    popularity=entry.popularity,
+                    fetched_at=fetched_at,
+                )
+                for entry in changed
+            ]
+        )
+        bump_data_version(race_ids=[race_id])
+    # 描画済みのレース詳細があれば新しいオッズで描画し直す
+    refresh_race_snapshots([race_id])
+    return changed
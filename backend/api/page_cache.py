@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+
+from django.conf import settings
+
+# 馬の成績ページの最新の出走日（成績表の最初の日付）
+_RACE_DATE_RE = re.compile(r"(\d{4})/(\d{2})/(\d{2})")
+
+
+class PageCache:
+    """
+    取得したページのHTMLをURLごとにgzipでディスクに保存するキャッシュ。
+    取得日時はファイルの更新日時で持つ。hits / misses はプロセス内の累計
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def path(self, url):
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.html.gz")
+
+    def get(self, url):
+        """キャッシュ済みなら (html, 取得日時のUNIX時刻) を返す。無ければNone"""
+        path = self.path(url)
+        try:
+            fetched_at = os.path.getmtime(path)
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return f.read(), fetched_at
+        except (OSError, EOFError):
+            return None
+
+    def put(self, url, html):
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書き込み途中のファイルを読まれないよう、一時ファイルに書いてから置き換える
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            f.write(html)
+        os.replace(temp_path, path)
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def last_race_date(html):
+    """馬の成績ページから最新の出走日を読み取る（無ければNone）"""
+    start = html.find("db_h_race_results")
+    match = _RACE_DATE_RE.search(html, start if start >= 0 else 0)
+    if not match:
+        return None
+    try:
+        return date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return None
+
+
+def horse_page_max_age(html, today=None):
+    """
+    馬の成績ページをキャッシュから使ってよい期間（秒）。
+    成績ページは次に出走するまで変わらないため、しばらく出走していない馬
+    （settings.PAGE_CACHE_INACTIVE_DAYS 日以上）は長め、それ以外は短めにする
+    """
+    today = today or date.today()
+    last_date = last_race_date(html)
+    if last_date and (today - last_date).days >= settings.PAGE_CACHE_INACTIVE_DAYS:
+        return settings.PAGE_CACHE_INACTIVE_TTL
+    return settings.PAGE_CACHE_TTL
+
+
+def is_horse_page_fresh(html, fetched_at, now=None):
+    now = now or time.time()
+    today = datetime.fromtimestamp(now).date()
+    return now - fetched_at < horse_page_max_age(html, today)
+
+
+_page_caches = {}
+_page_caches_lock = threading.Lock()
+
+
+def get_page_cache():
+    """
+    settings.PAGE_CACHE_DIR のページキャッシュを返す（空なら無効でNone）。
+    同じプロセス内では共有し、ヒット数などをまとめて数える
+    """
+    directory = getattr(settings, "PAGE_CACHE_DIR", "")
+    if not directory:
+        return None
+    with _page_caches_lock:
+        if directory not in _page_caches:
+            _page_caches[directory] = PageCache(directory)
+        return _page_caches[directory]
@@ -0,0 +1,383 @@
+import datetime
+import json
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+from .models import Entry, HorsePastRace, Race
+from .race_parsers import parse_distance
+
+# 出力するカラムと型。"category" はParquetで辞書エンコードされる（開催地・天気などの少数の値）。
+# "date" は datetime64 にする。整数は欠損を持てる Int 型にする
+RACE_SCHEMA = {
+    "race_id": "string",
+    "race_name": "string",
+    "race_number": "string",
+    "race_date": "date",
+    "venue": "category",
+    "course_details": "string",
+    "ground_condition": "category",
+    "head_count": "Int16",
+    "data_version": "Int32",
+}
+
+ENTRY_SCHEMA = {
+    "id": "Int64",
+    "race_id": "string",
+    "race__race_date": "date",
+    "race__venue": "category",
+    "horse_id": "string",
+    "horse__horse_name": "string",
+    "jockey_id": "string",
+    "jockey__jockey_name": "string",
+    "waku": "Int16",
+    "umaban": "Int16",
+    "weight_carried": "float32",
+    "odds": "float64",
+    "popularity": "Int16",
+    "horse_weight": "Int16",
+    "horse_weight_diff": "Int16",
+}
+
+PAST_RACE_SCHEMA = {
+    "id": "Int64",
+    "horse_id": "string",
+    "past_race_id": "string",
+    "race_date": "date",
+    "venue_round": "string",
+    "venue_name": "category",
+    "venue_day": "string",
+    "race_name": "string",
+    "race_grade_score": "Int16",
+    "weather": "category",
+    "head_count": "Int16",
+    "waku": "Int16",
+    "umaban": "Int16",
+    "odds": "float64",
+    "popularity": "Int16",
+    "rank": "Int16",
+    "jockey_id": "string",
+    "jockey_name": "string",
+    "weight_carried": "float32",
+    "distance": "string",
+    "ground_condition": "category",
+    "time": "string",
+    "margin": "string",
+    "passing": "string",
+    "pace": "string",
+    "last_3f": "string",
+    "last_3f_rank": "Int16",
+    "body_weight": "string",
+    "time_seconds": "float64",
+    "surface": "category",
+    "distance_m": "Int16",
+    "last_3f_seconds": "float32",
+    "body_weight_kg": "Int16",
+    "body_weight_diff": "Int16",
+}
+
+# 年・開催地の分割用の列（ディレクトリ名になる文字列）
+PARTITION_SCHEMA = {"year": "string", "venue": "string"}
+
+# 出力するファイルの列と型（読み込み時に全ファイルの型が揃うよう、毎回この型で書く）
+RACE_OUTPUT_SCHEMA = {
+    **{
+        ("venue_name" if column == "venue" else column): dtype
+        for column, dtype in RACE_SCHEMA.items()
+    },
+    "surface": "category",
+    "distance_m": "Int16",
+    **PARTITION_SCHEMA,
+}
+ENTRY_COLUMN_NAMES = {
+    "race__race_date": "race_date",
+    "race__venue": "venue_name",
+    "horse__horse_name": "horse_name",
+    "jockey__jockey_name": "jockey_name",
+}
+ENTRY_OUTPUT_SCHEMA = {
+    **{ENTRY_COLUMN_NAMES.get(column, column): dtype for column, dtype in ENTRY_SCHEMA.items()},
+    **PARTITION_SCHEMA,
+}
+PAST_RACE_OUTPUT_SCHEMA = {**PAST_RACE_SCHEMA, **PARTITION_SCHEMA}
+
+# 出力先のディレクトリ名
+RACES_DATASET = "races"
+ENTRIES_DATASET = "entries"
+PAST_RACES_DATASET = "past_races"
+DATASETS = (RACES_DATASET, ENTRIES_DATASET, PAST_RACES_DATASET)
+
+# 出力済みのレース・過去成績を記録するファイル（差分出力に使う）
+STATE_FILENAME = "_export_state.json"
+
+# 年・開催地で分割する（year=2024/venue=東京/part-*.parquet）
+PARTITION_COLUMNS = ["year", "venue"]
+
+
+def to_frame(rows, schema, columns=None):
+    """values_list の行を、schema の型の DataFrame にする"""
+    frame = pd.DataFrame.from_records(rows, columns=columns or list(schema))
+    for column, dtype in schema.items():
+        if dtype == "date":
+            frame[column] = pd.to_datetime(frame[column])
+        else:
+            frame[column] = frame[column].astype(dtype)
+    return frame
+
+
+def _add_partitions(frame, date_column, venue_column):
+    # 分割の値はディレクトリ名になるため文字列にする（欠損は __HIVE_DEFAULT_PARTITION__）。
+    # 読み込み時は year が整数、venue が辞書エンコードの列として戻る
+    frame["year"] = frame[date_column].dt.strftime("%Y").astype(object)
+    frame["venue"] = frame[venue_column].astype(object)
+    return frame
+
+
+def race_frame(race_ids):
+    """レースの DataFrame。course_details から馬場（surface）・距離（distance_m）も付ける"""
+    rows = Race.objects.filter(race_id__in=race_ids).order_by().values_list(*RACE_SCHEMA)
+    frame = to_frame(list(rows), RACE_SCHEMA)
+    courses = [parse_distance(value) for value in frame["course_details"].fillna("")]
+    frame["surface"] = pd.Series(
+        [surface for surface, _ in courses], dtype="category", index=frame.index
+    )
+    frame["distance_m"] = pd.Series(
+        [distance for _, distance in courses], dtype="Int16", index=frame.index
+    )
+    # 分割用の venue と重ならないよう、開催地は他のデータセットと同じ venue_name にする
+    frame = frame.rename(columns={"venue": "venue_name"})
+    return _add_partitions(frame, "race_date", "venue_name")
+
+
+def entry_frame(race_ids):
+    """出走情報の DataFrame（馬名・騎手名と、分割用にレースの開催日・開催地を付ける）"""
+    rows = (
+        Entry.objects.filter(race_id__in=race_ids).order_by().values_list(*ENTRY_SCHEMA)
+    )
+    frame = to_frame(list(rows), ENTRY_SCHEMA).rename(columns=ENTRY_COLUMN_NAMES)
+    return _add_partitions(frame, "race_date", "venue_name")
+
+
+def past_race_frame(rows):
+    """過去成績の DataFrame（過去のレースの開催日・開催地で分割する）"""
+    return _add_partitions(to_frame(rows, PAST_RACE_SCHEMA), "race_date", "venue_name")
+
+
+def arrow_schema(schema):
+    """
+    to_frame の型の dict を pyarrow のスキーマにする。
+    値から型を推測させると、全件欠損のバッチが別の型（null）で書かれ、
+    データセットとして読んだときに他のファイルの値が欠損になるため
+    """
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(),
+        "date": pa.timestamp("ns"),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "Int16": pa.int16(),
+        "Int32": pa.int32(),
+        "Int64": pa.int64(),
+        "float32": pa.float32(),
+        "float64": pa.float64(),
+    }
+    return pa.schema([(column, types[dtype]) for column, dtype in schema.items()])
+
+
+def write_partitioned(frame, root, schema):
+    """
+    frame を年・開催地で分割して root に追記する（schema は *_OUTPUT_SCHEMA）。
+    既存のファイルは残し、書き込みごとに別名のファイルを足す
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if frame.empty:
+        return 0
+    table = pa.Table.from_pandas(frame, schema=arrow_schema(schema), preserve_index=False)
+    pq.write_to_dataset(
+        table,
+        root,
+        partition_cols=PARTITION_COLUMNS,
+        # pandas の型（Int16 など）の情報を含むスキーマ
+        schema=table.schema,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return len(frame)
+
+
+def remove_rows(root, column, values):
+    """
+    root のデータセットから column の値が values の行を消す。
+    該当する行を含むファイルだけ読み直して書き直す（空になれば消す）。
+    戻り値は消した行数
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    if not values or not os.path.isdir(root):
+        return 0
+    value_set = pa.array(sorted(values), type=pa.string())
+    removed = 0
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if not filename.endswith(".parquet"):
+                continue
+            path = os.path.join(directory, filename)
+            matches = pc.is_in(
+                pq.ParquetFile(path).read(columns=[column])[column], value_set=value_set
+            )
+            count = pc.sum(matches).as_py() or 0
+            if not count:
+                continue
+            table = pq.ParquetFile(path).read()
+            if count == len(table):
+                os.remove(path)
+            else:
+                temp_path = f"{path}.tmp"
+                pq.write_table(table.filter(pc.invert(matches)), temp_path)
+                os.replace(temp_path, path)
+            removed += count
+    return removed
+
+
+def load_export_state(output_dir):
+    """
+    出力済みの記録。races は race_id → 出力時の data_version、
+    past_race_max_id は出力済みの過去成績の最大の主キー、
+    pending_horse_ids は過去成績を書き直している途中の馬
+    """
+    path = os.path.join(output_dir, STATE_FILENAME)
+    if not os.path.exists(path):
+        return {"races": {}, "past_race_max_id": 0, "pending_horse_ids": []}
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    if "race_ids" in state:
+        # data_version を記録していない形式。出力時のバージョンが分からないため書き直させる
+        state["races"] = dict.fromkeys(state.pop("race_ids"))
+    state.setdefault("pending_horse_ids", [])
+    return state
+
+
+def save_export_state(output_dir, state):
+    state["updated_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+    path = os.path.join(output_dir, STATE_FILENAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def clear_export(output_dir):
+    """出力済みのデータセットと記録を消す（全件を出力し直すとき）"""
+    for name in DATASETS:
+        shutil.rmtree(os.path.join(output_dir, name), ignore_errors=True)
+    state_path = os.path.join(output_dir, STATE_FILENAME)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+
+def export_parquet(output_dir, race_batch_size=500, past_race_batch_size=100000):
+    """
+    レース・出走情報・過去成績を output_dir に Parquet のデータセットとして出力する。
+    前回までに出力したレースは出力しない（新しいものだけ追記する）。
+    出力後に data_version が変わったレース（再取得・オッズ更新）と削除されたレースは、
+    そのレースの行を含むファイルから行を消して書き直す。過去成績の更新・削除も
+    出走するレースの data_version を上げるため、それらのレースの出走馬の過去成績も
+    同じように書き直す。戻り値は出力した行数のdict
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state = load_export_state(output_dir)
+    exported = state["races"]
+    counts = dict.fromkeys(DATASETS, 0)
+
+    # 過去成績の上限を先に決める（この後に登録されたレースの過去成績は次回に出力する）
+    max_id = HorsePastRace.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    versions = dict(Race.objects.values_list("race_id", "data_version"))
+    changed_ids = [
+        race_id
+        for race_id, data_version in exported.items()
+        if versions.get(race_id) != data_version
+    ]
+    if changed_ids:
+        # 書き直す馬を先に記録する（途中で止まっても、次回に続きを書き直す）
+        state["pending_horse_ids"] = sorted(
+            set(state["pending_horse_ids"]).union(
+                Entry.objects.filter(race_id__in=changed_ids).values_list(
+                    "horse_id", flat=True
+                )
+            )
+        )
+        save_export_state(output_dir, state)
+        for name in (RACES_DATASET, ENTRIES_DATASET):
+            remove_rows(os.path.join(output_dir, name), "race_id", changed_ids)
+        for race_id in changed_ids:
+            del exported[race_id]
+        save_export_state(output_dir, state)
+
+    new_race_ids = sorted(race_id for race_id in versions if race_id not in exported)
+    for start in range(0, len(new_race_ids), race_batch_size):
+        batch = new_race_ids[start : start + race_batch_size]
+        counts[RACES_DATASET] += write_partitioned(
+            race_frame(batch), os.path.join(output_dir, RACES_DATASET), RACE_OUTPUT_SCHEMA
+        )
+        counts[ENTRIES_DATASET] += write_partitioned(
+            entry_frame(batch),
+            os.path.join(output_dir, ENTRIES_DATASET),
+            ENTRY_OUTPUT_SCHEMA,
+        )
+        # 途中で止まっても、書き終えたレースから再開できるよう毎回記録する
+        exported.update((race_id, versions[race_id]) for race_id in batch)
+        save_export_state(output_dir, state)
+
+    # 過去成績: 書き直す馬は今の行をすべて書き直し、他の馬は主キー順に前回の続きから出力する
+    past_race_root = os.path.join(output_dir, PAST_RACES_DATASET)
+    pending_horse_ids = state["pending_horse_ids"]
+    if pending_horse_ids:
+        remove_rows(past_race_root, "horse_id", pending_horse_ids)
+        for rows in _past_race_batches(
+            HorsePastRace.objects.filter(horse_id__in=pending_horse_ids, pk__lte=max_id),
+            past_race_batch_size,
+        ):
+            counts[PAST_RACES_DATASET] += write_partitioned(
+                past_race_frame(rows), past_race_root, PAST_RACE_OUTPUT_SCHEMA
+            )
+    for rows in _past_race_batches(
+        HorsePastRace.objects.filter(
+            pk__gt=state["past_race_max_id"], pk__lte=max_id
+        ).exclude(horse_id__in=pending_horse_ids),
+        past_race_batch_size,
+    ):
+        counts[PAST_RACES_DATASET] += write_partitioned(
+            past_race_frame(rows), past_race_root, PAST_RACE_OUTPUT_SCHEMA
+        )
+        state["past_race_max_id"] = rows[-1][0]
+        save_export_state(output_dir, state)
+    state["past_race_max_id"] = max(state["past_race_max_id"], max_id)
+    state["pending_horse_ids"] = []
+    save_export_state(output_dir, state)
+    return counts
+
+
+def _past_race_batches(queryset, batch_size):
+    """過去成績の values_list の行を、主キー順に batch_size 件ずつ返す"""
+    rows = (
+        queryset.order_by("pk").values_list(*PAST_RACE_SCHEMA).iterator(chunk_size=2000)
+    )
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_dataset(output_dir, name, **kwargs):
+    """出力したデータセットを DataFrame で読む（year・venue での絞り込みは filters で）"""
+    return pd.read_parquet(os.path.join(output_dir, name), **kwargs)
@@ -0,0 +1,58 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags
+
+# レスポンスの形式を変えたときに上げる（古い形式のキャッシュ・ETagを使わないため）
+RACE_DETAIL_SCHEMA_VERSION = 4
+
+
+def race_detail_cache_key(race, variant=""):
+    """
+    レース詳細レスポンスのキャッシュキー。
+    data_version を含めるため、スクレイピングでデータが変わると自動的に別のキーになる
+    """
+    key = f"race-detail:s{RACE_DETAIL_SCHEMA_VERSION}:{race.race_id}:v{race.data_version}"
+    if variant:
+        key = f"{key}:{variant}"
+    return key
+
+
+def race_detail_variant(filters):
+    """絞り込み条件ごとに別のキャッシュにするための文字列（条件が無ければ空）"""
+    if not filters:
+        return ""
+    canonical = json.dumps(filters, sort_keys=True, ensure_ascii=False)
+    return hashlib.md5(canonical.encode("utf-8")).hexdigest()
+
+
+def race_detail_etag(race, variant="", response_format=""):
+    """response_format: 返す形式（列形式など）。同じデータでも本文が違うため別のETagにする"""
+    key = race_detail_cache_key(race, variant)
+    if response_format:
+        key = f"{key}:{response_format}"
+    digest = hashlib.md5(key.encode("utf-8"))
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(etag, if_none_match):
+    """
+    If-None-Match に etag が含まれるか（弱い比較）。
+    圧縮ミドルウェアが ETag を W/"..." にするため、W/ の有無は区別しない
+    """
+    tags = parse_etags(if_none_match)
+    return "*" in tags or etag in {tag[2:] if tag.startswith("W/") else tag for tag in tags}
+
+
+def get_cached_race_detail(race, variant=""):
+    return cache.get(race_detail_cache_key(race, variant))
+
+
+def set_cached_race_detail(race, data, variant=""):
+    cache.set(
+        race_detail_cache_key(race, variant),
+        data,
+        settings.RACE_DETAIL_CACHE_TIMEOUT,
+    )
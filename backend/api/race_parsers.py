@@ -0,0 +1,65 @@
+import re
+
+# 馬場の表記（netkeibaの距離欄の先頭1文字）
+SURFACE_TURF = "芝"
+SURFACE_DIRT = "ダ"
+SURFACE_JUMP = "障"
+
+_DISTANCE_RE = re.compile(r"^\s*([芝ダ障])\D*(\d+)")
+_TIME_RE = re.compile(r"^\s*(?:(\d+):)?(\d+(?:\.\d+)?)\s*$")
+_BODY_WEIGHT_RE = re.compile(r"^\s*(\d+)\s*(?:\(\s*([+-]?\d+)\s*\))?")
+
+
+def parse_race_time(value):
+    """'1:33.5' や '59.8' を秒（float）にする。読み取れなければNone"""
+    match = _TIME_RE.match(value or "")
+    if not match:
+        return None
+    minutes, seconds = match.groups()
+    return round(int(minutes or 0) * 60 + float(seconds), 1)
+
+
+def parse_distance(value):
+    """'芝1600' や 'ダ右1200' を (馬場, 距離m) にする。読み取れなければ (None, None)"""
+    match = _DISTANCE_RE.match(value or "")
+    if not match:
+        return None, None
+    return match.group(1), int(match.group(2))
+
+
+def parse_last_3f(value):
+    """上がり3F（'33.8'）をfloatにする。読み取れなければNone"""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def parse_body_weight(value):
+    """'480(+4)' を (480, 4) にする。'計不' など読み取れなければ (None, None)"""
+    match = _BODY_WEIGHT_RE.match(value or "")
+    if not match:
+        return None, None
+    weight, diff = match.groups()
+    return int(weight), int(diff) if diff is not None else None
+
+
+def parse_passing(value):
+    """通過順（'3-3-2-1'）を [3, 3, 2, 1] にする。読み取れなければNone"""
+    positions = [int(p) for p in re.findall(r"\d+", value or "")]
+    return positions or None
+
+
+def fill_past_race_numbers(past_race):
+    """
+    HorsePastRace の文字列のカラム（time, distance, last_3f, body_weight, passing）
+    から数値のカラムを埋める。SQLで絞り込み・集計できるようにするため
+    """
+    past_race.time_seconds = parse_race_time(past_race.time)
+    past_race.surface, past_race.distance_m = parse_distance(past_race.distance)
+    past_race.last_3f_seconds = parse_last_3f(past_race.last_3f)
+    past_race.body_weight_kg, past_race.body_weight_diff = parse_body_weight(
+        past_race.body_weight
+    )
+    past_race.passing_positions = parse_passing(past_race.passing)
+    return past_race
@@ -0,0 +1,113 @@
+from .models import HorsePastRace
+from .race_queries import DEFAULT_ENTRY_ORDERING, filter_past_races, race_entries_queryset
+from .serializers import (
+    HorsePastRaceSerializer,
+    HorseStatsSerializer,
+    RaceSerializer,
+)
+
+# 出力するカラム（シリアライザと同じ並び）
+RACE_FIELDS = [field for field in RaceSerializer.Meta.fields if field != "entries"]
+PAST_RACE_FIELDS = HorsePastRaceSerializer.Meta.fields
+STATS_FIELDS = HorseStatsSerializer.Meta.fields
+ENTRY_FIELDS = ["waku", "umaban", "weight_carried", "odds", "popularity"]
+
+
+def _date(value):
+    # DRF の DateField と同じISO形式の文字列
+    return value.isoformat() if value is not None else None
+
+
+def race_detail_payload(race, ordering=DEFAULT_ENTRY_ORDERING, filters=None):
+    """
+    RaceSerializer(race).data と同じ内容のdictを、values() の行から直接作る。
+    クエリは出走馬（騎手・馬・HorseStats をJOIN）と過去成績の2件で、
+    ModelSerializer のフィールドごとの変換を通さない
+    """
+    entries = list(
+        race_entries_queryset(race, ordering, filters)
+        .select_related(None)
+        .prefetch_related(None)
+        .values(
+            *ENTRY_FIELDS,
+            "horse_id",
+            "horse__horse_name",
+            "jockey_id",
+            "jockey__jockey_name",
+            "win_place_count",
+            "sum_grade_score",
+            "horse__stats__horse_id",
+            *(f"horse__stats__{field}" for field in STATS_FIELDS),
+        )
+    )
+
+    # 過去成績は prefetch と同じ条件・並び（新しい順）で読み、馬ごとに分ける
+    past_races_by_horse = {entry["horse_id"]: [] for entry in entries}
+    if entries:
+        past_races = filter_past_races(
+            HorsePastRace.objects.filter(horse_id__in=list(past_races_by_horse)),
+            race,
+            filters,
+        ).values("horse_id", *PAST_RACE_FIELDS)
+        for row in past_races:
+            past_race = {field: row[field] for field in PAST_RACE_FIELDS}
+            past_race["race_date"] = _date(past_race["race_date"])
+            past_races_by_horse[row["horse_id"]].append(past_race)
+
+    data = {field: getattr(race, field) for field in RACE_FIELDS}
+    data["race_date"] = _date(race.race_date)
+    data["entries"] = [
+        _entry_payload(entry, race.race_date, past_races_by_horse[entry["horse_id"]])
+        for entry in entries
+    ]
+    return data
+
+
+def _entry_payload(entry, race_date, past_races):
+    payload = {field: entry[field] for field in ENTRY_FIELDS}
+    payload["horse"] = {
+        "horse_id": entry["horse_id"],
+        "horse_name": entry["horse__horse_name"],
+        "past_races": past_races,
+    }
+    payload["jockey"] = (
+        {"jockey_id": entry["jockey_id"], "jockey_name": entry["jockey__jockey_name"]}
+        if entry["jockey_id"] is not None
+        else None
+    )
+    payload["win_place_count"] = entry["win_place_count"]
+    payload["horse_past_race_grade_score_total"] = entry["sum_grade_score"] or 0
+    payload["horse_stats"] = _stats_payload(entry, race_date)
+    return payload
+
+
+def _stats_payload(entry, race_date):
+    """EntrySerializer.get_horse_stats と同じ値（HorseStats が無ければNone）"""
+    if entry["horse__stats__horse_id"] is None:
+        return None
+    stats = {field: entry[f"horse__stats__{field}"] for field in STATS_FIELDS}
+    last_race_date = stats["last_race_date"]
+    stats["last_race_date"] = _date(last_race_date)
+    stats["days_since_last_run"] = (
+        (race_date - last_race_date).days
+        if race_date and last_race_date and last_race_date <= race_date
+        else None
+    )
+    return stats
+
+
+def to_columnar(data):
+    """
+    レース詳細のdictを列形式にする（ColumnarJSONRenderer 用）。
+    過去成績のキーは先頭の past_race_columns に1度だけ持ち、
+    各馬の past_races は PAST_RACE_FIELDS の順の値の配列にする。元のdictは変えない
+    """
+    entries = []
+    for entry in data["entries"]:
+        horse = entry["horse"]
+        past_races = [
+            [past_race[field] for field in PAST_RACE_FIELDS]
+            for past_race in horse["past_races"]
+        ]
+        entries.append({**entry, "horse": {**horse, "past_races": past_races}})
+    return {**data, "past_race_columns": PAST_RACE_FIELDS, "entries": entries}
@@ -0,0 +1,146 @@
+from django.db.models import (
+    Count,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Coalesce
+
+from .models import Entry, HorsePastRace
+
+# 複勝圏（3着以内）とみなす着順
+WIN_PLACE_RANKS = [1, 2, 3]
+
+# 出走馬の並び順（複勝圏の回数 → グレードスコア合計 → 馬番）
+DEFAULT_ENTRY_ORDERING = ("-win_place_count", "-sum_grade_score", "umaban")
+
+
+def filter_past_races(queryset, race, filters=None):
+    """
+    過去成績のクエリセットを絞り込む（フロントエンドの FilterControls と同じ条件）。
+    filters は PastRaceFilterSerializer で検証済みのdict
+    - venue: 開催地（"all" は絞り込まない）
+    - distance: 距離（数字だけなら distance_m の一致、それ以外は distance の部分一致）
+    - weather / ground_condition: いずれかに一致
+    - recent: 馬ごとに直近N走（他の条件より先に、全成績の中で数える）
+    - max_rank: N着以内
+    - same_jockey: このレースで騎乗する騎手と同じ騎手の成績のみ
+    """
+    filters = filters or {}
+    venue = filters.get("venue")
+    if venue and venue != "all":
+        queryset = queryset.filter(venue_name=venue)
+    distance = filters.get("distance")
+    if distance:
+        if distance.isdigit():
+            queryset = queryset.filter(distance_m=int(distance))
+        else:
+            queryset = queryset.filter(distance__contains=distance)
+    if filters.get("weather"):
+        queryset = queryset.filter(weather__in=filters["weather"])
+    if filters.get("ground_condition"):
+        queryset = queryset.filter(ground_condition__in=filters["ground_condition"])
+    if filters.get("max_rank"):
+        queryset = queryset.filter(rank__lte=filters["max_rank"])
+    if filters.get("same_jockey"):
+        race_jockey = Entry.objects.filter(
+            race=race, horse_id=OuterRef("horse_id")
+        ).values("jockey_id")[:1]
+        queryset = queryset.filter(jockey_id=Subquery(race_jockey))
+    if filters.get("recent"):
+        # 自分より新しい成績の数が recent 未満なら直近N走に入る
+        newer_races = (
+            HorsePastRace.objects.filter(
+                horse_id=OuterRef("horse_id"), race_date__gt=OuterRef("race_date")
+            )
+            .order_by()
+            .values("horse_id")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        queryset = queryset.alias(
+            newer_race_count=Coalesce(
+                Subquery(newer_races, output_field=IntegerField()), 0
+            )
+        ).filter(newer_race_count__lt=filters["recent"])
+    return queryset
+
+
+def _past_race_aggregate(past_races, aggregate):
+    """
+    馬ごとの過去成績の集計値を返すサブクエリ。
+    JOINしてから集計すると、他のJOINやprefetchと組み合わせたときに
+    行が掛け算で増えて値がずれるため、馬1頭ずつ相関サブクエリで集計する
+    """
+    past_races = (
+        past_races.filter(horse_id=OuterRef("horse_id"))
+        .order_by()
+        .values("horse_id")
+        .annotate(value=aggregate)
+        .values("value")
+    )
+    return Coalesce(Subquery(past_races, output_field=IntegerField()), 0)
+
+
+def annotate_past_race_stats(queryset, past_races=None):
+    """
+    Entryのクエリセットに過去成績の集計値を付ける。
+    past_races を渡すと、その（絞り込んだ）過去成績で集計する
+    - win_place_count: 3着以内の回数
+    - sum_grade_score: race_grade_score の合計
+    """
+    if past_races is None:
+        past_races = HorsePastRace.objects.all()
+    return queryset.annotate(
+        win_place_count=_past_race_aggregate(
+            past_races.filter(rank__in=WIN_PLACE_RANKS), Count("pk")
+        ),
+        sum_grade_score=_past_race_aggregate(past_races, Sum("race_grade_score")),
+    )
+
+
+def annotate_horse_stats(queryset):
+    """
+    Entryのクエリセットに、HorseStats（書き込み時に集計済み）から
+    win_place_count / sum_grade_score を付ける。馬の主キーでJOINするだけで集計はしない
+    """
+    return queryset.annotate(
+        win_place_count=Coalesce(F("horse__stats__win_place_count"), 0),
+        sum_grade_score=Coalesce(F("horse__stats__sum_grade_score"), 0),
+    )
+
+
+def race_entries_queryset(race, ordering=DEFAULT_ENTRY_ORDERING, filters=None):
+    """
+    レース詳細（API・CSV・JSON出力）で使う出走馬のクエリセット。
+    騎手・馬は JOIN、過去成績は prefetch で取得する。
+    filters を渡すと、prefetchする過去成績と集計値の両方を絞り込む。
+    絞り込まないときの集計値は HorseStats から読む
+    """
+    past_races = filter_past_races(HorsePastRace.objects.all(), race, filters)
+    queryset = (
+        Entry.objects.filter(race=race)
+        .select_related("jockey", "horse", "horse__stats")
+        .prefetch_related(Prefetch("horse__past_races", queryset=past_races))
+    )
+    if filters:
+        queryset = annotate_past_race_stats(queryset, past_races)
+    else:
+        queryset = annotate_horse_stats(queryset)
+    return queryset.order_by(*ordering)
+
+
+def prefetch_race_entries(race, ordering=DEFAULT_ENTRY_ORDERING, filters=None):
+    """
+    並べ替えた出走馬を race.entries としてprefetchする
+    （RaceSerializer が entries を1頭ずつ取得し直さないようにする）
+    """
+    prefetch_related_objects(
+        [race],
+        Prefetch("entries", queryset=race_entries_queryset(race, ordering, filters)),
+    )
+    return race
@@ -0,0 +1,85 @@
+from .models import Race, RaceSnapshot
+from .race_cache import RACE_DETAIL_SCHEMA_VERSION, race_detail_etag
+from .race_payloads import race_detail_payload
+from .race_queries import DEFAULT_ENTRY_ORDERING
+from .renderers import ORJSONRenderer
+
+
+def build_race_detail_data(race, filters=None):
+    """
+    レース詳細レスポンスのデータ（dict）を作る。RaceSerializer と同じ内容を
+    values() の行から直接作る（api/race_payloads.py）。
+    過去成績の絞り込みと集計値はDBで行う（api/race_queries.py）。
+    CSV・JSON出力と同じ並び（DEFAULT_ENTRY_ORDERING: 複勝圏の回数 → グレードスコアの合計 → 馬番）
+    """
+    return race_detail_payload(race, ordering=DEFAULT_ENTRY_ORDERING, filters=filters)
+
+
+def fresh_snapshot(race):
+    """
+    race の描画済みスナップショット（今の data_version・形式のもの）。無ければNone。
+    race は select_related("snapshot") で取得しておくと追加のクエリが無い
+    """
+    try:
+        snapshot = race.snapshot
+    except RaceSnapshot.DoesNotExist:
+        return None
+    if (
+        snapshot.data_version != race.data_version
+        or snapshot.schema_version != RACE_DETAIL_SCHEMA_VERSION
+    ):
+        return None
+    return snapshot
+
+
+def save_race_snapshot(race_id):
+    """
+    レース詳細（絞り込みなし）を描画し、RaceSnapshot に保存する。
+    レースが無ければNoneを返す
+    """
+    race = Race.objects.filter(race_id=race_id).first()
+    if not race:
+        return None
+    body = ORJSONRenderer().render(build_race_detail_data(race))
+    snapshot, _ = RaceSnapshot.objects.update_or_create(
+        race=race,
+        defaults={
+            "data_version": race.data_version,
+            "schema_version": RACE_DETAIL_SCHEMA_VERSION,
+            "etag": race_detail_etag(race),
+            "body": body,
+        },
+    )
+    return snapshot
+
+
+def refresh_race_snapshots(race_ids):
+    """
+    race_ids のうち、スナップショットが古くなったレースだけ描画し直す。
+    （過去成績の更新で data_version が上がった他のレースなど。
+    スナップショットの無いレースは読まれていないものとして作らない）
+    戻り値は描画し直したレースの数
+    """
+    stale_ids = [
+        race_id
+        for race_id, data_version, race_version, schema_version in (
+            RaceSnapshot.objects.filter(race_id__in=set(race_ids)).values_list(
+                "race_id", "data_version", "race__data_version", "schema_version"
+            )
+        )
+        if data_version != race_version or schema_version != RACE_DETAIL_SCHEMA_VERSION
+    ]
+    for race_id in stale_ids:
+        save_race_snapshot(race_id)
+    return len(stale_ids)
+
+
+def snapshot_scraped_race(race_id, changed_race_ids=()):
+    """
+    スクレイピング完了時の処理。race_id のスナップショットが古ければ描画し、
+    同じ馬が出走して data_version が上がった他のレースのスナップショットも描画し直す
+    """
+    race = Race.objects.filter(race_id=race_id).select_related("snapshot").first()
+    if race and not fresh_snapshot(race):
+        save_race_snapshot(race_id)
+    refresh_race_snapshots(set(changed_race_ids) - {race_id})
@@ -0,0 +1,25 @@
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Entry, Race
+
+
+def bump_data_version(race_ids=(), horse_ids=()):
+    """
+    レースのデータが変わったときに data_version を上げる。
+    過去成績は馬ごとに複数のレースで共有されるため、horse_ids を渡すと
+    その馬が出走する全レースを対象にする。
+    戻り値は対象になったrace_idの集合
+    """
+    target_ids = set(race_ids)
+    if horse_ids:
+        target_ids.update(
+            Entry.objects.filter(horse_id__in=set(horse_ids)).values_list(
+                "race_id", flat=True
+            )
+        )
+    if target_ids:
+        Race.objects.filter(race_id__in=target_ids).update(
+            data_version=F("data_version") + 1, updated_at=timezone.now()
+        )
+    return target_ids
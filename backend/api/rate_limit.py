@@ -0,0 +1,65 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレートリミッタ。
+    rate: 1秒あたりに補充されるトークン数（=リクエスト数）
+    capacity: 一度に貯められるトークン数（バースト数）
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate は正の値を指定してください")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得できるまで待つ"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    ホストごとにリクエスト数（rate/秒）と同時接続数（max_concurrency）を制限する
+    """
+
+    def __init__(self, rate, max_concurrency):
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self._buckets = {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _get_host_limits(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate)
+                self._semaphores[host] = threading.BoundedSemaphore(
+                    self.max_concurrency
+                )
+            return self._buckets[host], self._semaphores[host]
+
+    @contextmanager
+    def limit(self, url):
+        bucket, semaphore = self._get_host_limits(urlsplit(url).netloc)
+        with semaphore:
+            bucket.acquire()
+            yield
@@ -0,0 +1,52 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .race_payloads import to_columnar
+
+try:
+    import orjson
+except ImportError:  # orjson が無ければ標準の JSONRenderer と同じ処理にする
+    orjson = None
+
+_encoder = JSONEncoder()
+
+# JSONRenderer と同じく、JavaScriptで文字列に使えない U+2028/U+2029 はエスケープする
+_LINE_SEPARATORS = (("\u2028".encode(), b"\\u2028"), ("\u2029".encode(), b"\\u2029"))
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    orjson で JSON にする JSONRenderer（出力は JSONRenderer と同じ。インデント指定時は常に2）。
+    日時・Decimal など orjson がそのまま扱わない値は DRF の JSONEncoder で変換する
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+        ret = orjson.dumps(data, default=_encoder.default, option=option)
+        for raw, escaped in _LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class ColumnarJSONRenderer(ORJSONRenderer):
+    """
+    レース詳細を列形式（api.race_payloads.to_columnar）で返す JSONRenderer。
+    Accept: application/vnd.keiba-app.columnar+json または ?format=columnar で選ぶ。
+    レース詳細以外のデータ（エラーなど）はそのまま返す
+    """
+
+    media_type = "application/vnd.keiba-app.columnar+json"
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and "entries" in data:
+            data = to_columnar(data)
+        return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,131 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Race, ScrapeJob, ScrapeJobLock
+
+
+def enqueue_scrape_job(race_id, entry_only=False, batch=""):
+    """
+    race_idのスクレイピングジョブを登録する。
+    同じrace_idの待機中・実行中ジョブがあれば、新規作成せずにそれを返す。
+    batch: 一括取得のバッチ名（空なら通常のワーカーが処理する）
+    戻り値は (job, created)
+    """
+    with transaction.atomic():
+        # 待機中のジョブが無いときは select_for_update で守る行が無いため、
+        # race_idごとのロック行を先に取って、同じレースの登録を順番に行う
+        ScrapeJobLock.objects.select_for_update().get_or_create(race_id=race_id)
+        job = (
+            ScrapeJob.objects.select_for_update()
+            .filter(race_id=race_id, status__in=ScrapeJob.ACTIVE_STATUSES)
+            .order_by("created_at")
+            .first()
+        )
+        if job:
+            # 一括取得で待機中のレースが画面から要求されたら、通常のワーカーに回す
+            if not batch and job.batch and job.status == ScrapeJob.STATUS_QUEUED:
+                job.batch = ""
+                job.save(update_fields=["batch"])
+            return job, False
+        job = ScrapeJob.objects.create(
+            race_id=race_id, entry_only=entry_only, batch=batch
+        )
+        return job, True
+
+
+def claim_next_job(batch=""):
+    """
+    batch の待機中のジョブを1件取り出して実行中にする。無ければNoneを返す。
+    """
+    with transaction.atomic():
+        queryset = ScrapeJob.objects.filter(
+            batch=batch, status=ScrapeJob.STATUS_QUEUED
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        else:
+            queryset = queryset.select_for_update()
+        job = queryset.order_by("created_at").first()
+        if not job:
+            return None
+        job.status = ScrapeJob.STATUS_RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+        return job
+
+
+def requeue_stale_jobs(batch="", older_than=None):
+    """
+    ワーカーが落ちて実行中のまま残った batch のジョブを待機中に戻す。
+    older_than（秒）を指定すると、開始からその時間が過ぎたジョブだけを戻す
+    （他のプロセスが実行中のジョブを取り上げないため）
+    """
+    jobs = ScrapeJob.objects.filter(batch=batch, status=ScrapeJob.STATUS_RUNNING)
+    if older_than is not None:
+        jobs = jobs.filter(
+            started_at__lt=timezone.now() - timedelta(seconds=older_than)
+        )
+    return jobs.update(status=ScrapeJob.STATUS_QUEUED, started_at=None)
+
+
+class JobProgress:
+    """
+    NetkeibaRaceAnalyzerから呼ばれ、馬ごとの進捗をジョブに書き込む
+    """
+
+    def __init__(self, job):
+        self.job = job
+
+    def set_horses(self, horses):
+        """horses: (horse_id, horse_name) のリスト"""
+        self.job.progress = [
+            {"horse_id": horse_id, "horse_name": horse_name, "status": "pending"}
+            for horse_id, horse_name in horses
+        ]
+        self.job.total_horses = len(horses)
+        self.job.completed_horses = 0
+        self.job.save(update_fields=["progress", "total_horses", "completed_horses"])
+
+    def horse_done(self, horse_id, succeeded=True):
+        for item in self.job.progress:
+            if item["horse_id"] == horse_id and item["status"] == "pending":
+                item["status"] = "done" if succeeded else "failed"
+                break
+        self.job.completed_horses = sum(
+            1 for item in self.job.progress if item["status"] != "pending"
+        )
+        self.job.save(update_fields=["progress", "completed_horses"])
+
+
+def run_job(job, fetcher=None, export_csv=True):
+    """
+    ジョブを実行する（scrape_race + export_race_csv）。
+    fetcher: 複数のジョブで共有するFetcher（省略時はジョブごとに作る）
+    export_csv: Falseなら CSV・レース詳細のスナップショットを作らない（一括取得用）
+    """
+    # selenium等の読み込みをWebリクエスト側に持ち込まないよう、ここでimportする
+    from .management.commands.scrape_race import main as scrape_race_main
+
+    try:
+        scrape_race_main(
+            job.race_id,
+            job.entry_only,
+            progress=JobProgress(job),
+            fetcher=fetcher,
+            snapshot=export_csv,
+        )
+        if not Race.objects.filter(race_id=job.race_id).exists():
+            raise RuntimeError("データ取得後もレース情報が存在しません")
+        if export_csv:
+            call_command("export_race_csv", job.race_id)
+    except Exception as e:
+        job.status = ScrapeJob.STATUS_FAILED
+        job.error_message = str(e)
+    else:
+        job.status = ScrapeJob.STATUS_COMPLETED
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error_message", "finished_at"])
+    return job
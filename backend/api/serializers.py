@@ -1,6 +1,14 @@
 from rest_framework import serializers
-from .models import Race, Entry, Horse, Jockey, HorsePastRace, AIPrediction
-from django.db.models import Sum
+from .models import (
+    Race,
+    Entry,
+    Horse,
+    HorseStats,
+    Jockey,
+    HorsePastRace,
+    AIPrediction,
+    ScrapeJob,
+)
 
 class HorsePastRaceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,6 +38,13 @@ class HorsePastRaceSerializer(serializers.ModelSerializer):
             "last_3f",
             "last_3f_rank",
             "body_weight",
+            "time_seconds",
+            "surface",
+            "distance_m",
+            "last_3f_seconds",
+            "body_weight_kg",
+            "body_weight_diff",
+            "passing_positions",
         ]
 
 
@@ -43,6 +58,20 @@ class HorseSerializer(serializers.ModelSerializer):
         fields = ["horse_id", "horse_name", "past_races"]
 
 
+class HorseStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HorseStats
+        fields = [
+            "race_count",
+            "win_count",
+            "win_place_count",
+            "sum_grade_score",
+            "avg_last_3f_rank",
+            "last_race_date",
+            "splits",
+        ]
+
+
 class JockeySerializer(serializers.ModelSerializer):
     class Meta:
         model = Jockey
@@ -54,6 +83,8 @@ class EntrySerializer(serializers.ModelSerializer):
     jockey = JockeySerializer()
     win_place_count = serializers.IntegerField(read_only=True, default=0)
     horse_past_race_grade_score_total = serializers.SerializerMethodField()
+    horse_stats = serializers.SerializerMethodField()
+
     class Meta:
         model = Entry
         fields = [
@@ -66,14 +97,42 @@ class EntrySerializer(serializers.ModelSerializer):
             "jockey",
             "win_place_count",
             "horse_past_race_grade_score_total",
+            "horse_stats",
         ]
 
+    def get_horse_stats(self, obj: Entry):
+        """
+        馬の全成績の集計（HorseStats, 絞り込み条件には関係しない）。
+        days_since_last_run はこのレースの日から数えた前走からの日数
+        （このレースより後の成績がある＝過去のレースを見ているときはNone）
+        """
+        stats = getattr(obj.horse, "stats", None)
+        if stats is None:
+            return None
+        data = HorseStatsSerializer(stats).data
+        race_date = obj.race.race_date
+        last_race_date = stats.last_race_date
+        data["days_since_last_run"] = (
+            (race_date - last_race_date).days
+            if race_date and last_race_date and last_race_date <= race_date
+            else None
+        )
+        return data
+
     def get_horse_past_race_grade_score_total(self, obj: Entry) -> int:
         """
         この出走馬 (Entry) に関連する馬 (Horse) の過去のレースの
-        race_grade_score の合計を計算して返します。
+        race_grade_score の合計を返します。
+        クエリで集計済み（sum_grade_score）ならそれを使い、無ければ
+        prefetch済みの past_races から計算します（1件ごとに集計クエリを発行しない）。
         """
-        total_score = obj.horse.past_races.aggregate(total=Sum('race_grade_score'))['total']
+        if hasattr(obj, "sum_grade_score"):
+            total_score = obj.sum_grade_score
+        else:
+            total_score = sum(
+                past_race.race_grade_score or 0
+                for past_race in obj.horse.past_races.all()
+            )
         return total_score if total_score is not None else 0
 
 
@@ -159,3 +218,97 @@ class AIPredictionWriteSerializer(serializers.ModelSerializer):
             # "predicted_third",
             "notes",
         ]
+
+
+class ScrapeJobSerializer(serializers.ModelSerializer):
+    """スクレイピングジョブの進捗表示用のシリアライザ"""
+
+    job_id = serializers.IntegerField(source="id", read_only=True)
+
+    class Meta:
+        model = ScrapeJob
+        fields = [
+            "job_id",
+            "race_id",
+            "status",
+            "total_horses",
+            "completed_horses",
+            "progress",
+            "error_message",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+
+class PastRaceFilterSerializer(serializers.Serializer):
+    """
+    レース詳細APIの過去成績の絞り込み条件（クエリパラメータ）。
+    weather / ground_condition は ?weather=晴&weather=曇 と ?weather=晴,曇 のどちらでも指定できる
+    """
+
+    venue = serializers.CharField(required=False, allow_blank=True)
+    distance = serializers.CharField(required=False, allow_blank=True)
+    weather = serializers.ListField(
+        child=serializers.CharField(allow_blank=True), required=False
+    )
+    ground_condition = serializers.ListField(
+        child=serializers.CharField(allow_blank=True), required=False
+    )
+    recent = serializers.IntegerField(required=False, min_value=1)
+    max_rank = serializers.IntegerField(required=False, min_value=1)
+    same_jockey = serializers.BooleanField(required=False, default=False)
+
+    def _split_values(self, values):
+        return sorted(
+            {value.strip() for item in values for value in item.split(",") if value.strip()}
+        )
+
+    def validate_weather(self, value):
+        return self._split_values(value)
+
+    def validate_ground_condition(self, value):
+        return self._split_values(value)
+
+    def validate_venue(self, value):
+        return "" if value == "all" else value.strip()
+
+    def validate_distance(self, value):
+        return value.strip()
+
+    def to_representation(self, instance):
+        # 絞り込まない条件（空・既定値）を除いたdict
+        return {key: value for key, value in instance.items() if value}
+
+
+class RaceCsvExportSerializer(serializers.Serializer):
+    """
+    複数レースのCSV（RacesCsvView）の対象の条件。
+    race_id は複数指定できる（?race_id=...&race_id=... または カンマ区切り）
+    """
+
+    race_id = serializers.ListField(
+        child=serializers.CharField(allow_blank=True), required=False
+    )
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    venue = serializers.CharField(required=False, allow_blank=True)
+    gzip = serializers.BooleanField(required=False, default=False)
+
+    def validate_race_id(self, value):
+        return sorted(
+            {
+                race_id.strip()
+                for item in value
+                for race_id in item.split(",")
+                if race_id.strip()
+            }
+        )
+
+    def validate(self, attrs):
+        # 条件なしで全レースを出力しないようにする
+        if not any(attrs.get(key) for key in ("race_id", "start", "end", "venue")):
+            raise serializers.ValidationError(
+                "race_id・start・end・venue のいずれかを指定してください。"
+            )
+        return attrs
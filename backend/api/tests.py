@@ -1,3 +1,1700 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .browser_pool import BrowserPool, BrowserPoolTimeout, BrowserStartError
+from .call_command_utils import export_race_csv
+from .csv_exports import MULTI_RACE_HEADER, filter_races, iter_long_format_rows
+from .features import FEATURE_COLUMNS, build_features
+from .fetchers import BaseFetcher, FetchError, HttpFetcher, HybridFetcher, decode_html
+from .fixture_server import (
+    FIXTURE_CORPUS_DIR,
+    FixtureServer,
+    corpus_race_ids,
+    horse_page_path,
+    load_expected_counts,
+    save_expected_counts,
+)
+from .horse_stats import rebuild_horse_stats
+from .html_parsing import parse_table, slice_table, table_rows
+from .middleware import brotli
+from .management.commands.check_query_plans import find_full_scans
+from .management.commands.scrape_race import (
+    PAST_RACE_COLUMNS,
+    NetkeibaRaceAnalyzer,
+    write_past_races,
+)
+from .models import (
+    Entry,
+    Horse,
+    HorsePastRace,
+    HorseStats,
+    Jockey,
+    OddsSnapshot,
+    Race,
+    RaceSnapshot,
+    ScrapeJob,
+    ScrapeJobLock,
+)
+from .odds import ODDS_API_URL, parse_win_odds, update_race_odds
+from .page_cache import PageCache
+from .parquet_exports import export_parquet, read_dataset
+from .race_parsers import (
+    parse_body_weight,
+    parse_distance,
+    parse_passing,
+    parse_race_time,
+)
+from .race_payloads import PAST_RACE_FIELDS, race_detail_payload
+from .race_queries import prefetch_race_entries, race_entries_queryset
+from .race_snapshots import refresh_race_snapshots, snapshot_scraped_race
+from .race_versions import bump_data_version
+from .rate_limit import TokenBucket
+from .renderers import ColumnarJSONRenderer, ORJSONRenderer
+from .scrape_jobs import JobProgress, claim_next_job, enqueue_scrape_job, run_job
+from .serializers import RaceSerializer
+
+
+class ConcurrentEnqueueTests(TransactionTestCase):
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_concurrent_enqueue_creates_one_job(self):
+        # 待機中のジョブが無いレースに、同時に2件の要求が届いた場合
+        barrier = threading.Barrier(2)
+        results = []
+
+        def enqueue():
+            barrier.wait()
+            try:
+                results.append(enqueue_scrape_job("202406030811"))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=enqueue) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(ScrapeJob.objects.filter(race_id="202406030811").count(), 1)
+        self.assertEqual(sorted(created for _, created in results), [False, True])
+
+
+class ScrapeJobTests(TestCase):
+    def test_enqueue_coalesces_active_jobs(self):
+        job, created = enqueue_scrape_job("202406030811")
+        same_job, same_created = enqueue_scrape_job("202406030811")
+
+        self.assertTrue(created)
+        self.assertFalse(same_created)
+        self.assertEqual(job.pk, same_job.pk)
+
+        # 実行中のジョブにも合流する
+        claim_next_job()
+        running_job, _ = enqueue_scrape_job("202406030811")
+        self.assertEqual(running_job.pk, job.pk)
+
+        # 失敗済みのジョブには合流せず、新しいジョブを作る
+        ScrapeJob.objects.filter(pk=job.pk).update(status=ScrapeJob.STATUS_FAILED)
+        new_job, new_created = enqueue_scrape_job("202406030811")
+        self.assertTrue(new_created)
+        self.assertNotEqual(new_job.pk, job.pk)
+
+    def test_enqueue_without_existing_job_creates_one_row(self):
+        enqueue_scrape_job("202406030811")
+        enqueue_scrape_job("202406030811")
+        self.assertEqual(ScrapeJob.objects.filter(race_id="202406030811").count(), 1)
+        self.assertTrue(ScrapeJobLock.objects.filter(race_id="202406030811").exists())
+
+    def test_job_progress_per_horse(self):
+        job, _ = enqueue_scrape_job("202406030811")
+        progress = JobProgress(job)
+        progress.set_horses([("2021105001", "馬A"), ("2021105002", "馬B")])
+        progress.horse_done("2021105001")
+
+        job.refresh_from_db()
+        self.assertEqual(job.total_horses, 2)
+        self.assertEqual(job.completed_horses, 1)
+        self.assertEqual(
+            [item["status"] for item in job.progress], ["done", "pending"]
+        )
+
+    def test_failed_scrape_marks_job_failed(self):
+        # 古いレース情報があっても、出馬表を取得できなければ失敗にする
+        Race.objects.create(race_id="202406030811", race_name="皐月賞")
+        job, _ = enqueue_scrape_job("202406030811")
+        run_job(job, fetcher=StubFetcher({}), export_csv=False)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScrapeJob.STATUS_FAILED)
+        self.assertIn("shutuba.html?race_id=202406030811", job.error_message)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_race_detail_returns_202_for_missing_race(self):
+        url = reverse("race-detail", args=["202406030811"])
+        response = self.client.get(url)
+        second = self.client.get(url)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["job_id"], second.json()["job_id"])
+        self.assertEqual(ScrapeJob.objects.count(), 1)
+
+        status_response = self.client.get(response.json()["status_url"])
+        self.assertEqual(status_response.status_code, 200)
+        self.assertEqual(status_response.json()["status"], ScrapeJob.STATUS_QUEUED)
+
+    def test_status_for_existing_race_without_job(self):
+        Race.objects.create(race_id="202406030811", race_name="皐月賞")
+        response = self.client.get(reverse("race-status", args=["202406030811"]))
+        self.assertEqual(response.json()["status"], ScrapeJob.STATUS_COMPLETED)
+
+        response = self.client.get(reverse("race-status", args=["209999999999"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class StubFetcher(BaseFetcher):
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def fetch(self, url, wait_css=None, marker=None):
+        self.requested.append(url)
+        html = self.pages.get(url)
+        if html is None or (marker and marker not in html):
+            raise FetchError(url)
+        return html
+
+
+class FetcherTests(TestCase):
+    def test_decode_html_detects_encoding(self):
+        euc = '<meta charset="EUC-JP"><h1>皐月賞</h1>'.encode("euc_jp")
+        self.assertIn("皐月賞", decode_html(euc))
+        self.assertIn("皐月賞", decode_html("皐月賞".encode("euc_jp")))
+        self.assertIn("皐月賞", decode_html("皐月賞".encode("utf-8")))
+        self.assertEqual(
+            decode_html("馬".encode("euc_jp"), "text/html; charset=EUC-JP"), "馬"
+        )
+
+    def test_hybrid_falls_back_to_browser_only_when_marker_missing(self):
+        http = StubFetcher({"a": "<div class='HorseList'></div>", "b": "<div></div>"})
+        browser = StubFetcher({"b": "<div class='HorseList'></div>"})
+        fetcher = HybridFetcher(http=http, browser=browser)
+
+        fetcher.fetch("a", marker="HorseList")
+        fetcher.fetch("b", marker="HorseList")
+
+        self.assertEqual(http.requested, ["a", "b"])
+        self.assertEqual(browser.requested, ["b"])
+
+
+class SlowStubFetcher(StubFetcher):
+    def fetch(self, url, wait_css=None, marker=None):
+        # 後ろの馬ほど早く返るようにして、順番が保たれることを確認する
+        time.sleep(0.05 / (len(self.requested) + 1))
+        return super().fetch(url, wait_css=wait_css, marker=marker)
+
+
+class ConcurrentFetchTests(TestCase):
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        # 1つ目はすぐ取得でき、残り4つは 1/20 秒ずつ待つ
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_horse_pages_are_returned_in_entry_order(self):
+        horses = [
+            SimpleNamespace(horse_id=f"20211050{i:02d}", horse_name=f"馬{i}")
+            for i in range(6)
+        ]
+        pages = {
+            f"https://db.netkeiba.com/horse/{horse.horse_id}/": (
+                f"<table class='db_h_race_results'>{horse.horse_name}</table>"
+            )
+            for horse in horses
+        }
+        analyzer = NetkeibaRaceAnalyzer(
+            fetcher=SlowStubFetcher(pages), max_concurrency=3
+        )
+
+        results = list(analyzer.fetch_horse_pages(horses))
+
+        self.assertEqual(
+            [horse.horse_name for horse, _ in results],
+            [horse.horse_name for horse in horses],
+        )
+        for horse, html in results:
+            self.assertIn(horse.horse_name, html)
+
+
+def build_horse_page(past_race_rows):
+    """parse_past_racesで読める馬の成績ページ（db_h_race_results）を作る"""
+    rows = []
+    for _, past_race in past_race_rows:
+        cells = [""] * 25
+        cells[0] = past_race.race_date.strftime("%Y/%m/%d")
+        cells[1] = f"1{past_race.venue_name}2"
+        cells[4] = f"<a href='/race/{past_race.past_race_id}/'>{past_race.race_name}</a>"
+        cells[11] = str(past_race.rank)
+        cells[12] = (
+            f"<a href='/jockey/result/recent/{past_race.jockey_id}/'>"
+            f"{past_race.jockey_name}</a>"
+        )
+        cells[13] = str(past_race.weight_carried)
+        cells[14] = past_race.distance or ""
+        cells[18] = past_race.time or ""
+        cells[21] = past_race.passing or ""
+        cells[23] = past_race.last_3f or ""
+        cells[24] = past_race.body_weight or ""
+        rows.append("<tr>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+    return f"<table class='db_h_race_results'><tbody>{''.join(rows)}</tbody></table>"
+
+
+def build_race_rows(race_id, horse_count, past_race_count):
+    """save_raceに渡す出走馬・過去成績のテストデータを作る"""
+    entries = []
+    past_race_rows = []
+    for i in range(horse_count):
+        horse_id = f"2021{i:06d}"
+        entries.append(
+            (
+                Horse(horse_id=horse_id, horse_name=f"馬{i}"),
+                Jockey(jockey_id=f"0{i:04d}", jockey_name=f"騎手{i}"),
+                Entry(
+                    race_id=race_id,
+                    horse_id=horse_id,
+                    jockey_id=f"0{i:04d}",
+                    waku=i // 2 + 1,
+                    umaban=i + 1,
+                    weight_carried=57.0,
+                    odds=float(i + 2),
+                    popularity=i + 1,
+                ),
+            )
+        )
+        for j in range(past_race_count):
+            past_race_rows.append(
+                (
+                    Jockey(jockey_id=f"1{j:04d}", jockey_name=f"過去騎手{j}"),
+                    HorsePastRace(
+                        horse_id=horse_id,
+                        past_race_id=f"2024{j:08d}",
+                        race_date=datetime.date(2024, 1, 1) + datetime.timedelta(days=j),
+                        venue_name="東京",
+                        race_name="(GI)テスト",
+                        race_grade_score=100,
+                        rank=(i + j) % 18 + 1,
+                        jockey_id=f"1{j:04d}",
+                        jockey_name=f"過去騎手{j}",
+                        weight_carried=57.0,
+                        distance="芝1600",
+                        last_3f_rank=j % 5 + 1,
+                    ),
+                )
+            )
+    return entries, past_race_rows
+
+
+class BulkWriteTests(TestCase):
+    race_defaults = {
+        "race_name": "テストレース",
+        "race_date": datetime.date(2024, 6, 1),
+        "venue": "東京",
+        "course_details": "芝1600m",
+        "ground_condition": "良",
+        "head_count": 18,
+        "race_number": "11",
+    }
+
+    def save_race(self, horse_count, past_race_count):
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        entries, past_race_rows = build_race_rows(
+            "202405020811", horse_count, past_race_count
+        )
+        with CaptureQueriesContext(connection) as queries:
+            analyzer.save_race(
+                "202405020811", self.race_defaults, entries, past_race_rows
+            )
+        inserts = sum(1 for q in queries if q["sql"].startswith("INSERT"))
+        return {"insert": inserts, "other": len(queries) - inserts}
+
+    def test_query_count_does_not_grow_with_field_size(self):
+        # 行ごとのupdate_or_createでは 18頭 x 10走 で700クエリ前後かかっていた
+        small = self.save_race(horse_count=2, past_race_count=2)
+        Race.objects.all().delete()
+        Horse.objects.all().delete()
+        Jockey.objects.all().delete()
+        full = self.save_race(horse_count=18, past_race_count=10)
+
+        # SQLiteは1文あたりの変数の上限でINSERTが分割されるため、それ以外の件数を比較する
+        self.assertEqual(small["other"], full["other"])
+        self.assertLessEqual(full["other"] + full["insert"], 25)
+        self.assertEqual(Entry.objects.count(), 18)
+        self.assertEqual(HorsePastRace.objects.count(), 180)
+
+    def test_rescrape_updates_only_changed_rows(self):
+        self.save_race(horse_count=18, past_race_count=10)
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        entries, past_race_rows = build_race_rows("202405020811", 18, 10)
+        entries[0][2].odds = 99.9
+        # 取得できなかったオッズで既存値を上書きしない
+        entries[1][2].odds = None
+
+        with CaptureQueriesContext(connection) as queries:
+            analyzer.save_race(
+                "202405020811", self.race_defaults, entries, past_race_rows
+            )
+
+        writes = [
+            q["sql"] for q in queries if q["sql"].startswith(("INSERT", "UPDATE"))
+        ]
+        # Raceの更新とEntry 1件分のbulk_updateのみ
+        self.assertEqual(len(writes), 2)
+        odds = dict(Entry.objects.values_list("umaban", "odds"))
+        self.assertEqual(odds[1], 99.9)
+        self.assertEqual(odds[2], 3.0)
+
+
+class RaceDetailQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def create_race(self, race_id, horse_count):
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        entries, past_race_rows = build_race_rows(race_id, horse_count, 5)
+        analyzer.save_race(race_id, BulkWriteTests.race_defaults, entries, past_race_rows)
+
+    def test_race_detail_query_count_is_constant(self):
+        self.create_race("202405020801", 2)
+        self.create_race("202405020811", 18)
+
+        # Race 1件 + Entry 1件 + past_races のprefetch 1件
+        for race_id in ("202405020801", "202405020811"):
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse("race-detail", args=[race_id]))
+            self.assertEqual(response.status_code, 200)
+
+        entries = response.json()["entries"]
+        self.assertEqual(len(entries), 18)
+        self.assertEqual(entries[0]["horse_past_race_grade_score_total"], 500)
+
+    def test_entry_stats_match_past_races(self):
+        self.create_race("202405020811", 18)
+        race = Race.objects.get(race_id="202405020811")
+
+        entries = list(race_entries_queryset(race))
+        for entry in entries:
+            past_races = list(entry.horse.past_races.all())
+            self.assertEqual(
+                entry.win_place_count,
+                sum(1 for past_race in past_races if past_race.rank in (1, 2, 3)),
+            )
+            self.assertEqual(
+                entry.sum_grade_score,
+                sum(past_race.race_grade_score for past_race in past_races),
+            )
+        win_place_counts = [entry.win_place_count for entry in entries]
+        self.assertEqual(win_place_counts, sorted(win_place_counts, reverse=True))
+
+        # 過去成績が無い馬は0になる
+        horse_id = entries[0].horse_id
+        HorsePastRace.objects.filter(horse_id=horse_id).delete()
+        entry = race_entries_queryset(race).get(horse_id=horse_id)
+        self.assertEqual((entry.win_place_count, entry.sum_grade_score), (0, 0))
+        # 集計の行が無い馬も0になる
+        HorseStats.objects.filter(horse_id=horse_id).delete()
+        entry = race_entries_queryset(race).get(horse_id=horse_id)
+        self.assertEqual((entry.win_place_count, entry.sum_grade_score), (0, 0))
+
+
+class DataVersionTests(TestCase):
+    def save_race(self, race_id, entries, past_race_rows):
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        return analyzer.save_race(
+            race_id, BulkWriteTests.race_defaults, entries, past_race_rows
+        )
+
+    def version(self, race_id):
+        return Race.objects.get(race_id=race_id).data_version
+
+    def test_version_changes_only_when_data_changes(self):
+        self.save_race("202405020811", *build_race_rows("202405020811", 3, 3))
+        self.save_race("202405020812", *build_race_rows("202405020812", 1, 3))
+        first = self.version("202405020811")
+
+        # 同じデータでは上がらない
+        self.save_race("202405020811", *build_race_rows("202405020811", 3, 3))
+        self.assertEqual(self.version("202405020811"), first)
+
+        # オッズが変われば上がる
+        entries, past_race_rows = build_race_rows("202405020811", 3, 3)
+        entries[0][2].odds = 1.1
+        self.save_race("202405020811", entries, past_race_rows)
+        self.assertEqual(self.version("202405020811"), first + 1)
+
+        # 別レースの取得で共通の馬の過去成績が変われば、こちらも上がる
+        other = self.version("202405020812")
+        entries, past_race_rows = build_race_rows("202405020812", 1, 4)
+        bumped = self.save_race("202405020812", entries, past_race_rows)
+        self.assertEqual(bumped, {"202405020811", "202405020812"})
+        self.assertEqual(self.version("202405020811"), first + 2)
+        self.assertEqual(self.version("202405020812"), other + 1)
+
+
+class CsvExportTests(TestCase):
+    def setUp(self):
+        self.export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.export_dir.cleanup)
+        override = override_settings(CSV_EXPORT_DIR=self.export_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        entries, past_race_rows = build_race_rows("202405020811", 2, 2)
+        analyzer.save_race(
+            "202405020811", BulkWriteTests.race_defaults, entries, past_race_rows
+        )
+
+    def test_csv_is_regenerated_only_after_data_changes(self):
+        url = reverse("race-csv", args=["202405020811"])
+        with mock.patch(
+            "api.views.export_race_csv", wraps=export_race_csv
+        ) as export:
+            self.client.get(url)
+            response = self.client.get(url)
+            self.assertEqual(export.call_count, 1)
+            self.assertIn("馬0", b"".join(response.streaming_content).decode("utf-8"))
+
+            # データが変わっても作成済みのCSVを返し、作り直しは別スレッドに任せる
+            Race.objects.filter(race_id="202405020811").update(data_version=99)
+            with mock.patch("api.views.export_race_csv_in_background") as background:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(export.call_count, 1)
+            background.assert_called_once_with("202405020811")
+
+        # 出力中に data_version が変わっても、実際に書いたファイルのパスを返す
+        Race.objects.filter(race_id="202405020811").update(data_version=100)
+        path = export_race_csv("202405020811")
+        self.assertEqual(os.path.basename(path), "202405020811-v100.csv")
+        self.assertEqual(os.listdir(self.export_dir.name), ["202405020811-v100.csv"])
+
+    def test_file_replaced_before_open_is_regenerated(self):
+        url = reverse("race-csv", args=["202405020811"])
+        self.client.get(url)
+        (filename,) = os.listdir(self.export_dir.name)
+        Race.objects.filter(race_id="202405020811").update(data_version=99)
+        # 古いファイルを見つけた後・開く前に、別の出力で消された
+        stale_path = os.path.join(self.export_dir.name, filename)
+        os.remove(stale_path)
+        with mock.patch(
+            "api.views.latest_csv_export_path", return_value=stale_path
+        ), mock.patch("api.views.export_race_csv_in_background"):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(os.listdir(self.export_dir.name), ["202405020811-v99.csv"])
+
+
+class RacesCsvTests(TestCase):
+    def setUp(self):
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        # 同じ馬が2レースに出走する（過去成績が出走ごとに繰り返されること）
+        for race_id, race_date in (
+            ("202405020811", datetime.date(2024, 6, 1)),
+            ("202405020911", datetime.date(2024, 6, 8)),
+        ):
+            entries, past_race_rows = build_race_rows(race_id, 2, 3)
+            analyzer.save_race(
+                race_id,
+                dict(BulkWriteTests.race_defaults, race_date=race_date),
+                entries,
+                past_race_rows,
+            )
+
+    def test_rows_are_streamed_per_batch(self):
+        races = filter_races(start=datetime.date(2024, 6, 1))
+        # レースIDの取得 + 1バッチごとに出走馬・過去成績の2件
+        with self.assertNumQueries(5):
+            rows = list(iter_long_format_rows(races, races_per_batch=1))
+        # 1頭につき 出走情報1行 + 過去成績3行 + 区切り1行
+        self.assertEqual(len(rows), 2 * 2 * 5)
+        self.assertTrue(all(len(row) == len(MULTI_RACE_HEADER) for row in rows))
+        self.assertEqual(rows[0][:3], ["202405020811", "出走情報", 1])
+        past_dates = [row[8] for row in rows[1:4]]
+        self.assertEqual(past_dates, sorted(past_dates, reverse=True))
+        self.assertEqual([row[1] for row in rows[4:6]], ["---", "出走情報"])
+        self.assertEqual(rows[10][:2], ["202405020911", "出走情報"])
+
+    def test_gzip_download(self):
+        response = self.client.get(
+            reverse("races-csv"), {"race_id": "202405020911", "gzip": "true"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("races.csv.gz", response["Content-Disposition"])
+        text = gzip.decompress(b"".join(response.streaming_content)).decode("utf-8")
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0], MULTI_RACE_HEADER)
+        self.assertEqual(len(rows), 1 + 2 * 5)
+        self.assertEqual({row[0] for row in rows[1:]}, {"202405020911"})
+
+        # 条件が無ければ出力しない
+        self.assertEqual(self.client.get(reverse("races-csv")).status_code, 400)
+
+    def test_command_writes_csv(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "races.csv")
+            call_command(
+                "export_races_csv", "--venue", "東京", "--output", output, stdout=io.StringIO()
+            )
+            with open(output, encoding="utf-8", newline="") as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(len(rows), 1 + 2 * 2 * 5)
+
+
+class RaceDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        entries, past_race_rows = build_race_rows("202405020811", 3, 3)
+        analyzer.save_race(
+            "202405020811", BulkWriteTests.race_defaults, entries, past_race_rows
+        )
+        self.url = reverse("race-detail", args=["202405020811"])
+
+    def test_cached_response_and_not_modified(self):
+        first = self.client.get(self.url)
+        etag = first["ETag"]
+
+        # 2回目はキャッシュから返すため、Raceの取得のみ
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(second.json(), first.json())
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], etag)
+
+    def test_scrape_update_invalidates_cache(self):
+        first = self.client.get(self.url)
+
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        entries, past_race_rows = build_race_rows("202405020811", 3, 3)
+        entries[0][2].odds = 1.1
+        analyzer.save_race(
+            "202405020811", BulkWriteTests.race_defaults, entries, past_race_rows
+        )
+
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        odds = {entry["umaban"]: entry["odds"] for entry in second.json()["entries"]}
+        self.assertEqual(odds[1], 1.1)
+
+
+class RaceSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        entries, past_race_rows = build_race_rows("202405020811", 3, 3)
+        analyzer.save_race(
+            "202405020811", BulkWriteTests.race_defaults, entries, past_race_rows
+        )
+        self.url = reverse("race-detail", args=["202405020811"])
+
+    def test_snapshot_is_served_without_building(self):
+        built = self.client.get(self.url)
+        cache.clear()
+        snapshot_scraped_race("202405020811")
+
+        # Race とスナップショットの取得1件のみ（出走馬・過去成績は読まない）
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json(), built.json())
+        self.assertEqual(response["ETag"], built["ETag"])
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=built["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+        # 絞り込みがあればスナップショットは使わない
+        filtered = self.client.get(self.url, {"recent": 1})
+        self.assertEqual(len(filtered.json()["entries"][0]["horse"]["past_races"]), 1)
+
+    def test_snapshot_uses_shared_entry_ordering(self):
+        # 複勝圏の回数が同じなら、グレードスコアの合計が多い馬を先にする
+        HorseStats.objects.update(win_place_count=1, sum_grade_score=0)
+        HorseStats.objects.filter(horse__entries__umaban=3).update(sum_grade_score=50)
+        race = Race.objects.get(race_id="202405020811")
+        expected = list(race_entries_queryset(race).values_list("umaban", flat=True))
+        self.assertEqual(expected, [3, 1, 2])
+
+        snapshot_scraped_race("202405020811")
+        entries = self.client.get(self.url).json()["entries"]
+        self.assertEqual([entry["umaban"] for entry in entries], expected)
+
+    def test_stale_snapshot_is_not_served(self):
+        snapshot_scraped_race("202405020811")
+        update_race_odds("202405020811", {1: (9.9, 3)})
+        # オッズの更新で描画し直される
+        snapshot = RaceSnapshot.objects.get(race_id="202405020811")
+        self.assertEqual(
+            snapshot.data_version,
+            Race.objects.get(race_id="202405020811").data_version,
+        )
+        self.assertIn(b"9.9", bytes(snapshot.body))
+
+        # 直接DBを変えたなど、描画し直していない間は組み立てたレスポンスを返す
+        Race.objects.filter(race_id="202405020811").update(data_version=99)
+        Entry.objects.filter(race_id="202405020811", umaban=1).update(odds=7.7)
+        odds = {
+            entry["umaban"]: entry["odds"]
+            for entry in self.client.get(self.url).json()["entries"]
+        }
+        self.assertEqual(odds[1], 7.7)
+        self.assertEqual(refresh_race_snapshots(["202405020811"]), 1)
+        self.assertEqual(refresh_race_snapshots(["202405020811"]), 0)
+
+
+class RaceParserTests(TestCase):
+    def test_parse_past_race_columns(self):
+        self.assertEqual(parse_race_time("1:33.5"), 93.5)
+        self.assertEqual(parse_race_time("59.8"), 59.8)
+        self.assertIsNone(parse_race_time(""))
+        self.assertEqual(parse_distance("芝1600"), ("芝", 1600))
+        self.assertEqual(parse_distance("ダ右1200"), ("ダ", 1200))
+        self.assertEqual(parse_distance(""), (None, None))
+        self.assertEqual(parse_body_weight("480(+4)"), (480, 4))
+        self.assertEqual(parse_body_weight("462(-10)"), (462, -10))
+        self.assertEqual(parse_body_weight("計不"), (None, None))
+        self.assertEqual(parse_passing("3-3-2-1"), [3, 3, 2, 1])
+        self.assertIsNone(parse_passing(""))
+
+    def test_typed_columns_are_filterable(self):
+        entries, past_race_rows = build_race_rows("202405020811", 1, 2)
+        for j, (_, past_race) in enumerate(past_race_rows):
+            past_race.distance = "芝1600" if j == 0 else "ダ1200"
+            past_race.time = "1:33.5" if j == 0 else "1:12.0"
+            past_race.last_3f = "33.8"
+            past_race.body_weight = "480(+4)"
+            past_race.passing = "3-3-2-1"
+        html = build_horse_page(past_race_rows)
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        parsed = analyzer.parse_past_races(entries[0][0], html)
+        analyzer.save_race(
+            "202405020811", BulkWriteTests.race_defaults, entries, parsed
+        )
+
+        turf = HorsePastRace.objects.get(surface="芝", distance_m=1600)
+        self.assertEqual(turf.time_seconds, 93.5)
+        self.assertEqual(turf.last_3f_seconds, 33.8)
+        self.assertEqual((turf.body_weight_kg, turf.body_weight_diff), (480, 4))
+        self.assertEqual(turf.passing_positions, [3, 3, 2, 1])
+        self.assertEqual(
+            HorsePastRace.objects.filter(time_seconds__lt=80).count(), 1
+        )
+
+
+class RaceDetailFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        entries, past_race_rows = build_race_rows("202405020811", 3, 6)
+        for _, past_race in past_race_rows:
+            day = past_race.race_date.day
+            past_race.venue_name = "東京" if day % 2 else "中山"
+            past_race.weather = "晴" if day <= 3 else "雨"
+            past_race.distance = "芝1600" if day <= 4 else "ダ1800"
+            past_race.distance_m = 1600 if day <= 4 else 1800
+        # 馬0の最初の2走は、今回と同じ騎手
+        for _, past_race in past_race_rows[:2]:
+            past_race.jockey_id = entries[0][1].jockey_id
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        analyzer.save_race(
+            "202405020811", BulkWriteTests.race_defaults, entries, past_race_rows
+        )
+        self.url = reverse("race-detail", args=["202405020811"])
+
+    def get_entries(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return {entry["umaban"]: entry for entry in response.json()["entries"]}
+
+    def past_race_dates(self, entry):
+        return [past_race["race_date"] for past_race in entry["horse"]["past_races"]]
+
+    def test_filters_past_races_in_query(self):
+        entries = self.get_entries(venue="東京", weather="晴,雨", distance="1600")
+        self.assertEqual(
+            self.past_race_dates(entries[1]), ["2024-01-03", "2024-01-01"]
+        )
+
+        # 直近N走は他の条件より先に数える
+        entries = self.get_entries(recent=2, weather="晴")
+        self.assertEqual(self.past_race_dates(entries[1]), [])
+        entries = self.get_entries(recent=4, weather=["晴"])
+        self.assertEqual(self.past_race_dates(entries[1]), ["2024-01-03"])
+
+        entries = self.get_entries(same_jockey="true")
+        self.assertEqual(
+            self.past_race_dates(entries[1]), ["2024-01-02", "2024-01-01"]
+        )
+        self.assertEqual(self.past_race_dates(entries[2]), [])
+
+    def test_win_place_count_reflects_filters(self):
+        # 馬0の着順は 1〜6着（1/1〜1/6）
+        entries = self.get_entries(max_rank=3)
+        self.assertEqual(entries[1]["win_place_count"], 3)
+        self.assertEqual(len(entries[1]["horse"]["past_races"]), 3)
+
+        entries = self.get_entries(ground_condition="良", max_rank=3)
+        self.assertEqual(entries[1]["win_place_count"], 0)
+        self.assertEqual(entries[1]["horse_past_race_grade_score_total"], 0)
+
+        response = self.client.get(self.url, {"recent": 1, "venue": "東京"})
+        umabans = [entry["umaban"] for entry in response.json()["entries"]]
+        # 直近1走（1/6, 中山）は東京ではないため、全頭0件 → 馬番順
+        self.assertEqual(umabans, [1, 2, 3])
+
+    def test_filtered_responses_are_cached_separately(self):
+        unfiltered = self.client.get(self.url)
+        filtered = self.client.get(self.url, {"max_rank": 1})
+        self.assertNotEqual(unfiltered["ETag"], filtered["ETag"])
+        self.assertNotEqual(unfiltered.json(), filtered.json())
+        # 条件の指定順が違っても同じキャッシュ・ETagになる
+        same = self.client.get(self.url, {"weather": "雨,晴"})
+        reordered = self.client.get(self.url, {"weather": ["晴", "雨"]})
+        self.assertEqual(same["ETag"], reordered["ETag"])
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get(self.url, {"recent": "abc"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("recent", response.json())
+
+
+class QueryPlanTests(TestCase):
+    def test_race_detail_queries_use_indexes(self):
+        entries, past_race_rows = build_race_rows("202405020811", 5, 5)
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        analyzer.save_race(
+            "202405020811", BulkWriteTests.race_defaults, entries, past_race_rows
+        )
+        stdout = io.StringIO()
+        call_command("check_query_plans", "202405020811", stdout=stdout)
+        self.assertIn("インデックスを使っています", stdout.getvalue())
+
+    def test_find_full_scans(self):
+        sqlite_plan = [
+            (2, 0, 0, "SCAN api_horsepastrace"),
+            (3, 0, 0, "SEARCH api_entry USING INDEX entry_race_umaban_idx (race_id=?)"),
+            (4, 0, 0, "SCAN CONSTANT ROW"),
+        ]
+        self.assertEqual(find_full_scans(sqlite_plan, "sqlite"), ["api_horsepastrace"])
+        mysql_plan = [
+            (1, "SIMPLE", "api_entry", None, "ref", "entry_race_umaban_idx"),
+            (1, "SIMPLE", "api_horsepastrace", None, "ALL", None),
+        ]
+        self.assertEqual(find_full_scans(mysql_plan, "mysql"), ["api_horsepastrace"])
+        postgresql_plan = [("Seq Scan on api_horsepastrace  (cost=0.00..1.01 rows=1)",)]
+        self.assertEqual(
+            find_full_scans(postgresql_plan, "postgresql"), ["api_horsepastrace"]
+        )
+
+
+class BackfillRacesTests(TestCase):
+    def setUp(self):
+        self.checkpoint_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.checkpoint_dir.cleanup)
+        list_url = "https://race.netkeiba.com/top/race_list_sub.html?kaisai_date={}"
+        self.pages = {
+            list_url.format("20240601"): (
+                "<a href='../race/shutuba.html?race_id=202405020801'>1R</a>"
+                "<a href='../race/shutuba.html?race_id=202405020802'>2R</a>"
+                "<a href='../race/shutuba.html?race_id=202409020801'>1R</a>"
+            ),
+            list_url.format("20240602"): (
+                "<a href='../race/shutuba.html?race_id=202405020901'>1R</a>"
+            ),
+        }
+        self.scraped = []
+
+    def fake_scrape(
+        self, race_id, entry_only=False, progress=None, fetcher=None, snapshot=True
+    ):
+        self.scraped.append(race_id)
+        Race.objects.create(
+            race_id=race_id, race_name="テスト", race_date=datetime.date(2024, 6, 1)
+        )
+
+    def backfill(self, *args):
+        stdout = io.StringIO()
+        with override_settings(BACKFILL_CHECKPOINT_DIR=self.checkpoint_dir.name), \
+                mock.patch(
+                    "api.management.commands.backfill_races.build_fetcher",
+                    return_value=StubFetcher(self.pages),
+                ), \
+                mock.patch(
+                    "api.management.commands.scrape_race.main",
+                    side_effect=self.fake_scrape,
+                ):
+            call_command(
+                "backfill_races",
+                "--start", "2024-06-01",
+                "--end", "2024-06-03",
+                "--workers", "1",
+                *args,
+                stdout=stdout,
+                stderr=io.StringIO(),
+            )
+        return stdout.getvalue()
+
+    def test_backfill_scrapes_each_race_once(self):
+        Race.objects.create(
+            race_id="202405020802", race_name="既存", race_date=datetime.date(2024, 6, 1)
+        )
+
+        output = self.backfill("--venue", "東京")
+        self.assertEqual(sorted(self.scraped), ["202405020801", "202405020901"])
+        self.assertIn("races/min", output)
+        batch = "backfill:20240601-20240603:05"
+        completed = ScrapeJob.objects.filter(
+            batch=batch, status=ScrapeJob.STATUS_COMPLETED
+        )
+        self.assertEqual(completed.count(), 2)
+
+        # 再実行しても取得済みのレースは処理しない
+        self.backfill("--venue", "05")
+        self.assertEqual(len(self.scraped), 2)
+
+    def test_backfill_resumes_interrupted_jobs(self):
+        batch = "backfill:20240601-20240603:all"
+        enqueue_scrape_job("202409020801", batch=batch)
+        claim_next_job(batch)  # 実行中のまま落ちたジョブ
+        # 同じ引数で実行中の別のプロセスのジョブ（始まったばかり）は取り上げない
+        enqueue_scrape_job("202405020801", batch=batch)
+        running = claim_next_job(batch)
+        ScrapeJob.objects.filter(race_id="202409020801").update(
+            started_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+
+        self.backfill()
+        self.assertNotIn("202405020801", self.scraped)
+        running.refresh_from_db()
+        self.assertEqual(running.status, ScrapeJob.STATUS_RUNNING)
+
+        ScrapeJob.objects.filter(pk=running.pk).update(
+            started_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+        self.backfill()
+        self.assertEqual(
+            sorted(self.scraped),
+            ["202405020801", "202405020802", "202405020901", "202409020801"],
+        )
+        unfinished = ScrapeJob.objects.filter(batch=batch).exclude(
+            status=ScrapeJob.STATUS_COMPLETED
+        )
+        self.assertFalse(unfinished.exists())
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.page_cache = PageCache(cache_dir.name)
+        self.url = "https://db.netkeiba.com/horse/2021100001/"
+        self.horse = SimpleNamespace(horse_id="2021100001", horse_name="馬")
+
+    def build_analyzer(self, last_race_date):
+        page = (
+            "<table class='db_h_race_results'><tr>"
+            f"<td>{last_race_date:%Y/%m/%d}</td></tr></table>"
+        )
+        self.fetcher = StubFetcher({self.url: page})
+        return NetkeibaRaceAnalyzer(fetcher=self.fetcher, page_cache=self.page_cache)
+
+    def age_cache(self, days):
+        fetched_at = time.time() - days * 24 * 60 * 60
+        os.utime(self.page_cache.path(self.url), (fetched_at, fetched_at))
+
+    def test_repeat_fetch_is_served_from_cache(self):
+        analyzer = self.build_analyzer(datetime.date.today())
+        first = analyzer.fetch_horse_page(self.horse)
+        second = analyzer.fetch_horse_page(self.horse)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.fetcher.requested, [self.url])
+        self.assertEqual(self.page_cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_ttl_depends_on_last_race_date(self):
+        # 最近出走した馬は1日で取得し直す
+        analyzer = self.build_analyzer(datetime.date.today())
+        analyzer.fetch_horse_page(self.horse)
+        self.age_cache(days=2)
+        analyzer.fetch_horse_page(self.horse)
+        self.assertEqual(len(self.fetcher.requested), 2)
+
+        # 長く出走していない馬はキャッシュを使い続ける
+        analyzer = self.build_analyzer(datetime.date(2020, 1, 5))
+        self.page_cache.put(self.url, self.fetcher.pages[self.url])
+        self.age_cache(days=2)
+        analyzer.fetch_horse_page(self.horse)
+        self.assertEqual(self.fetcher.requested, [])
+
+
+class IncrementalPastRaceTests(TestCase):
+    def test_only_new_past_races_are_parsed(self):
+        entries, past_race_rows = build_race_rows("202405020811", 1, 6)
+        # DBには古い5走だけある
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        analyzer.save_race(
+            "202405020811", BulkWriteTests.race_defaults, entries, past_race_rows[:5]
+        )
+        # 成績ページは新しい順
+        html = build_horse_page(list(reversed(past_race_rows)))
+        horse = entries[0][0]
+
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}), incremental=True)
+        known_race_ids = analyzer.known_past_race_ids([horse.horse_id])
+        parsed = analyzer.parse_past_races(
+            horse, html, known_race_ids=known_race_ids[horse.horse_id]
+        )
+        self.assertEqual(
+            [past_race.past_race_id for _, past_race in parsed], ["202400000005"]
+        )
+
+        # since より前の成績は読まない
+        parsed = analyzer.parse_past_races(
+            horse, html, since=datetime.date(2024, 1, 5)
+        )
+        self.assertEqual(
+            [past_race.race_date for _, past_race in parsed],
+            [datetime.date(2024, 1, 6), datetime.date(2024, 1, 5)],
+        )
+
+        # 差分で保存しても既存の行は書き換えない
+        self.assertTrue(analyzer.save_past_races(horse, html))
+        self.assertEqual(
+            HorsePastRace.objects.filter(horse_id=horse.horse_id).count(), 6
+        )
+        with self.assertNumQueries(1):
+            known_race_ids = analyzer.known_past_race_ids([horse.horse_id])
+        parsed = analyzer.parse_past_races(
+            horse, html, known_race_ids=known_race_ids[horse.horse_id]
+        )
+        self.assertEqual(parsed, [])
+
+
+def build_odds_response(odds, status="middle"):
+    """単勝オッズAPIのレスポンスを作る（odds: {馬番: (オッズ, 人気)}）"""
+    win_odds = {
+        f"{umaban:02d}": [str(value), "", str(popularity)]
+        for umaban, (value, popularity) in odds.items()
+    }
+    return json.dumps({"status": status, "data": {"odds": {"1": win_odds}}})
+
+
+class OddsUpdateTests(TestCase):
+    def setUp(self):
+        entries, _ = build_race_rows("202405020811", 3, 0)
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        analyzer.save_race("202405020811", BulkWriteTests.race_defaults, entries, [])
+
+    def test_parse_win_odds(self):
+        odds, is_final = parse_win_odds(
+            build_odds_response({1: (3.5, 2), 2: (1.8, 1)}, status="result")
+        )
+        self.assertEqual(odds, {1: (3.5, 2), 2: (1.8, 1)})
+        self.assertTrue(is_final)
+        self.assertEqual(parse_win_odds("<html>"), ({}, False))
+
+    def test_only_changed_odds_are_written(self):
+        version = Race.objects.get(race_id="202405020811").data_version
+        # 馬番1: 2.0 → 2.0（変化なし）, 馬番2: 3.0 → 5.5, 馬番3: 4.0 → 1.5
+        odds = {1: (2.0, 1), 2: (5.5, 3), 3: (1.5, 2)}
+        # 書き込み + 描画済みのレース詳細の確認（スナップショットが無いため描画はしない）
+        with self.assertNumQueries(7):
+            changed = update_race_odds("202405020811", odds)
+        self.assertEqual(sorted(entry.umaban for entry in changed), [2, 3])
+        self.assertEqual(
+            list(
+                Entry.objects.filter(race_id="202405020811")
+                .order_by("umaban")
+                .values_list("odds", "popularity")
+            ),
+            [(2.0, 1), (5.5, 3), (1.5, 2)],
+        )
+        self.assertEqual(OddsSnapshot.objects.count(), 2)
+        self.assertEqual(
+            Race.objects.get(race_id="202405020811").data_version, version + 1
+        )
+
+        # 同じオッズなら何も書かない
+        with self.assertNumQueries(1):
+            self.assertEqual(update_race_odds("202405020811", odds), [])
+
+    def test_update_odds_command_polls_until_final(self):
+        url = ODDS_API_URL.format(race_id="202405020811")
+        responses = [
+            build_odds_response({1: (2.4, 1)}),
+            build_odds_response({1: (2.2, 1)}, status="result"),
+        ]
+        requested = []
+
+        def fetch(fetch_url, **kwargs):
+            requested.append(fetch_url)
+            return responses.pop(0)
+
+        fetcher = StubFetcher({})
+        fetcher.fetch = fetch
+        with mock.patch(
+            "api.management.commands.update_odds.build_fetcher", return_value=fetcher
+        ):
+            call_command(
+                "update_odds",
+                "202405020811",
+                "--interval", "0",
+                "--workers", "2",
+                stdout=io.StringIO(),
+            )
+        self.assertEqual(responses, [])
+        self.assertEqual(
+            list(OddsSnapshot.objects.values_list("odds", flat=True)), [2.4, 2.2]
+        )
+        self.assertEqual(requested, [url, url])
+
+    def test_update_odds_command_stops_polling(self):
+        def fetch(fetch_url, **kwargs):
+            if "202405020811" in fetch_url:
+                raise FetchError(fetch_url)
+            return build_odds_response({1: (2.4, 1)})
+
+        fetcher = StubFetcher({})
+        fetcher.fetch = mock.Mock(side_effect=fetch)
+        stderr = io.StringIO()
+        with mock.patch(
+            "api.management.commands.update_odds.build_fetcher", return_value=fetcher
+        ), mock.patch("api.management.commands.update_odds.time.monotonic") as monotonic:
+            # 時刻を読むたびに5秒進める（1回の更新で15秒）
+            monotonic.side_effect = (i * 5.0 for i in range(100))
+            call_command(
+                "update_odds",
+                "202405020811",
+                "202405020812",
+                "--interval", "0",
+                "--workers", "1",
+                "--max-failures", "2",
+                "--max-duration", "35",
+                stdout=io.StringIO(),
+                stderr=stderr,
+            )
+        # 取得できないレースは2回で、確定しないレースは時間切れでやめる
+        urls = [call.args[0] for call in fetcher.fetch.call_args_list]
+        self.assertEqual(sum("202405020811" in url for url in urls), 2)
+        self.assertEqual(sum("202405020812" in url for url in urls), 3)
+        self.assertIn("202405020811", stderr.getvalue())
+        self.assertIn("35 秒を過ぎたため", stderr.getvalue())
+
+
+class FakeDriver:
+    """WebDriverの代わり（ブラウザプールのテスト用）"""
+
+    def __init__(self):
+        self.alive = True
+        self.quit_called = False
+        self.window_handles = ["main"]
+        self.switch_to = SimpleNamespace(window=lambda handle: None)
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise RuntimeError("browser crashed")
+        return 1
+
+    def delete_all_cookies(self):
+        pass
+
+    def close(self):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+class BrowserPoolTests(TestCase):
+    def setUp(self):
+        self.started = []
+
+        def factory():
+            driver = FakeDriver()
+            self.started.append(driver)
+            return driver
+
+        self.pool = BrowserPool(size=2, max_uses=3, driver_factory=factory)
+
+    def test_reuses_warm_browser_and_recycles_after_max_uses(self):
+        for _ in range(3):
+            with self.pool.checkout() as driver:
+                self.assertIs(driver, self.started[0])
+        # 3回使ったブラウザは終了し、次は新しく起動する
+        self.assertTrue(self.started[0].quit_called)
+        with self.pool.checkout() as driver:
+            self.assertIs(driver, self.started[1])
+
+    def test_replaces_unhealthy_browser(self):
+        with self.pool.checkout() as driver:
+            pass
+        driver.alive = False
+        with self.pool.checkout() as replacement:
+            self.assertIsNot(replacement, driver)
+        self.assertTrue(driver.quit_called)
+
+    def test_gives_up_when_new_browsers_never_respond(self):
+        def factory():
+            driver = FakeDriver()
+            driver.alive = False
+            self.started.append(driver)
+            return driver
+
+        pool = BrowserPool(size=1, driver_factory=factory, max_start_attempts=3)
+        with self.assertRaises(BrowserStartError):
+            pool.acquire()
+        self.assertEqual(len(self.started), 3)
+        self.assertTrue(all(driver.quit_called for driver in self.started))
+
+        # 起動の繰り返しにも呼び出し側の待ち時間を適用する
+        with mock.patch("api.browser_pool.time.monotonic", side_effect=[0.0, 0.0, 5.0]):
+            with self.assertRaises(BrowserPoolTimeout):
+                pool.acquire(timeout=1)
+        self.assertEqual(len(self.started), 4)
+        # 失敗しても枠は返っている
+        self.assertTrue(pool._slots.acquire(timeout=0))
+
+    def test_limits_checkouts_to_pool_size(self):
+        self.pool.warm()
+        self.assertEqual(len(self.started), 2)
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        with self.assertRaises(BrowserPoolTimeout):
+            self.pool.acquire(timeout=0.01)
+        self.pool.release(first)
+        self.assertIs(self.pool.acquire(timeout=0.01), first)
+        self.pool.release(first)
+        self.pool.release(second)
+        self.assertEqual(len(self.started), 2)
+
+
+SHUTUBA_PAGE = """
+<html><head><script>var table = "Shutuba_Table";</script></head><body>
+<dl><dd class="Active Item"><a href="#">4月14日<span>(日)</span></a></dd></dl>
+<div class="RaceList_Item01"><span class="RaceNum">11R</span></div>
+<h1 class="RaceName">皐月賞</h1>
+<div class="RaceData01"><span>芝2000m (右)</span> / <span>馬場:良</span></div>
+<div class="RaceData02"><span>3回</span><span>中山</span><span>18頭</span></div>
+<div class="Footer">{filler}</div>
+<table class="Shutuba_Table RaceTable01">
+<thead><tr><th>馬番</th><th>枠</th><th>印</th><th>馬名</th><th>性齢</th><th>斤量</th>
+<th>騎手</th><th>厩舎</th><th>馬体重<br>(増減)</th><th>オッズ</th><th>人気</th></tr></thead>
+<tbody>
+<tr class="HorseList"><td>3</td><td>2</td><td></td>
+<td><a href="https://db.netkeiba.com/horse/2021000001">テスト馬</a></td><td>牡3</td>
+<td>57.0</td><td><a href="https://db.netkeiba.com/jockey/result/recent/05339/">騎手A</a></td>
+<td>厩舎</td><td>480(+4)</td><td>3.5</td><td>1</td></tr>
+</tbody></table></body></html>
+"""
+
+
+class HtmlParsingTests(TestCase):
+    def test_slice_table_skips_class_names_outside_table_tags(self):
+        html = SHUTUBA_PAGE.format(filler="")
+        fragment = slice_table(html, "Shutuba_Table")
+        self.assertTrue(fragment.startswith('<table class="Shutuba_Table'))
+        self.assertTrue(fragment.endswith("</table>"))
+        self.assertIsNone(slice_table(html, "db_h_race_results"))
+
+    def test_race_entry_columns_are_found_by_header(self):
+        race_id = "202406030811"
+        url = f"https://race.netkeiba.com/race/shutuba.html?race_id={race_id}"
+        page = SHUTUBA_PAGE.format(filler="<p>広告</p>" * 100)
+        analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({url: page}))
+        analyzer.get_race_entry(race_id, entry_only=True)
+
+        race = Race.objects.get(race_id=race_id)
+        self.assertEqual(
+            (race.race_name, race.venue, race.race_date, race.head_count),
+            ("皐月賞", "中山", datetime.date(2024, 4, 14), 18),
+        )
+        entry = Entry.objects.get(race_id=race_id)
+        # 馬番と枠の列が入れ替わっていても見出しで読む
+        self.assertEqual((entry.umaban, entry.waku), (3, 2))
+        self.assertEqual(
+            (entry.horse_id, entry.jockey_id, entry.odds, entry.popularity),
+            ("2021000001", "05339", 3.5, 1),
+        )
+
+    def test_past_race_columns_are_found_by_header(self):
+        _, past_race_rows = build_race_rows("202405020811", 1, 1)
+        html = build_horse_page(past_race_rows)
+        # 見出しの無い表は、これまでの列番号で読む
+        table = parse_table(html, "db_h_race_results")
+        (row,) = table_rows(table, PAST_RACE_COLUMNS)
+        self.assertEqual(row.text("distance"), "芝1600")
+
+        # 見出しがあれば列の位置が変わっても読める
+        headers = ["距離" if i == 0 else "日付" if i == 14 else "" for i in range(25)]
+        thead = "<thead><tr>" + "".join(f"<th>{h}</th>" for h in headers) + "</tr></thead>"
+        table = parse_table(html.replace("<tbody>", thead + "<tbody>"), "db_h_race_results")
+        (row,) = table_rows(table, PAST_RACE_COLUMNS)
+        self.assertEqual((row.text("date"), row.text("distance")), ("芝1600", "2024/01/01"))
+
+
+class ScraperBenchmarkTests(TestCase):
+    def test_fixture_server_serves_corpus_pages(self):
+        race_id = corpus_race_ids(FIXTURE_CORPUS_DIR)[0]
+        with FixtureServer() as server, HttpFetcher() as fetcher:
+            html = fetcher.fetch(f"{server.url}/race/shutuba.html?race_id={race_id}")
+            self.assertIn("HorseList", html)
+            with self.assertRaises(FetchError):
+                fetcher.fetch(f"{server.url}/horse/0000000000/")
+
+    def test_benchmark_scrapes_corpus_end_to_end(self):
+        out = io.StringIO()
+        call_command("benchmark_scraper", "--repeat", "1", "--keep", stdout=out)
+        self.assertIn("pages/sec", out.getvalue())
+        race_id = corpus_race_ids(FIXTURE_CORPUS_DIR)[0]
+        expected = load_expected_counts(FIXTURE_CORPUS_DIR)[race_id]
+        self.assertEqual(Entry.objects.filter(race_id=race_id).count(), expected["entries"])
+        self.assertEqual(HorsePastRace.objects.count(), expected["past_races"])
+        self.assertTrue(HorsePastRace.objects.filter(time_seconds__isnull=False).exists())
+
+        # 既定では書き込みをロールバックする
+        Race.objects.all().delete()
+        call_command("benchmark_scraper", "--repeat", "1", stdout=io.StringIO())
+        self.assertFalse(Race.objects.exists())
+
+    def copy_corpus(self):
+        corpus_dir = os.path.join(tempfile.mkdtemp(), "corpus")
+        self.addCleanup(shutil.rmtree, os.path.dirname(corpus_dir))
+        shutil.copytree(FIXTURE_CORPUS_DIR, corpus_dir)
+        return corpus_dir, corpus_race_ids(corpus_dir)[0]
+
+    def test_benchmark_fails_when_past_races_are_not_parsed(self):
+        corpus_dir, race_id = self.copy_corpus()
+        horse_id = "2021105000"
+        path = horse_page_path(corpus_dir, horse_id)
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        # 成績の表の class が変わり、読み取れなくなった場合
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html.replace("db_h_race_results", "db_h_race_results_v2"))
+
+        with self.assertRaisesMessage(CommandError, "過去成績"):
+            call_command(
+                "benchmark_scraper", "--corpus", corpus_dir, "--keep", stdout=io.StringIO()
+            )
+        self.assertFalse(Race.objects.exists())
+
+    def test_benchmark_requires_expected_counts(self):
+        corpus_dir, race_id = self.copy_corpus()
+        os.remove(os.path.join(corpus_dir, "expected_counts.json"))
+        with self.assertRaisesMessage(CommandError, race_id):
+            call_command("benchmark_scraper", "--corpus", corpus_dir, stdout=io.StringIO())
+
+        save_expected_counts(corpus_dir, race_id, 16, 0)
+        with self.assertRaisesMessage(CommandError, "過去成績"):
+            call_command("benchmark_scraper", "--corpus", corpus_dir, stdout=io.StringIO())
+
+
+class HorseStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.entries, self.past_race_rows = build_race_rows("202405020811", 2, 4)
+        for _, past_race in self.past_race_rows:
+            past_race.distance_m = 1600
+            past_race.surface = "芝"
+        self.analyzer = NetkeibaRaceAnalyzer(fetcher=StubFetcher({}))
+        self.analyzer.save_race(
+            "202405020811", BulkWriteTests.race_defaults, self.entries, self.past_race_rows
+        )
+
+    def test_stats_are_updated_when_past_races_are_written(self):
+        # 馬0の着順は 1〜4着、上がり3Fの順番は 1〜4
+        stats = HorseStats.objects.get(horse_id=self.entries[0][0].horse_id)
+        self.assertEqual(
+            (stats.race_count, stats.win_count, stats.win_place_count),
+            (4, 1, 3),
+        )
+        self.assertEqual(stats.sum_grade_score, 400)
+        self.assertEqual(stats.avg_last_3f_rank, 2.5)
+        self.assertEqual(stats.last_race_date, datetime.date(2024, 1, 4))
+        self.assertEqual(
+            stats.splits["distance"]["1600"], {"runs": 4, "wins": 1, "top3": 3}
+        )
+        self.assertEqual(stats.splits["venue"]["東京"]["runs"], 4)
+
+        # 着順が変わった馬だけ計算し直す
+        jockey, past_race = self.past_race_rows[3]
+        past_race.rank = 1
+        with CaptureQueriesContext(connection) as queries:
+            write_past_races([(jockey, past_race)])
+        stats_queries = [q for q in queries if "api_horsestats" in q["sql"]]
+        # 既存行の取得 + 1頭分の更新
+        self.assertEqual(len(stats_queries), 2)
+        stats.refresh_from_db()
+        self.assertEqual((stats.win_count, stats.win_place_count), (2, 4))
+
+    def test_stats_follow_direct_writes(self):
+        horse_id = self.entries[0][0].horse_id
+        past_races = HorsePastRace.objects.filter(horse_id=horse_id)
+        # 馬0の着順は 1〜4着
+        past_races.filter(rank=4).update(rank=1)
+        stats = HorseStats.objects.get(horse_id=horse_id)
+        self.assertEqual((stats.win_count, stats.win_place_count), (2, 4))
+
+        past_race = past_races.get(rank=2)
+        past_race.rank = 10
+        past_race.save()
+        stats.refresh_from_db()
+        self.assertEqual(stats.win_place_count, 3)
+
+        past_race.delete()
+        past_races.filter(rank=3).delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.race_count, stats.win_place_count), (2, 2))
+
+    def test_race_detail_exposes_stats(self):
+        response = self.client.get(reverse("race-detail", args=["202405020811"]))
+        horse_stats = response.json()["entries"][0]["horse_stats"]
+        self.assertEqual(horse_stats["race_count"], 4)
+        # レースは2024/06/01、前走は2024/01/04
+        self.assertEqual(horse_stats["days_since_last_run"], 149)
+
+    def test_rebuild_command_recreates_stats(self):
+        HorseStats.objects.all().delete()
+        out = io.StringIO()
+        call_command("rebuild_horse_stats", "--batch-size", "1", stdout=out)
+        self.assertEqual(HorseStats.objects.count(), 2)
+        self.assertEqual(
+            HorseStats.objects.get(horse_id=self.entries[0][0].horse_id).win_place_count,
+            3,
+        )
+        self.assertEqual(rebuild_horse_stats(horse_ids=["0000000000"]), 0)
+
+
+class FeatureTests(TestCase):
+    def setUp(self):
+        self.entries, past_race_rows = build_race_rows("202405020811", 2, 4)
+        for i, (_, past_race) in enumerate(past_race_rows):
+            past_race.distance_m = 1600
+            past_race.surface = "芝"
+            past_race.time_seconds = 95.0 + i % 3
+        NetkeibaRaceAnalyzer(fetcher=StubFetcher({})).save_race(
+            "202405020811", BulkWriteTests.race_defaults, self.entries, past_race_rows
+        )
+        horse0, horse1 = (horse.horse_id for horse, _, _ in self.entries)
+        # 当日の結果（正解ラベル）と、馬0の騎手が馬1に乗って勝った過去のレース
+        HorsePastRace.objects.create(
+            horse_id=horse0,
+            past_race_id="202405020811",
+            race_date=datetime.date(2024, 6, 1),
+            race_name="テストレース",
+            rank=2,
+            jockey_id="00000",
+        )
+        HorsePastRace.objects.create(
+            horse_id=horse1,
+            past_race_id="202401010101",
+            race_date=datetime.date(2024, 2, 1),
+            race_name="テスト",
+            rank=1,
+            jockey_id="00000",
+        )
+
+    def test_features_use_only_races_before_the_entry(self):
+        with CaptureQueriesContext(connection) as queries:
+            features = build_features(Race.objects.filter(race_id="202405020811"))
+        # レース・出走馬・過去成績のテーブルごとに1クエリ
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len(features), 2)
+        row = features.iloc[0]
+        # 馬0の過去成績は 1/1〜1/4 に 1〜4着。当日の2着はラベルにだけ使う
+        self.assertEqual(row["runs"], 4)
+        self.assertEqual(row["win_rate"], 0.25)
+        self.assertEqual(row["top3_rate"], 0.75)
+        self.assertEqual(row["last_rank"], 4)
+        self.assertEqual(row["avg_rank_recent3"], 3)
+        self.assertEqual(row["days_since_last_run"], 149)
+        self.assertEqual(row["same_distance_runs"], 4)
+        self.assertEqual(row["finish_rank"], 2)
+        self.assertEqual((row["jockey_rides"], row["jockey_win_rate"]), (1, 1.0))
+        self.assertEqual(features.iloc[1]["runs"], 5)
+        self.assertTrue(features.iloc[1][["finish_rank"]].isna().all())
+
+    def test_speed_figure_ignores_later_races(self):
+        races = Race.objects.filter(race_id="202405020811")
+        columns = ["best_speed_figure_recent5", "avg_speed_figure_recent3"]
+        before = build_features(races)[columns]
+        self.assertTrue(before.notna().all().all())
+        # 今回より後のレースの成績は偏差値の基準に入らない
+        HorsePastRace.objects.create(
+            horse_id=self.entries[1][0].horse_id,
+            past_race_id="202407010101",
+            race_date=datetime.date(2024, 7, 1),
+            race_name="後のレース",
+            rank=1,
+            surface="芝",
+            distance_m=1600,
+            time_seconds=80.0,
+        )
+        self.assertTrue(build_features(races)[columns].equals(before))
+
+    def test_race_without_date(self):
+        entries, past_race_rows = build_race_rows("202405020812", 2, 2)
+        NetkeibaRaceAnalyzer(fetcher=StubFetcher({})).save_race(
+            "202405020812",
+            {**BulkWriteTests.race_defaults, "race_date": None},
+            entries,
+            past_race_rows,
+        )
+        features = build_features(
+            Race.objects.filter(race_id__in=["202405020811", "202405020812"])
+        ).set_index(["race_id", "umaban"])
+        self.assertEqual(len(features), 4)
+        dateless = features.loc["202405020812"]
+        self.assertEqual(list(dateless["runs"]), [0, 0])
+        self.assertEqual(list(dateless["jockey_rides"]), [0, 0])
+        self.assertEqual(features.loc[("202405020811", 1), "jockey_rides"], 1)
+
+    def test_command_writes_npz(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "features.npz")
+            call_command(
+                "build_features",
+                "--start",
+                "2024-06-01",
+                "--format",
+                "npz",
+                "--output",
+                output,
+                stdout=io.StringIO(),
+            )
+            with np.load(output) as dataset:
+                self.assertEqual(dataset["features"].shape, (2, len(FEATURE_COLUMNS)))
+                self.assertEqual(list(dataset["feature_names"]), FEATURE_COLUMNS)
+                self.assertEqual(list(dataset["race_ids"]), ["202405020811"] * 2)
+
+
+class ParquetExportTests(TestCase):
+    def save_race(self, race_id, race_date, venue):
+        entries, past_race_rows = build_race_rows(race_id, 2, 3)
+        NetkeibaRaceAnalyzer(fetcher=StubFetcher({})).save_race(
+            race_id,
+            dict(BulkWriteTests.race_defaults, race_date=race_date, venue=venue),
+            entries,
+            past_race_rows,
+        )
+
+    def test_export_appends_only_new_races(self):
+        self.save_race("202405020811", datetime.date(2024, 6, 1), "東京")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            counts = export_parquet(tmpdir)
+            self.assertEqual(counts, {"races": 1, "entries": 2, "past_races": 6})
+
+            self.save_race("202308040811", datetime.date(2023, 10, 1), "京都")
+            out = io.StringIO()
+            call_command("export_parquet", "--output", tmpdir, stdout=out)
+            # 過去成績は同じ行の更新のみのため追記しない
+            self.assertIn("races: 1 行を追記", out.getvalue())
+            self.assertIn("past_races: 0 行を追記", out.getvalue())
+
+            self.assertTrue(
+                os.path.isdir(os.path.join(tmpdir, "entries", "year=2023"))
+            )
+            entries = read_dataset(tmpdir, "entries")
+            self.assertEqual(len(entries), 4)
+            self.assertEqual(str(entries["umaban"].dtype), "Int16")
+            self.assertEqual(
+                set(entries["venue_name"].cat.categories), {"東京", "京都"}
+            )
+            races = read_dataset(tmpdir, "races", filters=[("year", "=", 2023)])
+            self.assertEqual(list(races["race_id"]), ["202308040811"])
+            self.assertEqual(races["distance_m"].iloc[0], 1600)
+            self.assertEqual(len(read_dataset(tmpdir, "past_races")), 6)
+
+    def test_changed_races_are_rewritten(self):
+        self.save_race("202405020811", datetime.date(2024, 6, 1), "東京")
+        horse_id = "2021000000"
+        with tempfile.TemporaryDirectory() as tmpdir:
+            export_parquet(tmpdir)
+            # オッズの更新と、過去成績の更新・削除（どれも data_version が上がる）
+            update_race_odds("202405020811", {1: (9.9, 3)})
+            HorsePastRace.objects.filter(
+                horse_id=horse_id, past_race_id="202400000000"
+            ).update(rank=9)
+            HorsePastRace.objects.filter(
+                horse_id=horse_id, past_race_id="202400000001"
+            ).delete()
+            bump_data_version(horse_ids=[horse_id])
+
+            counts = export_parquet(tmpdir)
+            self.assertEqual(counts, {"races": 1, "entries": 2, "past_races": 5})
+            self.assertEqual(export_parquet(tmpdir)["races"], 0)
+            self.assertEqual(len(read_dataset(tmpdir, "races")), 1)
+            entries = read_dataset(tmpdir, "entries").set_index("umaban")
+            self.assertEqual(len(entries), 2)
+            self.assertEqual(entries.loc[1, "odds"], 9.9)
+            past_races = read_dataset(tmpdir, "past_races")
+            self.assertEqual(len(past_races), 5)
+            ranks = past_races[past_races["horse_id"] == horse_id].set_index(
+                "past_race_id"
+            )["rank"]
+            self.assertEqual(ranks["202400000000"], 9)
+            self.assertNotIn("202400000001", ranks.index)
+
+    def test_batches_with_only_missing_values(self):
+        # 1回目は馬場状態が全件欠損。型を推測させると2回目の値が読めなくなる
+        self.save_race("202405020811", datetime.date(2024, 6, 1), "東京")
+        Race.objects.update(ground_condition=None)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            export_parquet(tmpdir)
+            self.save_race("202405020812", datetime.date(2024, 6, 1), "東京")
+            export_parquet(tmpdir)
+            # ファイルの読み込み順によらないよう、全ファイルが同じ型で書かれていることも確認する
+            types = {
+                str(pq.read_schema(os.path.join(directory, filename)).field(
+                    "ground_condition"
+                ).type)
+                for directory, _, filenames in os.walk(os.path.join(tmpdir, "races"))
+                for filename in filenames
+                if filename.endswith(".parquet")
+            }
+            self.assertEqual(types, {"dictionary<values=string, indices=int32, ordered=0>"})
+            races = read_dataset(tmpdir, "races").set_index("race_id")
+            self.assertTrue(pd.isna(races.loc["202405020811", "ground_condition"]))
+            self.assertEqual(races.loc["202405020812", "ground_condition"], "良")
+
+
+class RacePayloadTests(TestCase):
+    def setUp(self):
+        entries, past_race_rows = build_race_rows("202405020811", 4, 5)
+        NetkeibaRaceAnalyzer(fetcher=StubFetcher({})).save_race(
+            "202405020811", BulkWriteTests.race_defaults, entries, past_race_rows
+        )
+        # 騎手未定の馬・成績集計の無い馬
+        Entry.objects.filter(umaban=2).update(jockey=None)
+        HorseStats.objects.filter(horse_id=entries[3][0].horse_id).delete()
+        self.race = Race.objects.get(race_id="202405020811")
+
+    def serializer_data(self, filters=None):
+        race = Race.objects.get(pk=self.race.pk)
+        prefetch_race_entries(race, filters=filters)
+        return RaceSerializer(race).data
+
+    def test_payload_matches_serializer(self):
+        for filters in (None, {"recent": 2, "max_rank": 10, "same_jockey": True}):
+            with self.subTest(filters=filters):
+                expected = self.serializer_data(filters)
+                with self.assertNumQueries(2):
+                    payload = race_detail_payload(self.race, filters=filters)
+                self.assertEqual(payload, json.loads(json.dumps(expected)))
+                # 同じバイト列になる（ETag・スナップショットが変わらない）
+                self.assertEqual(
+                    ORJSONRenderer().render(payload), JSONRenderer().render(expected)
+                )
+        entries = {entry["umaban"]: entry for entry in payload["entries"]}
+        self.assertIsNone(entries[2]["jockey"])
+        self.assertIsNone(entries[4]["horse_stats"])
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command("benchmark_serialization", "202405020811", "--repeat", "1", stdout=out)
+        self.assertIn("出力は一致しました", out.getvalue())
+
+
+class WireFormatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        entries, past_race_rows = build_race_rows("202405020811", 3, 4)
+        NetkeibaRaceAnalyzer(fetcher=StubFetcher({})).save_race(
+            "202405020811", BulkWriteTests.race_defaults, entries, past_race_rows
+        )
+        snapshot_scraped_race("202405020811")
+        self.url = reverse("race-detail", args=["202405020811"])
+
+    def test_columnar_format(self):
+        nested = self.client.get(self.url)
+        columnar = self.client.get(self.url, HTTP_ACCEPT=ColumnarJSONRenderer.media_type)
+        self.assertEqual(columnar["Content-Type"], ColumnarJSONRenderer.media_type)
+        self.assertIn("Accept", columnar["Vary"])
+        self.assertNotEqual(columnar["ETag"], nested["ETag"])
+
+        data = columnar.json()
+        self.assertEqual(data["past_race_columns"], PAST_RACE_FIELDS)
+        # キーと値の配列から戻すと入れ子の形式と同じになる
+        for entry in data["entries"]:
+            entry["horse"]["past_races"] = [
+                dict(zip(data["past_race_columns"], values))
+                for values in entry["horse"]["past_races"]
+            ]
+        del data["past_race_columns"]
+        self.assertEqual(data, nested.json())
+
+        by_query = self.client.get(self.url, {"format": "columnar"})
+        self.assertEqual(by_query["ETag"], columnar["ETag"])
+        not_modified = self.client.get(
+            self.url,
+            HTTP_ACCEPT=ColumnarJSONRenderer.media_type,
+            HTTP_IF_NONE_MATCH=columnar["ETag"],
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_compression(self):
+        identity = self.client.get(self.url)
+        self.assertFalse(identity.has_header("Content-Encoding"))
+
+        gzipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(gzipped["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(gzipped.content), identity.content)
+        self.assertEqual(gzipped["ETag"], "W/" + identity["ETag"])
+
+        # 圧縮で弱くなった ETag でも304を返す
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=gzipped["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+        if brotli is None:
+            return
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.assertEqual(compressed["Content-Encoding"], "br")
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+        self.assertEqual(brotli.decompress(compressed.content), identity.content)
+        self.assertEqual(compressed["ETag"], "W/" + identity["ETag"])
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command("benchmark_wire_format", "202405020811", "--repeat", "1", stdout=out)
+        self.assertIn("列形式", out.getvalue())
@@ -1,12 +1,25 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AIPredictionViewSet, RaceDetailView
+from .views import (
+    AIPredictionViewSet,
+    RaceCsvView,
+    RaceDetailView,
+    RacesCsvView,
+    RaceScrapeStatusView,
+)
 
 router = DefaultRouter()
 router.register("predictions", AIPredictionViewSet, basename="prediction")
 
 urlpatterns = [
+    path("races/csv/", RacesCsvView.as_view(), name="races-csv"),
     path("race/<str:race_id>/", RaceDetailView.as_view(), name="race-detail"),
+    path("race/<str:race_id>/csv/", RaceCsvView.as_view(), name="race-csv"),
+    path(
+        "race/<str:race_id>/status/",
+        RaceScrapeStatusView.as_view(),
+        name="race-status",
+    ),
 ]
 
 urlpatterns += router.urls
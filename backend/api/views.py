@@ -1,72 +1,174 @@
+import os
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import RaceSerializer, EntrySerializer,AIPredictionReadSerializer, AIPredictionWriteSerializer
+from .serializers import AIPredictionReadSerializer, AIPredictionWriteSerializer, PastRaceFilterSerializer, RaceCsvExportSerializer, ScrapeJobSerializer
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .call_command_utils import scrape_and_export_csv, export_race_csv
-from .models import Race, Entry, AIPrediction
-from django.db.models import Count, Q, Sum
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from .call_command_utils import export_race_csv, export_race_csv_in_background
+from .csv_exports import (
+    csv_export_path,
+    filter_races,
+    latest_csv_export_path,
+    iter_long_format_rows,
+    stream_long_format_csv,
+)
+from .models import Race, AIPrediction, ScrapeJob
+from .race_cache import (
+    etag_matches,
+    get_cached_race_detail,
+    race_detail_etag,
+    race_detail_variant,
+    set_cached_race_detail,
+)
+from .race_snapshots import build_race_detail_data, fresh_snapshot
+from .renderers import ColumnarJSONRenderer
+from .scrape_jobs import enqueue_scrape_job
 from rest_framework import viewsets, permissions
 from django_filters.rest_framework import DjangoFilterBackend
 
 class RaceDetailView(APIView):
     """
-    race_idをURLパラメータで受け取り、
-    DBに無ければスクレイピングで取得→保存し、データを返す
+    race_idをURLパラメータで受け取り、データを返す。
+    DBに無ければスクレイピングジョブを登録し、202でジョブ情報を返す
+    （進捗は RaceScrapeStatusView で確認する）。
+    絞り込みが無ければスクレイピング完了時に描画済みのJSON（RaceSnapshot）をそのまま返す。
+    それ以外のレスポンスは data_version ごとにキャッシュし、ETag/If-None-Match に対応する。
+    クエリパラメータ（venue, distance, weather, ground_condition, recent, max_rank,
+    same_jockey）で過去成績を絞り込める（PastRaceFilterSerializer）。
+    Accept: application/vnd.keiba-app.columnar+json（または ?format=columnar）で
+    過去成績を列形式にしたJSONを返す（ColumnarJSONRenderer）
     """
 
+    renderer_classes = [*APIView.renderer_classes, ColumnarJSONRenderer]
+
     def get(self, request, race_id):
         print(f"アクセスあり: race_id={race_id}")
-        race = Race.objects.filter(race_id=race_id).first()
-        if not race:
-            # データがなければスクレイピングして登録
-            try:
-                scrape_and_export_csv(race_id)
-            except Exception as e:
-                return Response(
-                    {"error": f"データ取得に失敗しました: {str(e)}"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
-
-        race = Race.objects.filter(race_id=race_id).first()
+        filter_serializer = PastRaceFilterSerializer(data=request.query_params)
+        if not filter_serializer.is_valid():
+            return Response(filter_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        filters = filter_serializer.data
+        variant = race_detail_variant(filters)
+
+        races = Race.objects.filter(race_id=race_id)
+        if not variant:
+            # 描画済みのJSONも同じクエリで取得する
+            races = races.select_related("snapshot")
+        race = races.first()
         if not race:
-            return Response(
-                {"error": "データ取得後もレース情報が存在しません"},
-                status=status.HTTP_404_NOT_FOUND,
+            # データがなければスクレイピングジョブを登録（同じrace_idの実行中ジョブがあればそれを返す）
+            job, _ = enqueue_scrape_job(race_id)
+            response_data = ScrapeJobSerializer(job).data
+            response_data["status_url"] = reverse("race-status", args=[race_id])
+            return Response(response_data, status=status.HTTP_202_ACCEPTED)
+
+        # ETagは race_id と data_version（と返す形式）から決まるため、変わっていなければ304を返す
+        columnar = request.accepted_renderer.format == ColumnarJSONRenderer.format
+        etag = race_detail_etag(
+            race, variant, ColumnarJSONRenderer.format if columnar else ""
+        )
+        if etag_matches(etag, request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        elif not variant and not columnar and fresh_snapshot(race):
+            # ORM・シリアライザを通さず、保存済みのバイト列を返す
+            response = HttpResponse(
+                bytes(race.snapshot.body), content_type="application/json"
             )
+        else:
+            response_data = get_cached_race_detail(race, variant)
+            if response_data is None:
+                response_data = self.build_response_data(race, filters)
+                set_cached_race_detail(race, response_data, variant)
+            response = Response(response_data)
+        response["ETag"] = etag
+        # キャッシュしてよいが、使う前に毎回ETagで確認させる
+        response["Cache-Control"] = "no-cache"
+        # Accept によって形式が変わるため、共有キャッシュにも区別させる
+        patch_vary_headers(response, ("Accept",))
+        return response
 
-        #    Qオブジェクトで「rankが1, 2, 3のいずれか」という条件を作成
-        win_place_condition = Q(horse__past_races__rank__in=[1, 2, 3])
+    def build_response_data(self, race, filters=None):
+        # スナップショットと同じデータ（api/race_snapshots.py）。
+        # （CSVはスクレイピング完了時・CSV取得時に作るため、ここでは出力しない）
+        return build_race_detail_data(race, filters)
 
-        sorted_entries = (
-            Entry.objects.filter(race=race)
-            .select_related("jockey", "horse")
-            .prefetch_related(
-                "horse__past_races"
-            )
-            .annotate(
-                # 'win_place_count'という新しいフィールドを各Entryに追加
-                # filter引数で条件に合うものだけをカウントする
-                win_place_count=Count("horse__past_races", filter=win_place_condition),
-                sum_grade_score=Sum("horse__past_races__race_grade_score"),
-            )
-            .order_by(
-                # win_place_countが多い順（降順）に並べ替え
-                "-win_place_count",
-                # "-sum_grade_score",
-            )
+
+class RaceCsvView(APIView):
+    """
+    レースのCSVファイルを返す。
+    データが変わっていなければ（data_versionが同じなら）作成済みのファイルをそのまま返す。
+    データが変わっていれば、作成済みの古いファイルを返して、作り直しは別スレッドに任せる
+    （CSVがまだ無いときだけ、このリクエストで作る）
+    """
+
+    def get(self, request, race_id):
+        race = get_object_or_404(Race, race_id=race_id)
+        path = csv_export_path(race)
+        if not os.path.exists(path):
+            path = latest_csv_export_path(race_id)
+            if path:
+                export_race_csv_in_background(race_id)
+            else:
+                path = export_race_csv(race_id)
+        try:
+            csv_file = open(path, "rb")
+        except FileNotFoundError:
+            # 開く前に、新しいデータで作り直したファイルに置き換えられた
+            csv_file = open(export_race_csv(race_id), "rb")
+        return FileResponse(
+            csv_file,
+            as_attachment=True,
+            filename=f"{race_id}.csv",
+            content_type="text/csv; charset=utf-8",
+        )
+
+
+class RacesCsvView(APIView):
+    """
+    複数レース（開催日の範囲・開催地・race_idの指定）の縦持ちCSVを返す。
+    行を作りながら送るため、1シーズン分でもメモリに全体を持たない。
+    gzip=true ならgzipで圧縮したファイル（.csv.gz）を返す
+    """
+
+    def get(self, request):
+        serializer = RaceCsvExportSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+        races = filter_races(
+            race_ids=params.get("race_id"),
+            start=params.get("start"),
+            end=params.get("end"),
+            venue=params.get("venue"),
+        )
+        compress = params["gzip"]
+        response = StreamingHttpResponse(
+            stream_long_format_csv(iter_long_format_rows(races), compress=compress),
+            content_type="application/gzip" if compress else "text/csv; charset=utf-8",
         )
+        filename = "races.csv.gz" if compress else "races.csv"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
-        # 3. データを手動でシリアライズしてレスポンスを構築する
-        #    これにより、並べ替えたEntryリストを確実に使用できる
-        race_serializer = RaceSerializer(race)
-        entry_serializer = EntrySerializer(sorted_entries, many=True)
 
-        # レスポンスデータを構築
-        response_data = race_serializer.data
-        response_data["entries"] = entry_serializer.data
-        export_race_csv(race_id)
-        return Response(response_data)
+class RaceScrapeStatusView(APIView):
+    """
+    race_idのスクレイピングジョブの進捗（馬ごと）を返す
+    """
+
+    def get(self, request, race_id):
+        job = ScrapeJob.objects.filter(race_id=race_id).order_by("-created_at").first()
+        if not job:
+            if Race.objects.filter(race_id=race_id).exists():
+                return Response({"race_id": race_id, "status": ScrapeJob.STATUS_COMPLETED})
+            return Response(
+                {"error": "スクレイピングジョブが存在しません"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(ScrapeJobSerializer(job).data)
 
 
 class AIPredictionViewSet(viewsets.ModelViewSet):
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # レスポンスを brotli/gzip で圧縮する（本文を変える他のミドルウェアより前に置く）
+    "api.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -117,6 +119,17 @@ DATABASES = {
 #         "PORT": int(os.getenv("DB_PORT", 3306)),
 #     }
 
+# キャッシュ（既定はプロセス内メモリ。ファイルにする場合は
+# CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache, CACHE_LOCATION=<ディレクトリ>）
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "keiba-app"),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -167,5 +180,50 @@ CORS_ALLOWED_ORIGINS = [
     "https://fresh-ads-shake.loca.lt/",
 ]
 REST_FRAMEWORK = {
-    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
+    # orjson で JSON にする（出力は JSONRenderer と同じ）
+    "DEFAULT_RENDERER_CLASSES": ("api.renderers.ORJSONRenderer",),
 }
+
+# スクレイピング設定
+# ページ取得方法: "http"（ブラウザなし） / "selenium"（ヘッドレスChrome） / "auto"（HTTPで取得できないページのみChrome）
+SCRAPE_FETCHER = os.getenv("SCRAPE_FETCHER", "auto")
+# netkeibaへの1ホストあたりのリクエスト数（回/秒）と同時接続数
+SCRAPE_RATE_LIMIT = float(os.getenv("SCRAPE_RATE_LIMIT", 2.0))
+SCRAPE_MAX_CONCURRENCY = int(os.getenv("SCRAPE_MAX_CONCURRENCY", 4))
+# 使い回すヘッドレスChromeの台数と、作り直すまでに1台で取得するページ数
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))
+BROWSER_POOL_MAX_USES = int(os.getenv("BROWSER_POOL_MAX_USES", 100))
+
+# 馬の成績ページのキャッシュ（gzip）の保存先。空にするとキャッシュしない
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", os.path.join(BASE_DIR, "output", "page_cache"))
+# キャッシュを使う期間（秒）。PAGE_CACHE_INACTIVE_DAYS 日以上出走していない馬は長めにする
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", 60 * 60 * 24))
+PAGE_CACHE_INACTIVE_TTL = int(os.getenv("PAGE_CACHE_INACTIVE_TTL", 60 * 60 * 24 * 30))
+PAGE_CACHE_INACTIVE_DAYS = int(os.getenv("PAGE_CACHE_INACTIVE_DAYS", 180))
+
+# 実行中のまま、開始からこの時間（秒）が過ぎたスクレイピングジョブは、落ちたものとして待機中に戻す
+SCRAPE_JOB_STALE_TIMEOUT = int(os.getenv("SCRAPE_JOB_STALE_TIMEOUT", 60 * 30))
+
+# 一括取得（backfill_races）で一覧を取得済みの日付を記録するディレクトリ
+BACKFILL_CHECKPOINT_DIR = os.getenv(
+    "BACKFILL_CHECKPOINT_DIR", os.path.join(BASE_DIR, "output", "backfill")
+)
+
+# レースごとのCSVの出力先
+CSV_EXPORT_DIR = os.getenv("CSV_EXPORT_DIR", os.path.join(BASE_DIR, "output", "CSVfiles"))
+
+# 分析用の Parquet データセット（export_parquet）の出力先
+PARQUET_EXPORT_DIR = os.getenv(
+    "PARQUET_EXPORT_DIR", os.path.join(BASE_DIR, "output", "parquet")
+)
+
+# AI予想の学習用の特徴量（build_features）の出力先
+FEATURE_EXPORT_DIR = os.getenv(
+    "FEATURE_EXPORT_DIR", os.path.join(BASE_DIR, "output", "features")
+)
+
+# レース詳細レスポンスのキャッシュ保持時間（秒）。データが変わればキーが変わるため長めでよい
+RACE_DETAIL_CACHE_TIMEOUT = int(os.getenv("RACE_DETAIL_CACHE_TIMEOUT", 60 * 60 * 24))
+
+# レスポンスの brotli 圧縮の品質（0〜11）。大きいほど小さくなるが圧縮に時間がかかる
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", 5))
@@ -2,16 +2,23 @@
 
 import { useState, useMemo, useCallback } from 'react';
 import { FaSpinner } from 'react-icons/fa';
-import type { RaceData, Filters } from '@/types/types';
+import type { RaceData, Filters, ScrapeJobStatus } from '@/types/types';
 import { FilterControls } from '../components/FilterControls';
 import { HorseCard } from '../components/HorseCard';
 import Toast from '@/components/Toast'; 
 import useSWR, { mutate } from 'swr';
-import { getPredictionByRaceId } from '@/lib/api';
+import {
+  buildPastRaceFilterQuery,
+  getPredictionByRaceId,
+  getRaceDetail,
+} from '@/lib/api';
 import PredictionForm from '@/components/PredictionForm';
 
 type Status = 'idle' | 'loading' | 'success' | 'error';
 
+const JOB_POLL_INTERVAL_MS = 3000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
 
 
 export default function RaceAnalyzerPage() {
@@ -19,6 +26,7 @@ export default function RaceAnalyzerPage() {
   const [raceId, setRaceId] = useState('');
   const [results, setResults] = useState<RaceData | null>(null);
   const [input, setInput] = useState('');
+  const [jobProgress, setJobProgress] = useState<ScrapeJobStatus | null>(null);
 
   const [toast, setToast] = useState<{
     show: boolean;
@@ -47,6 +55,20 @@ export default function RaceAnalyzerPage() {
     () => getPredictionByRaceId(raceId)
   );
 
+  /**
+   * 過去成績の絞り込みはAPI側で行う（表示する成績だけを受け取る）。
+   * 条件が変わるたびに取得し直し、取得中は前の結果を表示しておく。
+   */
+  const filterQuery = useMemo(() => buildPastRaceFilterQuery(filters), [filters]);
+  const loadedRaceId = results?.race_id;
+  const { data: filteredResults } = useSWR(
+    loadedRaceId ? `/race/${loadedRaceId}/?${filterQuery}` : null,
+    () => getRaceDetail(loadedRaceId as string, filterQuery),
+    { keepPreviousData: true }
+  );
+  const displayedResults =
+    filteredResults?.race_id === loadedRaceId ? filteredResults : results;
+
   const handleSuccess = () => {
     mutate(`/predictions/?race=${raceId}`);
     setToast({
@@ -70,7 +92,8 @@ export default function RaceAnalyzerPage() {
   }, []);
 
   /**
-   * 全ての馬の過去レース情報をフラットな配列に変換してメモ化。
+   * 全ての馬の過去レース情報をフラットな配列に変換してメモ化（開催地の選択肢用）。
+   * 絞り込み前の結果から作るため、絞り込んでも選択肢は減らない。
    * resultsが変更されるまで再計算されないため、パフォーマンスが向上する。
    */
   const allPastRaces = useMemo(() => {
@@ -139,9 +162,30 @@ export default function RaceAnalyzerPage() {
     setRaceId(id);
     setResults(null); // 新しいリクエストの前に古い結果をクリアする
     console.log(`[${id}] のスクレイピングを開始します...`); // 更新前のraceIdではなく、抽出したidを使う
+    setJobProgress(null);
     const baseUrl = process.env.NEXT_PUBLIC_API_BASE_URL;
     try {
-      const res = await fetch(`${baseUrl}/race/${id}/`);
+      let res = await fetch(`${baseUrl}/race/${id}/`);
+
+      // 202: スクレイピングジョブが登録されたので、完了するまで進捗をポーリングする
+      while (res.status === 202) {
+        await sleep(JOB_POLL_INTERVAL_MS);
+        const statusRes = await fetch(`${baseUrl}/race/${id}/status/`);
+        const job: ScrapeJobStatus | null = await statusRes.json().catch(() => null);
+        setJobProgress(job);
+        if (!statusRes.ok || !job || job.status === 'failed') {
+          const message = job?.error_message || 'スクレイピングに失敗しました';
+          setToast({
+            show: true,
+            message: message,
+            type: 'error',
+          });
+          throw new Error(message);
+        }
+        if (job.status === 'completed') {
+          res = await fetch(`${baseUrl}/race/${id}/`);
+        }
+      }
 
       if (!res.ok) {
         const errorData = await res.json().catch(() => null);
@@ -167,6 +211,8 @@ export default function RaceAnalyzerPage() {
       }
       setStatus('error');
       setResults(null);
+    } finally {
+      setJobProgress(null);
     }
   };
 
@@ -188,6 +234,11 @@ export default function RaceAnalyzerPage() {
               <p className='text-xl font-semibold text-gray-700'>
                 スクレイピング中だよ〜🐎💨 5分くらい待ってね〜☕🌈
               </p>
+              {jobProgress?.total_horses ? (
+                <p className='text-gray-500'>
+                  {jobProgress.completed_horses} / {jobProgress.total_horses} 頭 取得済み
+                </p>
+              ) : null}
               {/* <p className='text-gray-500'>しばらくお待ちください</p> */}
             </div>
           )}
@@ -249,12 +300,8 @@ export default function RaceAnalyzerPage() {
                 </p>
               </div>
               <div className='space-y-8'>
-                {results?.entries.map((entry) => (
-                  <HorseCard
-                    key={entry.horse.horse_id}
-                    entry={entry}
-                    filters={filters}
-                  />
+                {displayedResults?.entries.map((entry) => (
+                  <HorseCard key={entry.horse.horse_id} entry={entry} />
                 ))}
               </div>
             </div>
@@ -1,6 +1,6 @@
 'use client';
 
-import React, { useMemo } from 'react';
+import React from 'react';
 import type { HorseCardProps } from '@/types/types';
 
 const getRankClass = (rank: number | null) => {
@@ -19,49 +19,9 @@ const getRankClass = (rank: number | null) => {
   }
 };
 
-export const HorseCard: React.FC<HorseCardProps> = ({ entry, filters }) => {
-  const displayedPastRaces = useMemo(() => {
-    const currentJockey = entry.jockey;
-    let filteredData = [...entry.horse.past_races].slice(
-      0,
-      filters.recentRaces
-    );
-    if (filters.venue !== 'all') {
-      filteredData = filteredData.filter((r) => r.venue_name === filters.venue);
-    }
-    if (filters.rank < 18) {
-      // 18はスライダーの最大値
-      filteredData = filteredData.filter(
-        (r) => r.rank !== null && r.rank <= filters.rank
-      );
-    }
-    if (filters.distance) {
-      filteredData = filteredData.filter((r) =>
-        r.distance.includes(filters.distance)
-      );
-    }
-    if (filters.weather.length > 0) {
-      filteredData = filteredData.filter((r) =>
-        filters.weather.includes(r.weather)
-      );
-    }
-    if (filters.ground_condition.length > 0) {
-      filteredData = filteredData.filter((r) => {
-        // const match = r.distance.match(/$(.*?)$/);
-        // const condition = match ? match[1] : '';
-        return (
-          r.ground_condition &&
-          filters.ground_condition.includes(r.ground_condition)
-        );
-      });
-    }
-    if (filters.jockeyMatch && currentJockey) {
-      filteredData = filteredData.filter(
-        (race) => race.jockey_id === currentJockey.jockey_id
-      );
-    }
-    return filteredData;
-  }, [entry, filters]);
+export const HorseCard: React.FC<HorseCardProps> = ({ entry }) => {
+  // 過去成績はAPIで絞り込み済み（/race/<id>/?venue=...）
+  const displayedPastRaces = entry.horse.past_races;
 
   return (
     <div className='border rounded-lg shadow-md overflow-hidden'>
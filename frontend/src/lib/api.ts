@@ -1,4 +1,5 @@
 import axios from 'axios';
+import type { Filters, RaceData } from '@/types/types';
 
 const apiClient = axios.create({
   baseURL: process.env.NEXT_PUBLIC_API_BASE_URL,
@@ -63,4 +64,28 @@ export const getPredictionByRaceId = async (
     console.error('Prediction fetch failed', error);
     return null;
   }
-};
\ No newline at end of file
+};
+
+// 絞り込み条件をレース詳細APIのクエリパラメータにする（絞り込まない条件は送らない）
+export const buildPastRaceFilterQuery = (filters: Filters): string => {
+  const params = new URLSearchParams();
+  if (filters.venue !== 'all') params.set('venue', filters.venue);
+  if (filters.distance) params.set('distance', filters.distance);
+  filters.weather.forEach((w) => params.append('weather', w));
+  filters.ground_condition.forEach((g) => params.append('ground_condition', g));
+  params.set('recent', String(filters.recentRaces));
+  // 18はスライダーの最大値
+  if (filters.rank < 18) params.set('max_rank', String(filters.rank));
+  if (filters.jockeyMatch) params.set('same_jockey', 'true');
+  return params.toString();
+};
+
+// 過去成績を絞り込んだレース詳細を取得
+export const getRaceDetail = async (
+  raceId: string,
+  filterQuery: string
+): Promise<RaceData> => {
+  const query = filterQuery ? `?${filterQuery}` : '';
+  const response = await apiClient.get(`/race/${raceId}/${query}`);
+  return response.data;
+};
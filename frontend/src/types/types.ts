@@ -43,6 +43,30 @@ export interface Jockey {
   jockey_id: string; 
   jockey_name: string;
 }
+/**
+ * 馬の全成績の集計（絞り込み条件には関係しない）
+ */
+export interface SplitStats {
+  runs: number;
+  wins: number;
+  top3: number;
+}
+
+export interface HorseStats {
+  race_count: number;
+  win_count: number;
+  win_place_count: number;
+  sum_grade_score: number;
+  avg_last_3f_rank: number | null;
+  last_race_date: string | null;
+  days_since_last_run: number | null;
+  splits: {
+    surface: Record<string, SplitStats>; // "芝" / "ダ" / "障"
+    distance: Record<string, SplitStats>; // "1600"
+    venue: Record<string, SplitStats>; // "東京"
+  };
+}
+
 export interface Entry {
   horse: Horse;
   jockey: Jockey | null;
@@ -52,6 +76,8 @@ export interface Entry {
   waku: number | null;
   weight_carried: number;
   horse_past_race_grade_score_total: number | null;
+  win_place_count?: number;
+  horse_stats?: HorseStats | null;
 }
 
 export interface RaceData {
@@ -68,5 +94,21 @@ export interface RaceData {
 
 export interface HorseCardProps {
   entry: Entry;
-  filters: Filters;
+}
+
+
+export interface ScrapeJobHorseProgress {
+  horse_id: string;
+  horse_name: string;
+  status: 'pending' | 'done' | 'failed';
+}
+
+export interface ScrapeJobStatus {
+  job_id?: number;
+  race_id: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  total_horses?: number | null;
+  completed_horses?: number;
+  progress?: ScrapeJobHorseProgress[];
+  error_message?: string;
 }